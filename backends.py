@@ -0,0 +1,174 @@
+import time
+import json
+from array import array
+from timeline import iter_keys
+from injector import FakeInjector, create_injector
+
+# 演奏输出后端：引擎只调用 press_chord/release_chord，具体如何发出按键由后端决定。
+# NullBackend 什么也不做，RecordingBackend 把带时间戳的按键事件记录在内存中，
+# KeyboardBackend 通过注入器(injector.py)把整个和弦作为一批按键一次发出。
+
+
+class Backend:
+    """
+    后端基类，子类至少实现press/release
+    """
+    name = 'base'
+
+    def prepare(self, masks):
+        # 加载乐谱时调用，可在此预先解析按键
+        pass
+
+    def press(self, key):
+        raise NotImplementedError
+
+    def release(self, key):
+        raise NotImplementedError
+
+    def press_chord(self, keys):
+        for key in keys:
+            self.press(key)
+
+    def release_chord(self, keys):
+        for key in keys:
+            self.release(key)
+
+    def press_mask(self, mask):
+        self.press_chord(list(iter_keys(mask)))
+
+    def release_mask(self, mask):
+        self.release_chord(list(iter_keys(mask)))
+
+    def close(self):
+        pass
+
+
+class NullBackend(Backend):
+    name = 'null'
+
+    def press(self, key):
+        pass
+
+    def release(self, key):
+        pass
+
+
+class RecordingBackend(Backend):
+    """
+    记录 (相对时间秒, 'down'/'up', 按键)；时间从创建后端时开始计
+    """
+    name = 'record'
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.origin = clock()
+        self.events = []
+
+    def press(self, key):
+        self.events.append((self.clock() - self.origin, 'down', key))
+
+    def release(self, key):
+        self.events.append((self.clock() - self.origin, 'up', key))
+
+    def reset(self):
+        self.origin = self.clock()
+        self.events = []
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump([{'t': round(t, 6), 'type': kind, 'key': key} for t, kind, key in self.events],
+                      f, ensure_ascii=False)
+
+
+class InjectorBackend(Backend):
+    """
+    按和弦批量注入：prepare时为每种和弦掩码预先组装按下/抬起两批事件，
+    演奏时每个和弦只调用一次injector.send；send_costs记录每批的发送耗时(秒)
+    """
+    name = 'injector'
+
+    def __init__(self, injector):
+        self.injector = injector
+        self.codes = {}
+        self.batches = {}
+        self.send_costs = array('d')
+
+    def _code(self, key):
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = self.injector.resolve(key)
+        return code
+
+    def _batch(self, mask):
+        batch = self.batches.get(mask)
+        if batch is None:
+            codes = [self._code(key) for key in iter_keys(mask)]
+            batch = self.batches[mask] = (self.injector.build([(c, False) for c in codes]),
+                                          self.injector.build([(c, True) for c in codes]))
+        return batch
+
+    def prepare(self, masks):
+        self.send_costs = array('d')
+        for mask in set(masks):
+            self._batch(mask)
+
+    def _send(self, batch):
+        start = time.perf_counter()
+        self.injector.send(batch)
+        self.send_costs.append(time.perf_counter() - start)
+
+    def press_mask(self, mask):
+        self._send(self._batch(mask)[0])
+
+    def release_mask(self, mask):
+        self._send(self._batch(mask)[1])
+
+    def press(self, key):
+        self._send(self.injector.build([(self._code(key), False)]))
+
+    def release(self, key):
+        self._send(self.injector.build([(self._code(key), True)]))
+
+    def send_summary(self):
+        """
+        批次发送耗时统计（毫秒）
+        """
+        costs = sorted(self.send_costs)
+        if not costs:
+            return {'count': 0, 'mean': 0.0, 'p99': 0.0, 'max': 0.0}
+        n = len(costs)
+        return {'count': n, 'mean': sum(costs) / n * 1000,
+                'p99': costs[min(n - 1, int(n * 0.99))] * 1000, 'max': costs[-1] * 1000}
+
+    def close(self):
+        self.injector.close()
+
+
+class KeyboardBackend(InjectorBackend):
+    """
+    向前台窗口发送真实按键，注入方式由create_injector按平台选择
+    """
+    name = 'keyboard'
+
+    def __init__(self):
+        super().__init__(create_injector())
+
+
+class FakeBackend(InjectorBackend):
+    """
+    使用FakeInjector，走完整的批量注入流程但不发送按键
+    """
+    name = 'fake'
+
+    def __init__(self):
+        super().__init__(FakeInjector())
+
+
+BACKENDS = {cls.name: cls for cls in (NullBackend, RecordingBackend, KeyboardBackend, FakeBackend)}
+
+
+def create_backend(name):
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"未知的输出后端: {name}，可选: {', '.join(BACKENDS)}")
@@ -0,0 +1,100 @@
+"""
+合奏调度基准：同一条合成时间轴作为N个声部，用真实时钟以记录后端演奏，对比
+  threads   每个声部一个PlaybackEngine线程（各自的睡眠链，共同的开始时刻）
+  ensemble  EnsembleEngine单线程调度（同一时钟、同一事件队列）
+统计同一和弦在各声部实际按下时刻的最大差值（声部间偏差）和相对截止时间的延迟。
+--key-cost 模拟每次按键注入的耗时（忙等），线程方式下各声部会互相抢占GIL。
+
+用法: python benchmarks/bench_ensemble.py [--parts N] [--chords N] [--interval 毫秒] [--key-cost 毫秒]
+"""
+import os
+import sys
+import time
+import argparse
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backends import RecordingBackend  # noqa: E402
+from engine import PlaybackEngine  # noqa: E402
+from ensemble import EnsembleEngine, Part  # noqa: E402
+from timeline import Timeline, MASK_TYPECODE  # noqa: E402
+
+START_DELAY = 0.2
+
+
+class ChordRecorder(RecordingBackend):
+    """
+    额外记录每个和弦按下的时刻；key_cost为每次按下批次的模拟耗时(秒)
+    """
+    def __init__(self, origin, key_cost):
+        super().__init__()
+        self.origin = origin
+        self.key_cost = key_cost
+        self.presses = []
+
+    def press_mask(self, mask):
+        now = self.clock()
+        self.presses.append(now - self.origin)
+        end = now + self.key_cost
+        while self.clock() < end:
+            pass
+        super().press_mask(mask)
+
+
+def make_timeline(n, interval):
+    times = array('I', (i * interval for i in range(n)))
+    masks = array(MASK_TYPECODE, (1 << (i % 15) for i in range(n)))
+    return Timeline(times, masks)
+
+
+def summarize(backends, interval):
+    # 每个和弦在各声部按下时刻的最大差值，以及相对计划时刻(开始+i*interval)的延迟，单位毫秒
+    rows = list(zip(*(b.presses for b in backends)))
+    skews = sorted((max(r) - min(r)) * 1000 for r in rows)
+    late = sorted((t - START_DELAY - i * interval / 1000) * 1000 for i, r in enumerate(rows) for t in r)
+    n = len(skews)
+    return {'chords': n, 'skew_mean': sum(skews) / n, 'skew_p99': skews[min(n - 1, int(n * 0.99))],
+            'skew_max': skews[-1], 'late_p99': late[min(len(late) - 1, int(len(late) * 0.99))]}
+
+
+def run_threads(timeline, parts, key_cost):
+    origin = time.perf_counter()
+    backends = [ChordRecorder(origin, key_cost) for _ in range(parts)]
+    engines = [PlaybackEngine(b, start_delay=0) for b in backends]
+    for engine in engines:
+        engine.load(timeline)
+    # 各线程在同一时刻开始计时：启动延迟按剩余时间给出
+    for engine in engines:
+        engine.start_delay = START_DELAY - (time.perf_counter() - origin)
+        engine.play()
+    for engine in engines:
+        engine.wait()
+    return backends
+
+
+def run_ensemble(timeline, parts, key_cost):
+    origin = time.perf_counter()
+    backends = [ChordRecorder(origin, key_cost) for _ in range(parts)]
+    engine = EnsembleEngine([Part(f"part{i}", timeline, b) for i, b in enumerate(backends)], start_delay=0)
+    engine.start_delay = START_DELAY - (time.perf_counter() - origin)
+    engine.play(block=True)
+    return backends
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合奏调度基准")
+    parser.add_argument('--parts', type=int, default=4, help="声部数")
+    parser.add_argument('--chords', type=int, default=300, help="每个声部的和弦数")
+    parser.add_argument('--interval', type=int, default=25, help="和弦间隔(毫秒)")
+    parser.add_argument('--key-cost', type=float, default=0.05, help="每次按下的模拟注入耗时(毫秒)")
+    args = parser.parse_args()
+    timeline = make_timeline(args.chords, args.interval)
+    print(f"{args.parts}个声部 × {args.chords}个和弦，间隔{args.interval}ms，每次按下耗时{args.key_cost}ms")
+    print(f"{'方式':<10}{'偏差平均':>10}{'偏差P99':>10}{'偏差最大':>10}{'延迟P99':>10}  (ms)")
+    for name, func in (('threads', run_threads), ('ensemble', run_ensemble)):
+        s = summarize(func(timeline, args.parts, args.key_cost / 1000), args.interval)
+        print(f"{name:<10}{s['skew_mean']:>12.3f}{s['skew_p99']:>12.3f}{s['skew_max']:>12.3f}{s['late_p99']:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
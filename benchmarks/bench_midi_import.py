@@ -0,0 +1,52 @@
+"""
+MIDI导入基准：对给定的MIDI文件（或文件夹）分别用NumPy向量化路径和纯Python路径
+解析后的 选移调+量化+换算+合并和弦 计时，并确认两者结果一致。
+
+用法: python benchmarks/bench_midi_import.py MIDI文件或文件夹... [--repeat N]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import midi_import  # noqa: E402
+
+
+def timed(song, use_numpy, repeat):
+    midi_import._numpy = None if use_numpy else False
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = midi_import.convert(song)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MIDI导入基准")
+    parser.add_argument('paths', nargs='+', help="MIDI文件或文件夹")
+    parser.add_argument('--repeat', type=int, default=5, help="每个文件重复次数")
+    args = parser.parse_args()
+    if not midi_import._get_numpy():
+        raise SystemExit("未安装NumPy，无法对比")
+    files = midi_import.find_midi_files(args.paths)
+    total_np = total_py = parse = 0.0
+    notes = 0
+    for path in files:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        start = time.perf_counter()
+        song = midi_import.read_midi(raw)
+        parse += (time.perf_counter() - start) * 1000
+        notes += len(song.notes)
+        cost_np, (tl_np, info_np) = timed(song, True, args.repeat)
+        cost_py, (tl_py, info_py) = timed(song, False, args.repeat)
+        if list(tl_np.times) != list(tl_py.times) or list(tl_np.masks) != list(tl_py.masks) or info_np != info_py:
+            raise SystemExit(f"结果不一致: {path}")
+        total_np += cost_np
+        total_py += cost_py
+    print(f"{len(files)}个文件，{notes}个音符；解析 {parse:.1f}ms")
+    print(f"转换 NumPy {total_np:.1f}ms，纯Python {total_py:.1f}ms（{total_py / max(total_np, 1e-9):.1f}倍）")
+
+
+if __name__ == '__main__':
+    main()
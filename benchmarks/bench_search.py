@@ -0,0 +1,75 @@
+"""
+搜索基准：构造合成乐谱库（默认5万首），测量索引构建耗时和查询延迟（平均/P95/最大），
+并与旧版逐个文件名 `keyword in f.lower()` 的线性扫描对比。
+
+用法: python benchmarks/bench_search.py [--size N] [--seed S]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search_index import SearchIndex  # noqa: E402
+
+LATIN = ['ka', 'ri', 'so', 'mu', 'len', 'tor', 'bel', 'ia', 'sky', 'moon', 'star', 'rain', 'dream', 'light', 'love']
+CJK = '光遇星辰大海稻香千本樱晴天夜曲小幸运告白气球起风了烟花易冷青花瓷'
+KANA = 'さくらはなびうたかぜゆめのそらカノンメロディ'
+AUTHORS = ['Zoey', 'ikina', '烛子', 'Kitsu', 'Mew101', '何以解忧', 'Salad', 'Cobalt']
+
+
+def make_library(size, rng):
+    items = []
+    for i in range(size):
+        kind = rng.random()
+        if kind < 0.5:
+            name = '_'.join(''.join(rng.choice(LATIN) for _ in range(rng.randint(1, 3))).capitalize()
+                            for _ in range(rng.randint(1, 4)))
+        elif kind < 0.85:
+            name = ''.join(rng.choice(CJK) for _ in range(rng.randint(2, 8)))
+        else:
+            name = ''.join(rng.choice(KANA) for _ in range(rng.randint(2, 8)))
+        meta = {'name': name, 'author': rng.choice(AUTHORS), 'transcribedBy': rng.choice(AUTHORS)}
+        items.append((f"{name}_{i}.json", meta))
+    return items
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索基准")
+    parser.add_argument('--size', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    items = make_library(args.size, rng)
+    queries = ['s', 'sky', 'moon star', 'dreamlight', '光遇', '千本', 'zoey', 'ikina 星', 'sakura', 'kanon', 'xyzzy', 'ri']
+
+    start = time.perf_counter()
+    index = SearchIndex()
+    index.build(items)
+    print(f"合成乐谱库: {args.size}首，索引构建 {time.perf_counter() - start:.2f}s")
+
+    filenames = [f for f, _ in items]
+    for label, run in (('索引查询', index.search),
+                       ('线性扫描', lambda q: [f for f in filenames if q.lower() in f.lower()])):
+        costs = []
+        for _ in range(5):
+            for q in queries:
+                t = time.perf_counter()
+                run(q)
+                costs.append((time.perf_counter() - t) * 1000)
+            if label == '索引查询':
+                per_query = {q: min(costs[i::len(queries)]) for i, q in enumerate(queries)}
+        print(f"{label}: 平均 {sum(costs) / len(costs):.2f}ms，P95 {percentile(costs, 0.95):.2f}ms，最大 {max(costs):.2f}ms")
+    print("各查询耗时(索引，取最优):")
+    for q, cost in per_query.items():
+        print(f"  {q!r:14} {cost:.2f}ms  命中{len(index.search(q))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+乐谱读取基准：对比旧的逐编码试错读取与按BOM/NUL字节检测编码后一次解码的耗时。
+
+用法: python benchmarks/bench_sheet_loader.py [乐谱目录] [--repeat N]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sheet_loader import load_sheet  # noqa: E402
+
+LEGACY_ENCODINGS = ['utf-8', 'utf-8-sig', 'gbk', 'utf-16', 'utf-16-le', 'utf-16-be']
+
+
+def legacy_load(path):
+    # 旧版 load_music/update_song_info 的试错循环
+    for enc in LEGACY_ENCODINGS:
+        try:
+            with open(path, 'r', encoding=enc) as f:
+                return json.load(f), enc
+        except Exception:
+            continue
+    return None, None
+
+
+def sniff_load(path):
+    try:
+        return load_sheet(path)
+    except Exception:
+        return None, None
+
+
+def run(loader, paths, repeat):
+    best = None
+    ok = 0
+    for _ in range(repeat):
+        ok = 0
+        start = time.perf_counter()
+        for p in paths:
+            data, _ = loader(p)
+            if data is not None:
+                ok += 1
+        cost = time.perf_counter() - start
+        best = cost if best is None else min(best, cost)
+    return best, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="乐谱读取基准")
+    parser.add_argument('sheet_dir', nargs='?', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Sheet Music'))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    paths = [os.path.join(args.sheet_dir, f) for f in sorted(os.listdir(args.sheet_dir)) if f.endswith('.json')]
+    total_mb = sum(os.path.getsize(p) for p in paths) / 1024 / 1024
+    print(f"乐谱数: {len(paths)}，总大小: {total_mb:.1f} MB，取{args.repeat}次最优")
+    legacy_cost, legacy_ok = run(legacy_load, paths, args.repeat)
+    sniff_cost, sniff_ok = run(sniff_load, paths, args.repeat)
+    print(f"逐编码试错: {legacy_cost:.3f}s（成功{legacy_ok}）")
+    print(f"编码检测:   {sniff_cost:.3f}s（成功{sniff_ok}）")
+    print(f"加速比:     {legacy_cost / sniff_cost:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
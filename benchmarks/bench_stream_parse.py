@@ -0,0 +1,127 @@
+"""
+流式解析基准：对最大的几份乐谱（以及一份合成的大乐谱）分别用
+  legacy  旧版 json.load + time->音符列表 字典
+  tree    json.loads 整棵对象树 + compile_sheet
+  stream  sheet_stream.stream_compile 流式编译
+解析并编译，每种方式在独立子进程中运行，统计峰值RSS增量和耗时；
+另外统计边解析边演奏时首音可开始的时间（GrowingTimeline解析出前3秒和弦）。
+
+用法: python benchmarks/bench_stream_parse.py [--top N] [--synthetic-mb M]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from paths import SHEET_MUSIC_DIR  # noqa: E402
+
+METHODS = ('legacy', 'tree', 'stream')
+
+
+def peak_rss_kb():
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage // 1024 if sys.platform == 'darwin' else usage
+    except ImportError:
+        import psutil  # Windows下用psutil的峰值工作集
+        return psutil.Process().memory_info().peak_wset // 1024
+
+
+def run_child(method, path):
+    from sheet_loader import load_sheet
+    from sheet_stream import stream_compile
+    from timeline import compile_sheet, note_to_key
+    base = peak_rss_kb()
+    start = time.perf_counter()
+    if method == 'legacy':
+        data, _ = load_sheet(path)
+        notes_by_time = {}
+        for note in data[0]['songNotes']:
+            key = note_to_key.get(note.get('key'))
+            if key:
+                notes_by_time.setdefault(note['time'], []).append(key)
+        chords = len(notes_by_time)
+    elif method == 'tree':
+        data, _ = load_sheet(path)
+        chords = len(compile_sheet(data))
+    else:
+        with open(path, 'rb') as f:
+            chords = len(stream_compile(f)[0])
+    cost = time.perf_counter() - start
+    print(json.dumps({'rss_kb': peak_rss_kb() - base, 'seconds': cost, 'chords': chords}))
+
+
+def first_note_latency(path, ready_ms=3000):
+    from sheet_cache import load_timeline_progressive
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start = time.perf_counter()
+        timeline = load_timeline_progressive(path, cache_dir, ready_ms)
+        ready = time.perf_counter() - start
+        timeline.wait_loaded()
+        return ready, time.perf_counter() - start
+
+
+def make_synthetic(src, size_mb):
+    # 把一份乐谱的音符按时间顺延重复，生成约size_mb大小的乐谱
+    from sheet_loader import load_sheet
+    data, _ = load_sheet(src)
+    head = data[0]
+    notes = [n for n in head['songNotes'] if isinstance(n, dict)]
+    span = max(n['time'] for n in notes) + 1000
+    out, offset = [], 0
+    target = size_mb * 1024 * 1024
+    per_note = len(json.dumps(notes[0])) + 2
+    while len(out) * per_note < target:
+        out.extend({'time': n['time'] + offset, 'key': n['key']} for n in notes)
+        offset += span
+    path = os.path.join(tempfile.gettempdir(), f'synthetic_{size_mb}mb.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([dict(head, songNotes=out)], f, ensure_ascii=False)
+    return path
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        return run_child(sys.argv[2], sys.argv[3])
+    parser = argparse.ArgumentParser(description="流式解析基准")
+    parser.add_argument('--top', type=int, default=4, help="测试最大的N份乐谱")
+    parser.add_argument('--synthetic-mb', type=int, default=8, help="合成乐谱大小(MB)，0为不生成")
+    args = parser.parse_args()
+
+    files = sorted((os.path.join(SHEET_MUSIC_DIR, f) for f in os.listdir(SHEET_MUSIC_DIR) if f.endswith('.json')),
+                   key=os.path.getsize, reverse=True)
+    targets = []
+    for path in files:
+        try:
+            subprocess.run([sys.executable, __file__, '--child', 'legacy', path], check=True,
+                           capture_output=True)
+        except subprocess.CalledProcessError:
+            continue  # 跳过无法解析的乐谱
+        targets.append(path)
+        if len(targets) >= args.top:
+            break
+    if args.synthetic_mb and targets:
+        targets.append(make_synthetic(targets[-1], args.synthetic_mb))
+
+    print(f"{'乐谱':<36}{'大小':>9}" + ''.join(f"{m + ' RSS':>14}{m + ' 耗时':>12}" for m in METHODS)
+          + f"{'首音就绪':>10}{'全部解析':>10}")
+    for path in targets:
+        row = f"{os.path.basename(path)[:34]:<36}{os.path.getsize(path) / 1024:>8.0f}K"
+        for method in METHODS:
+            out = subprocess.run([sys.executable, __file__, '--child', method, path],
+                                 check=True, capture_output=True, text=True).stdout
+            result = json.loads(out)
+            row += f"{result['rss_kb'] / 1024:>12.1f}MB{result['seconds'] * 1000:>10.1f}ms"
+        ready, total = first_note_latency(path)
+        row += f"{ready * 1000:>8.1f}ms{total * 1000:>8.1f}ms"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+演奏计时基准：用RecordingBackend逐首演奏乐谱目录中的乐谱，统计每首的
+起音误差(平均/P95/最大)、总时长漂移、和弦内首末按键间隔(chord skew)和每个音符的CPU时间，
+结果写入json，可与基线对比，演奏循环出现退化时以非零状态退出（供CI使用）。
+
+默认使用虚拟时钟（sleep直接推进时间，--key-cost模拟每次按键注入的耗时），几秒内跑完整个目录；
+--real 使用真实时钟，--speed 加速播放（如 --speed 10 表示以10倍速演奏）。
+
+用法: python benchmarks/bench_timing.py [--real] [--speed X] [--limit N] [--out 文件] [--compare 基线.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from paths import SHEET_MUSIC_DIR, SHEET_CACHE_DIR  # noqa: E402
+from sheet_cache import load_timeline  # noqa: E402
+from scheduler import DeadlineScheduler, VirtualClock, REAL_CLOCK  # noqa: E402
+from backends import RecordingBackend  # noqa: E402
+from engine import PlaybackEngine  # noqa: E402
+from transforms import apply_transforms  # noqa: E402
+
+# 与基线对比时允许的退化幅度：毫秒类指标超出基线该比例且绝对值超出REGRESSION_FLOOR_MS才算退化
+REGRESSION_RATIO = 0.2
+REGRESSION_FLOOR_MS = 0.5
+COMPARED_METRICS = ('onset_mean_ms', 'onset_p95_ms', 'onset_max_ms', 'drift_ms', 'skew_max_ms')
+
+
+class CostlyRecordingBackend(RecordingBackend):
+    """
+    虚拟时钟下每次按键推进key_cost秒，模拟真实注入的耗时
+    """
+    def __init__(self, clock, key_cost):
+        super().__init__(clock=clock.now)
+        self.vclock = clock
+        self.key_cost = key_cost
+
+    def press(self, key):
+        super().press(key)
+        self.vclock.advance(self.key_cost)
+
+    def release(self, key):
+        super().release(key)
+        self.vclock.advance(self.key_cost)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def measure(timeline, backend, engine):
+    """
+    演奏一遍并把按下事件按顺序对应回和弦，返回该曲目的各项指标
+    """
+    cpu = time.process_time()
+    engine.load(timeline)
+    engine.play(block=True)
+    cpu = time.process_time() - cpu
+    origin = engine.scheduler.origin - backend.origin
+    downs = [t for t, kind, _ in backend.events if kind == 'down']
+    times, masks = timeline.times, timeline.masks
+    t0 = times[0]
+    errors, skews, onsets = [], [], []
+    pos = 0
+    for i in range(len(times)):
+        n = popcount(masks[i])
+        if not n:
+            continue
+        chord = downs[pos:pos + n]
+        pos += n
+        if len(chord) < n:
+            break
+        ideal = origin + (times[i] - t0) / 1000.0
+        errors.append(chord[0] - ideal)
+        skews.append(chord[-1] - chord[0])
+        onsets.append(chord[0])
+    notes = len(downs)
+    if not errors:
+        return None
+    ideal_span = (times[-1] - t0) / 1000.0
+    return {
+        'chords': len(errors),
+        'notes': notes,
+        'onset_mean_ms': sum(errors) / len(errors) * 1000,
+        'onset_p95_ms': percentile(errors, 0.95) * 1000,
+        'onset_max_ms': max(errors) * 1000,
+        'drift_ms': ((onsets[-1] - onsets[0]) - ideal_span) * 1000,
+        'skew_mean_ms': sum(skews) / len(skews) * 1000,
+        'skew_max_ms': max(skews) * 1000,
+        'cpu_us_per_note': cpu / max(1, notes) * 1e6,
+    }
+
+
+def summarize(songs):
+    rows = [s for s in songs.values() if s]
+    if not rows:
+        return {}
+    summary = {'songs': len(rows), 'notes': sum(r['notes'] for r in rows)}
+    for key in ('onset_mean_ms', 'drift_ms', 'skew_mean_ms', 'cpu_us_per_note'):
+        summary[key] = sum(r[key] for r in rows) / len(rows)
+    for key in ('onset_p95_ms', 'onset_max_ms', 'skew_max_ms'):
+        summary[key] = max(r[key] for r in rows)
+    summary['drift_ms'] = max((r['drift_ms'] for r in rows), key=abs)
+    return summary
+
+
+def compare(summary, baseline):
+    # 返回退化的指标列表
+    regressions = []
+    for key in COMPARED_METRICS:
+        if key not in summary or key not in baseline:
+            continue
+        new, old = abs(summary[key]), abs(baseline[key])
+        if new - old > max(REGRESSION_FLOOR_MS, old * REGRESSION_RATIO):
+            regressions.append((key, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="演奏计时基准")
+    parser.add_argument('--sheet-dir', default=SHEET_MUSIC_DIR)
+    parser.add_argument('--cache-dir', default=SHEET_CACHE_DIR)
+    parser.add_argument('--real', action='store_true', help="使用真实时钟（默认虚拟时钟）")
+    parser.add_argument('--speed', type=float, default=1.0, help="播放倍速，仅影响节奏不影响统计口径")
+    parser.add_argument('--key-cost', type=float, default=0.0002, help="虚拟时钟下每次按键耗时(秒)")
+    parser.add_argument('--limit', type=int, default=None, help="最多测试多少首")
+    parser.add_argument('--out', default='bench_timing.json', help="结果json路径")
+    parser.add_argument('--compare', help="基线json，出现退化时以状态1退出")
+    args = parser.parse_args()
+
+    files = sorted(f for f in os.listdir(args.sheet_dir) if f.endswith('.json'))[:args.limit]
+    songs = {}
+    start = time.perf_counter()
+    for name in files:
+        try:
+            timeline = load_timeline(os.path.join(args.sheet_dir, name), args.cache_dir)
+        except Exception:
+            continue
+        if not len(timeline):
+            continue
+        if args.real:
+            clock = REAL_CLOCK
+            backend = RecordingBackend()
+        else:
+            clock = VirtualClock()
+            backend = CostlyRecordingBackend(clock, args.key_cost)
+        engine = PlaybackEngine(backend, hold=0.05 / args.speed, start_delay=0.0,
+                                scheduler_factory=DeadlineScheduler, clock=clock)
+        songs[name] = measure(apply_transforms(timeline, speed=args.speed), backend, engine)
+    cost = time.perf_counter() - start
+
+    summary = summarize(songs)
+    result = {
+        'meta': {
+            'mode': 'real' if args.real else 'virtual',
+            'speed': args.speed,
+            'key_cost': None if args.real else args.key_cost,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'wall_seconds': round(cost, 3),
+        },
+        'summary': summary,
+        'songs': songs,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+
+    print(f"测试{summary.get('songs', 0)}首 / {summary.get('notes', 0)}个音符，耗时{cost:.1f}s，结果写入 {args.out}")
+    for key, value in summary.items():
+        if key.endswith('_ms') or key.endswith('_note'):
+            print(f"  {key:16} {value:.3f}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f).get('summary', {})
+        regressions = compare(summary, baseline)
+        for key, old, new in regressions:
+            print(f"退化: {key} {old:.3f} -> {new:.3f}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+性能跟踪开销基准：用虚拟时钟和NullBackend演奏一条合成时间轴（不真正等待），
+对比关闭/开启跟踪时演奏循环每个和弦的CPU时间，以及关闭时一次 with TRACE.span(...) 的耗时。
+
+用法: python benchmarks/bench_tracing.py [--chords N] [--repeat N]
+"""
+import os
+import sys
+import time
+import argparse
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import PlaybackEngine  # noqa: E402
+from scheduler import VirtualClock  # noqa: E402
+from timeline import Timeline, MASK_TYPECODE  # noqa: E402
+from tracing import TRACE  # noqa: E402
+
+
+def make_timeline(n):
+    # 每120ms一个和弦，键位轮换，偶尔出现双音和弦
+    times = array('d', (i * 120.0 for i in range(n)))
+    masks = array(MASK_TYPECODE, ((1 << (i % 15)) | ((1 << ((i + 4) % 15)) if i % 3 == 0 else 0) for i in range(n)))
+    return Timeline(times, masks)
+
+
+def play_cost(timeline, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        TRACE.clear()
+        engine = PlaybackEngine(start_delay=0, clock=VirtualClock())
+        engine.load(timeline)
+        start = time.perf_counter()
+        engine.play(block=True)
+        best = min(best, time.perf_counter() - start)
+    return best / len(timeline) * 1e9
+
+
+def span_cost(n):
+    start = time.perf_counter()
+    for _ in range(n):
+        with TRACE.span('noop'):
+            pass
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能跟踪开销基准")
+    parser.add_argument('--chords', type=int, default=50000, help="合成时间轴的和弦数")
+    parser.add_argument('--repeat', type=int, default=5, help="重复次数，取最快一次")
+    args = parser.parse_args()
+    timeline = make_timeline(args.chords)
+    TRACE.enable(False)
+    off = play_cost(timeline, args.repeat)
+    noop = span_cost(100000)
+    TRACE.enable(True)
+    on = play_cost(timeline, args.repeat)
+    events = len(TRACE.events)
+    TRACE.enable(False)
+    TRACE.clear()
+    print(f"{args.chords}个和弦")
+    print(f"演奏循环 关闭跟踪 {off:.0f}ns/和弦，开启跟踪 {on:.0f}ns/和弦（{events}个事件）")
+    print(f"关闭时 with TRACE.span() {noop:.0f}ns/次")
+
+
+if __name__ == '__main__':
+    main()
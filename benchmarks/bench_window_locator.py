@@ -0,0 +1,92 @@
+"""
+游戏窗口定位基准：在FakeWindowSystem模拟的桌面上（可设窗口数、进程数和每次系统调用的耗时）对比
+  legacy  旧版每次演奏都枚举全部窗口并为每个窗口查询进程名
+  scan    WindowLocator首次查找（全量枚举，每个进程只查一次进程名）
+  cached  WindowLocator再次查找（校验缓存的句柄）
+  stale   游戏重启后缓存失效，校验失败后重新枚举
+输出每次查找的耗时和各系统调用次数。
+
+用法: python benchmarks/bench_window_locator.py [--windows N] [--processes N] [--repeat N]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from window_locator import FakeWindowSystem, WindowLocator, game_priority  # noqa: E402
+
+
+def legacy_find(system):
+    # 旧版check_and_set_game_window的查找逻辑
+    result = {}
+    for hwnd in system.windows():
+        name = system.process_name(system.window_pid(hwnd))
+        if name is None:
+            continue
+        priority = game_priority(name)
+        if priority == 0:
+            result['Sky'] = hwnd
+        elif priority == 1:
+            result['光遇'] = hwnd
+    return result.get('Sky') or result.get('光遇')
+
+
+def make_desktop(n_windows, n_processes, costs):
+    # 游戏窗口放在枚举顺序的末尾（最坏情况），其余窗口平均分给各进程
+    windows = {1000 + i: 1 + i % n_processes for i in range(n_windows)}
+    names = {pid: f"proc{pid}.exe" for pid in range(1, n_processes + 1)}
+    game_hwnd, game_pid = 999999, 99999
+    windows[game_hwnd] = game_pid
+    names[game_pid] = 'Sky.exe'
+    return FakeWindowSystem(windows, names, costs), game_hwnd, game_pid
+
+
+def measure(system, func, repeat):
+    system.calls.clear()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    cost = (time.perf_counter() - start) / repeat * 1000
+    calls = {k: v / repeat for k, v in system.calls.items()}
+    return cost, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="游戏窗口定位基准")
+    parser.add_argument('--windows', type=int, default=400, help="可见顶层窗口数")
+    parser.add_argument('--processes', type=int, default=120, help="拥有这些窗口的进程数")
+    parser.add_argument('--repeat', type=int, default=20, help="每种情况重复次数")
+    parser.add_argument('--enum-cost', type=float, default=2e-6, help="枚举时每个窗口的耗时(秒)")
+    parser.add_argument('--name-cost', type=float, default=3e-4, help="查询一次进程名的耗时(秒)，psutil在Windows上约0.1~0.5ms")
+    parser.add_argument('--call-cost', type=float, default=2e-6, help="其它窗口API每次调用的耗时(秒)")
+    args = parser.parse_args()
+
+    costs = {'windows': args.enum_cost, 'process_name': args.name_cost, 'window_pid': args.call_cost,
+             'is_window': args.call_cost, 'activate': args.call_cost}
+    system, game_hwnd, game_pid = make_desktop(args.windows, args.processes, costs)
+    locator = WindowLocator(system)
+
+    def stale():
+        # 模拟游戏重启：旧句柄消失，新窗口出现
+        hwnd = max(system.window_map) + 1
+        del system.window_map[locator.hwnd]
+        system.window_map[hwnd] = game_pid
+        assert locator.find() == hwnd
+
+    def fresh_scan():
+        locator.invalidate()
+        locator.find()
+
+    cases = (('legacy', lambda: legacy_find(system)), ('scan', fresh_scan),
+             ('cached', locator.find), ('stale', stale))
+    print(f"窗口{args.windows}个，进程{args.processes}个，查询进程名{args.name_cost * 1000:.2f}ms/次")
+    print(f"{'情况':<8}{'耗时':>12}  调用次数")
+    for name, func in cases:
+        cost, calls = measure(system, func, args.repeat)
+        detail = ', '.join(f"{k}={v:g}" for k, v in sorted(calls.items()))
+        print(f"{name:<8}{cost:>10.3f}ms  {detail}")
+
+
+if __name__ == '__main__':
+    main()
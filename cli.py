@@ -0,0 +1,558 @@
+"""
+SkyAutoMusic 命令行工具
+
+用法:
+    python cli.py precompile [--jobs N] [--force]    预编译乐谱目录到缓存
+    python cli.py play 乐谱 [--backend keyboard|null|record|fake] [--record-out 文件] [--start 毫秒]
+    python cli.py playlist [乐谱...] [--favorites] [--shuffle] [--repeat off|all|one] [--gap 秒]
+    python cli.py ensemble 乐谱... [--split] [--backend 后端...] [--offset 毫秒...] [--record-out 目录]   多声部合奏
+    python cli.py lint [--report 文件] [--fix] [--jobs N]        检查整个乐谱目录
+    python cli.py analyze [--jobs N] [--sort 字段] [--level 难度] [--top N]   统计乐谱时长、密度和难度
+    python cli.py import-midi 文件或文件夹... [--format json|skc] [--quantize N] [--transpose N] [--jobs N]
+    python cli.py dedup [--threshold 0~1] [--report 文件] [--jobs N]   查找内容相同或近似的重复乐谱
+
+全局参数 --startup-report 在命令结束后输出各阶段及延迟导入模块的耗时；
+--trace [文件] 记录加载乐谱、每个和弦的发送耗时等，写入Chrome trace json（默认trace.json）和同名.txt汇总。
+"""
+from startup import STARTUP, lazy_import
+import os
+import sys
+import json
+import time
+import argparse
+from paths import SHEET_MUSIC_DIR, SHEET_CACHE_DIR, FAVORITES_FILE, INDEX_FILE, TRACE_FILE
+from backends import BACKENDS, RecordingBackend, InjectorBackend, create_backend
+from engine import PlaybackEngine, START_DELAY, HOLD_TIME
+from transforms import apply_transforms
+from playlist import Playlist, Preloader, REPEAT_MODES, PLAYLIST_GAP
+from midi_import import OUTPUT_FORMATS, DEFAULT_DIVISION
+from sheet_dedup import NEAR_THRESHOLD
+from tracing import TRACE
+# 进程池、乐谱缓存、乐谱检查、元数据索引只有部分子命令需要，在使用时才导入
+STARTUP.mark('imports')
+
+
+def list_sheets(sheet_dir):
+    return sorted(f for f in os.listdir(sheet_dir) if f.endswith('.json'))
+
+
+def _precompile_one(args):
+    # 子进程中执行，异常转为字符串返回，避免单个坏乐谱中断整批
+    src_path, cache_dir, force = args
+    sheet_cache = lazy_import('sheet_cache')
+    try:
+        return os.path.basename(src_path), sheet_cache.build(src_path, cache_dir, force), None
+    except Exception as e:
+        return os.path.basename(src_path), False, f"{type(e).__name__}: {e}"
+
+
+def cmd_precompile(args):
+    files = list_sheets(args.sheet_dir)
+    jobs = [(os.path.join(args.sheet_dir, f), args.cache_dir, args.force) for f in files]
+    start = time.perf_counter()
+    built = skipped = 0
+    failed = []
+    with lazy_import('concurrent.futures.process').ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for name, rebuilt, err in pool.map(_precompile_one, jobs, chunksize=16):
+            if err:
+                failed.append((name, err))
+            elif rebuilt:
+                built += 1
+            else:
+                skipped += 1
+    cost = time.perf_counter() - start
+    print(f"预编译完成: 编译{built}，已是最新{skipped}，失败{len(failed)}，耗时{cost:.2f}s")
+    for name, err in failed:
+        print(f"  失败 {name}: {err}")
+    return 0
+
+
+def _lint_one(args):
+    # 子进程中执行：先修复（如指定）再检查，异常作为检查结果返回
+    path, fix = args
+    sheet_lint = lazy_import('sheet_lint')
+    fixed = False
+    try:
+        if fix:
+            fixed = sheet_lint.fix_file(path)
+        issues = sheet_lint.lint_file(path)
+    except Exception as e:
+        issues = [{'severity': sheet_lint.ERROR, 'code': 'internal', 'message': f"{type(e).__name__}: {e}"}]
+    return os.path.basename(path), fixed, issues
+
+
+def cmd_lint(args):
+    sheet_lint = lazy_import('sheet_lint')
+    files = list_sheets(args.sheet_dir)
+    jobs = [(os.path.join(args.sheet_dir, f), args.fix) for f in files]
+    start = time.perf_counter()
+    report = {}
+    fixed = []
+    counts = {sheet_lint.ERROR: 0, sheet_lint.WARNING: 0}
+    by_code = {}
+    with lazy_import('concurrent.futures.process').ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for name, was_fixed, issues in pool.map(_lint_one, jobs, chunksize=32):
+            if was_fixed:
+                fixed.append(name)
+            if issues:
+                report[name] = issues
+            for issue in issues:
+                counts[issue['severity']] = counts.get(issue['severity'], 0) + 1
+                by_code[issue['code']] = by_code.get(issue['code'], 0) + 1
+    cost = time.perf_counter() - start
+    summary = {'files': len(files), 'with_issues': len(report), 'errors': counts[sheet_lint.ERROR],
+               'warnings': counts[sheet_lint.WARNING], 'by_code': by_code, 'fixed': fixed,
+               'seconds': round(cost, 3)}
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'files': report}, f, ensure_ascii=False, indent=1)
+    print(f"检查{len(files)}个乐谱，{len(report)}个有问题（错误{summary['errors']}，警告{summary['warnings']}），"
+          f"耗时{cost:.2f}s")
+    for code, n in sorted(by_code.items(), key=lambda kv: -kv[1]):
+        print(f"  {code:12} {n}")
+    if fixed:
+        print(f"已修复{len(fixed)}个文件")
+    if not args.quiet:
+        for name, issues in sorted(report.items()):
+            for issue in issues:
+                if issue['severity'] == sheet_lint.ERROR:
+                    print(f"  错误 {name}: {issue['message']}")
+    return 1 if summary['errors'] else 0
+
+
+def _import_one(args):
+    # 子进程中执行：导入单个MIDI，异常转为字符串返回
+    src_path, out_dir, options = args
+    midi_import = lazy_import('midi_import')
+    try:
+        out_path, info = midi_import.import_midi(src_path, out_dir, **options)
+        return os.path.basename(src_path), out_path, info, None
+    except Exception as e:
+        return os.path.basename(src_path), None, None, f"{type(e).__name__}: {e}"
+
+
+def cmd_import_midi(args):
+    files = lazy_import('midi_import').find_midi_files(args.paths)
+    if not files:
+        raise SystemExit("没有找到MIDI文件")
+    out_dir = args.out or args.sheet_dir
+    os.makedirs(out_dir, exist_ok=True)
+    options = {'fmt': args.format, 'division': args.quantize, 'shift': args.transpose,
+               'fold': not args.no_fold, 'drums': args.drums, 'force': args.force, 'cache_dir': args.cache_dir}
+    jobs = [(path, out_dir, options) for path in files]
+    start = time.perf_counter()
+    failed = []
+    imported = 0
+    with lazy_import('concurrent.futures.process').ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for name, out_path, info, err in pool.map(_import_one, jobs, chunksize=4):
+            if err:
+                failed.append((name, err))
+                continue
+            imported += 1
+            if not args.quiet:
+                print(f"  {name} -> {os.path.basename(out_path)}：{info['chords']}个和弦，移调{info['shift']:+d}，"
+                      f"移八度{info['folded']}个，舍弃{info['dropped']}个")
+    cost = time.perf_counter() - start
+    print(f"导入完成: 成功{imported}，失败{len(failed)}，耗时{cost:.2f}s")
+    for name, err in failed:
+        print(f"  失败 {name}: {err}")
+    return 1 if failed else 0
+
+
+ANALYZE_SORTS = ('difficulty', 'duration', 'nps_mean', 'nps_peak', 'max_chord', 'min_gap_ms', 'name')
+
+
+def cmd_analyze(args):
+    # 更新元数据索引（新增或改动的乐谱在进程池中解析和统计），再按指定字段排序输出
+    sheet_index = lazy_import('sheet_index')
+    sheet_stats = lazy_import('sheet_stats')
+    index = sheet_index.SheetIndex(args.index_file, args.sheet_dir)
+    index.load()
+    files = list_sheets(args.sheet_dir)
+    start = time.perf_counter()
+    scanned = index.refresh(files, jobs=args.jobs)
+    index.save()
+    cost = time.perf_counter() - start
+    rows = []
+    levels = {}
+    for name in files:
+        entry = index.entries.get(name)
+        stats = entry and entry.get('stats')
+        if not stats:
+            continue
+        level = sheet_stats.difficulty_level(stats['difficulty'])
+        levels[level] = levels.get(level, 0) + 1
+        if args.level and level != args.level:
+            continue
+        rows.append((name, entry['duration'], level, stats))
+    if args.sort == 'name':
+        rows.sort(key=lambda r: r[0])
+    elif args.sort == 'duration':
+        rows.sort(key=lambda r: r[1], reverse=True)
+    else:
+        rows.sort(key=lambda r: r[3][args.sort] if r[3][args.sort] is not None else float('inf'),
+                  reverse=args.sort != 'min_gap_ms')
+    print(f"{len(files)}个乐谱，重新统计{scanned}个，耗时{cost:.2f}s；"
+          + "，".join(f"{name}{levels.get(name, 0)}" for name, _ in reversed(sheet_stats.DIFFICULTY_LEVELS)))
+    print(f"{'难度':>6} {'时长':>6} {'平均/秒':>7} {'峰值/秒':>7} {'最大和弦':>4} {'最小间隔':>8}  乐谱")
+    for name, duration, level, stats in rows[:args.top or None]:
+        gap = f"{stats['min_gap_ms']:.0f}ms" if stats['min_gap_ms'] is not None else '-'
+        print(f"{stats['difficulty']:4.1f}{level:>2} {format_ms(duration * 1000):>6} {stats['nps_mean']:>9.2f}"
+              f" {stats['nps_peak']:>9} {stats['max_chord']:>8} {gap:>10}  {name}")
+    return 0
+
+
+def cmd_dedup(args):
+    # 更新元数据索引（内容哈希和指纹随统计一起在进程池中计算），再按哈希和LSH分桶查找重复组
+    sheet_index = lazy_import('sheet_index')
+    sheet_dedup = lazy_import('sheet_dedup')
+    if not 0 < args.threshold <= 1:
+        raise SystemExit("--threshold 应在0~1之间")
+    index = sheet_index.SheetIndex(args.index_file, args.sheet_dir)
+    index.load()
+    files = list_sheets(args.sheet_dir)
+    start = time.perf_counter()
+    scanned = index.refresh(files, jobs=args.jobs)
+    index.save()
+    scan_cost = time.perf_counter() - start
+    start = time.perf_counter()
+    groups = sheet_dedup.find_duplicates({name: index.entries.get(name) for name in files}, args.threshold)
+    cost = time.perf_counter() - start
+    duplicated = sum(len(g['files']) for g in groups)
+    exact = sum(1 for g in groups if g['exact'])
+    print(f"{len(files)}个乐谱，重新解析{scanned}个，耗时{scan_cost:.2f}s；查找重复耗时{cost * 1000:.0f}ms")
+    print(f"重复组{len(groups)}个（内容相同{exact}个，近似{len(groups) - exact}个），涉及{duplicated}个乐谱")
+    if not args.quiet:
+        for group in groups:
+            kind = '相同' if group['exact'] else f"近似{group['similarity']:.0%}"
+            print(f"[{kind}]")
+            for name in group['files']:
+                print(f"    {name}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'files': len(files), 'threshold': args.threshold, 'groups': groups},
+                      f, ensure_ascii=False, indent=2)
+        print(f"报告已写入 {args.report}")
+    return 0
+
+
+def format_ms(ms):
+    m, s = divmod(int(ms / 1000), 60)
+    return f"{m}:{s:02d}"
+
+
+def resolve_sheet(sheet_dir, name):
+    # 接受完整路径、乐谱目录中的文件名或省略.json的文件名
+    for candidate in (name, os.path.join(sheet_dir, name), os.path.join(sheet_dir, name + '.json')):
+        if os.path.isfile(candidate):
+            return candidate
+    raise SystemExit(f"找不到乐谱: {name}")
+
+
+def transform(timeline, args):
+    try:
+        return apply_transforms(timeline, speed=args.speed, quantize_division=args.quantize,
+                                min_gap_ms=args.min_gap, jitter_ms=args.humanize, seed=args.seed)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+
+def run_engine(engine, backends, quiet):
+    # 演奏线程只写进度通道，主线程以10Hz读取并输出，终端输出不影响演奏节奏
+    try:
+        engine.play()
+        last, track = None, engine.track
+        while not engine.progress.finished:
+            time.sleep(0.1)
+            current, duration = engine.progress.track
+            if current is not None and current != track:
+                track = current
+                if not quiet:
+                    print(f"\n正在演奏 {track}（{format_ms(duration)}）")
+            state = engine.progress.poll()
+            if not quiet and state != last and state[0]:
+                last = state
+                print(f"\r{format_ms(state[2])}  {state[0]}/{state[1]}", end='', flush=True)
+    except KeyboardInterrupt:
+        engine.stop()
+        engine.wait()
+    finally:
+        for backend in backends:
+            backend.close()
+    if not quiet:
+        print()
+    if engine.progress.error is not None:
+        print(f"演奏出错已停止: {engine.progress.error!r}", file=sys.stderr)
+    elif engine.progress.stats is not None:
+        print(f"演奏结束！{engine.progress.stats.format()}")
+
+
+def cmd_play(args):
+    path = resolve_sheet(args.sheet_dir, args.sheet)
+    with TRACE.span('load timeline', 'start'):
+        timeline = lazy_import('sheet_cache').load_timeline(path, args.cache_dir)
+    with TRACE.span('create backend', 'start'):
+        backend = create_backend(args.backend)
+    engine = PlaybackEngine(backend, hold=args.hold / 1000, start_delay=args.delay)
+    with TRACE.span('apply transforms', 'start'):
+        timeline = transform(timeline, args)
+    with TRACE.span('prepare keys', 'start'):
+        engine.load(timeline, track=os.path.basename(path))
+    if args.start:
+        engine.seek(args.start)
+    if args.loop:
+        try:
+            a_ms, b_ms = (int(v) for v in args.loop.split(':'))
+        except ValueError:
+            raise SystemExit("--loop 格式应为 A毫秒:B毫秒，如 60000:75000")
+        if not engine.set_loop(a_ms, b_ms):
+            raise SystemExit("A-B区间内没有音符")
+    print(f"演奏 {os.path.basename(path)}：{len(timeline)}个和弦，后端 {backend.name}")
+    run_engine(engine, [backend], args.quiet)
+    if isinstance(backend, InjectorBackend):
+        s = backend.send_summary()
+        print(f"按键批次 {s['count']}次，发送耗时 平均{s['mean']:.3f}ms / P99 {s['p99']:.3f}ms / 最大{s['max']:.3f}ms")
+    if isinstance(backend, RecordingBackend) and args.record_out:
+        backend.dump(args.record_out)
+        print(f"按键事件已写入 {args.record_out}（{len(backend.events)}条）")
+    return 0
+
+
+def cmd_playlist(args):
+    if args.sheets:
+        names = [os.path.basename(resolve_sheet(args.sheet_dir, name)) for name in args.sheets]
+    elif args.favorites:
+        try:
+            with open(FAVORITES_FILE, 'r', encoding='utf-8') as f:
+                favorites = set(json.load(f))
+        except (OSError, ValueError):
+            favorites = set()
+        names = [f for f in list_sheets(args.sheet_dir) if f in favorites]
+    else:
+        names = list_sheets(args.sheet_dir)
+    if not names:
+        raise SystemExit("播放列表为空")
+    playlist = Playlist(names, shuffle=args.shuffle, repeat=args.repeat, seed=args.seed)
+    sheet_cache = lazy_import('sheet_cache')
+
+    def load(name):
+        return transform(sheet_cache.load_timeline(os.path.join(args.sheet_dir, name), args.cache_dir), args)
+
+    preloader = Preloader(load)
+
+    def load_from(name):
+        # 从name开始依次尝试加载，坏乐谱和空乐谱跳过；返回(曲目, Timeline)，并开始预加载再下一首
+        for _ in range(len(playlist)):
+            if name is None:
+                return None
+            try:
+                timeline = preloader.get(name)
+            except Exception as e:
+                print(f"\n跳过 {name}: {e}")
+                timeline = None
+            if timeline is not None and len(timeline):
+                following = playlist.peek()
+                if following:
+                    preloader.request(following)
+                return name, timeline
+            name = playlist.advance()
+        return None
+
+    def next_song():
+        # 演奏线程中调用：取出已预加载的下一首
+        song = load_from(playlist.advance())
+        return song and (song[0], song[1], None)
+
+    try:
+        song = load_from(playlist.current())
+        if song is None:
+            raise SystemExit("播放列表中没有可演奏的乐谱")
+        first, timeline = song
+        backend = create_backend(args.backend)
+        engine = PlaybackEngine(backend, hold=args.hold / 1000, start_delay=args.delay)
+        engine.gap = args.gap
+        engine.next_provider = next_song
+        engine.load(timeline, track=first)
+        print(f"播放列表 {len(playlist)}首，后端 {backend.name}，第一首 {first}")
+        run_engine(engine, [backend], args.quiet)
+    finally:
+        preloader.close()
+    return 0
+
+
+def load_parts(args):
+    # 返回[(声部名, Timeline, 共同起点)]；--split时每份乐谱拆为1Key/2Key声部，两个声部以整首的首音对齐
+    ensemble = lazy_import('ensemble')
+    parts = []
+    for name in args.sheets:
+        path = resolve_sheet(args.sheet_dir, name)
+        title = os.path.splitext(os.path.basename(path))[0]
+        try:
+            if args.split:
+                split = ensemble.split_sheet(lazy_import('sheet_loader').load_sheet(path)[0])
+                sheet_origin_ms = min(timeline.times[0] for _, timeline in split)
+                parts += [(f"{title}:{prefix}", timeline, sheet_origin_ms) for prefix, timeline in split]
+            else:
+                timeline = lazy_import('sheet_cache').load_timeline(path, args.cache_dir)
+                if not len(timeline):
+                    raise ValueError("乐谱中没有可演奏的音符。")
+                parts.append((title, timeline, None))
+        except (OSError, ValueError) as e:
+            raise SystemExit(f"{os.path.basename(path)}: {e}")
+    return parts
+
+
+def cmd_ensemble(args):
+    ensemble = lazy_import('ensemble')
+    loaded = load_parts(args)
+    n = len(loaded)
+    names = args.backend if len(args.backend) > 1 else args.backend * n
+    offsets = args.offset if len(args.offset) > 1 else args.offset * n
+    if len(names) != n or len(offsets) != n:
+        raise SystemExit(f"共{n}个声部：--backend 和 --offset 应给出1个或{n}个值")
+    backends = [create_backend(name) for name in names]
+    clock_origin = time.perf_counter()
+    for backend in backends:
+        if isinstance(backend, RecordingBackend):
+            backend.origin = clock_origin  # 各声部的记录使用同一时间起点，便于对比
+    parts = [ensemble.Part(title, timeline, backend, origin=sheet_origin_ms, offset_ms=offset)
+             for (title, timeline, sheet_origin_ms), backend, offset in zip(loaded, backends, offsets)]
+    try:
+        engine = ensemble.EnsembleEngine(parts, hold=args.hold / 1000, start_delay=args.delay, speed=args.speed)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"合奏 {n}个声部：" + "，".join(f"{p.name}（{len(p.timeline)}个和弦，{p.backend.name}）" for p in parts))
+    run_engine(engine, backends, args.quiet)
+    print(engine.format_report())
+    if args.record_out:
+        os.makedirs(args.record_out, exist_ok=True)
+        for i, part in enumerate(parts, 1):
+            if isinstance(part.backend, RecordingBackend):
+                out = os.path.join(args.record_out, f"{i}_{part.name.replace(':', '_')}.json")
+                part.backend.dump(out)
+                print(f"{part.name} 的按键事件已写入 {out}（{len(part.backend.events)}条）")
+    return 0
+
+
+def add_play_options(p):
+    p.add_argument('--backend', choices=sorted(BACKENDS), default='keyboard', help="按键输出后端")
+    p.add_argument('--speed', type=float, default=1.0, help="速度倍率，>1变快")
+    p.add_argument('--quantize', type=int, nargs='?', const=0, default=None,
+                   help="量化到网格，可指定每拍格数，省略则按bitsPerPage推算")
+    p.add_argument('--min-gap', type=float, default=0, help="相邻和弦最小间隔(毫秒)")
+    p.add_argument('--humanize', type=float, default=0, help="随机抖动幅度(毫秒)")
+    p.add_argument('--seed', type=int, default=None, help="抖动/随机播放的随机种子，相同种子结果一致")
+    p.add_argument('--hold', type=int, default=int(HOLD_TIME * 1000), help="每个和弦按住的毫秒数")
+    p.add_argument('--delay', type=float, default=START_DELAY, help="开始前等待的秒数")
+    p.add_argument('--quiet', action='store_true', help="不显示进度")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description="SkyAutoMusic 命令行工具")
+    parser.add_argument('--sheet-dir', default=SHEET_MUSIC_DIR, help="乐谱目录")
+    parser.add_argument('--cache-dir', default=SHEET_CACHE_DIR, help="预编译缓存目录")
+    parser.add_argument('--startup-report', action='store_true', help="输出启动各阶段及延迟导入模块的耗时")
+    parser.add_argument('--trace', nargs='?', const=TRACE_FILE, default=None, metavar='文件',
+                        help="记录性能跟踪，写入Chrome trace json（默认trace.json）和同名.txt汇总")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('precompile', help="并行预编译乐谱目录到二进制缓存")
+    p.add_argument('--jobs', type=int, default=None, help="进程数，默认CPU核数")
+    p.add_argument('--force', action='store_true', help="忽略已有缓存，全部重新编译")
+    p.set_defaults(func=cmd_precompile)
+
+    p = sub.add_parser('lint', help="并行检查乐谱目录，输出问题报告")
+    p.add_argument('--report', help="把完整报告写入该json文件")
+    p.add_argument('--fix', action='store_true', help="把可修复的乐谱规范化为按时间排序、去重的UTF-8文件")
+    p.add_argument('--jobs', type=int, default=None, help="进程数，默认CPU核数")
+    p.add_argument('--quiet', action='store_true', help="不逐条列出错误")
+    p.set_defaults(func=cmd_lint)
+
+    p = sub.add_parser('analyze', help="并行统计乐谱的时长、每秒按键数、最大和弦、最小间隔和难度")
+    p.add_argument('--jobs', type=int, default=None, help="进程数，默认CPU核数")
+    p.add_argument('--index-file', default=INDEX_FILE, help="元数据索引文件，统计结果保存在其中")
+    p.add_argument('--sort', choices=ANALYZE_SORTS, default='difficulty', help="排序字段")
+    p.add_argument('--level', help="只列出该难度档的乐谱（入门/简单/中等/困难/极难）")
+    p.add_argument('--top', type=int, default=20, help="列出前N个，0为全部")
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser('import-midi', help="把MIDI文件（或整个文件夹）并行导入为乐谱")
+    p.add_argument('paths', nargs='+', help="MIDI文件或包含MIDI文件的文件夹")
+    p.add_argument('--out', help="输出目录，默认为乐谱目录")
+    p.add_argument('--format', choices=OUTPUT_FORMATS, default='json', help="skc：输出乐谱json的同时写入对应的预编译缓存")
+    p.add_argument('--quantize', type=int, default=DEFAULT_DIVISION, help="量化到每拍N格，0为不量化")
+    p.add_argument('--transpose', type=int, default=None, help="移调半音数，省略则自动选择")
+    p.add_argument('--no-fold', action='store_true', help="超出音域的音符直接舍弃，不移八度")
+    p.add_argument('--drums', action='store_true', help="保留打击乐通道（通道10）")
+    p.add_argument('--force', action='store_true', help="覆盖已存在的输出文件")
+    p.add_argument('--jobs', type=int, default=None, help="进程数，默认CPU核数")
+    p.add_argument('--quiet', action='store_true', help="不逐个列出导入结果")
+    p.set_defaults(func=cmd_import_midi)
+
+    p = sub.add_parser('dedup', help="查找内容相同或近似（移调、变速、少量改动）的重复乐谱")
+    p.add_argument('--threshold', type=float, default=NEAR_THRESHOLD, help="近似重复的相似度阈值(0~1)")
+    p.add_argument('--index-file', default=INDEX_FILE, help="元数据索引文件，哈希和指纹保存在其中")
+    p.add_argument('--report', help="把重复组写入该json文件")
+    p.add_argument('--jobs', type=int, default=None, help="进程数，默认CPU核数")
+    p.add_argument('--quiet', action='store_true', help="不逐组列出文件")
+    p.set_defaults(func=cmd_dedup)
+
+    p = sub.add_parser('play', help="无界面演奏乐谱")
+    p.add_argument('sheet', help="乐谱路径或乐谱目录中的文件名")
+    add_play_options(p)
+    p.add_argument('--record-out', help="record后端：把按键事件写入该json文件")
+    p.add_argument('--start', type=int, default=0, help="从相对首音的该毫秒处开始")
+    p.add_argument('--loop', help="A-B循环区间（毫秒），如 60000:75000，Ctrl+C结束")
+    p.set_defaults(func=cmd_play)
+
+    p = sub.add_parser('playlist', help="连续演奏多首乐谱，后台预加载下一首")
+    p.add_argument('sheets', nargs='*', help="乐谱列表，省略时使用整个乐谱目录")
+    add_play_options(p)
+    p.add_argument('--favorites', action='store_true', help="只演奏收藏的乐谱")
+    p.add_argument('--shuffle', action='store_true', help="随机顺序")
+    p.add_argument('--repeat', choices=REPEAT_MODES, default='off', help="循环模式：不循环/列表循环/单曲循环")
+    p.add_argument('--gap', type=float, default=PLAYLIST_GAP, help="两首之间的间隔(秒)")
+    p.set_defaults(func=cmd_playlist)
+
+    p = sub.add_parser('ensemble', help="多份乐谱或1Key/2Key声部同时演奏到各自的后端，由同一时钟驱动")
+    p.add_argument('sheets', nargs='+', help="乐谱路径或乐谱目录中的文件名")
+    p.add_argument('--split', action='store_true', help="把每份乐谱拆成1Key/2Key两个声部")
+    p.add_argument('--backend', nargs='+', choices=sorted(BACKENDS), default=['keyboard'],
+                   help="每个声部的输出后端，只给一个时所有声部各用一个同类后端")
+    p.add_argument('--offset', nargs='+', type=int, default=[0], help="每个声部的起始偏移(毫秒)")
+    p.add_argument('--speed', type=float, default=1.0, help="整体速度倍率，>1变快")
+    p.add_argument('--hold', type=int, default=int(HOLD_TIME * 1000), help="每个和弦按住的毫秒数")
+    p.add_argument('--delay', type=float, default=START_DELAY, help="开始前等待的秒数")
+    p.add_argument('--record-out', help="record后端：把各声部的按键事件写入该目录")
+    p.add_argument('--quiet', action='store_true', help="不显示进度")
+    p.set_defaults(func=cmd_ensemble)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    STARTUP.enabled = STARTUP.enabled or args.startup_report
+    STARTUP.mark('parse args')
+    TRACE.enable(TRACE.enabled or args.trace is not None)
+    try:
+        with TRACE.span(args.command, 'cli'):
+            return args.func(args)
+    finally:
+        STARTUP.mark(args.command)
+        STARTUP.emit()
+        if TRACE.enabled:
+            write_trace(args.trace or TRACE_FILE)
+
+
+def write_trace(path):
+    try:
+        json_path, summary_path = TRACE.write(path)
+    except OSError as e:
+        print(f"写入跟踪失败: {e}", file=sys.stderr)
+        return
+    print(TRACE.summary(), file=sys.stderr)
+    print(f"跟踪已写入 {json_path}，汇总 {summary_path}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
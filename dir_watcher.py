@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import struct
+import threading
+
+# 乐谱目录监视：在后台线程等待系统文件变更通知（Windows: ReadDirectoryChangesW，Linux: inotify），
+# 不可用时退回检查目录修改时间；变更以增量事件 (类型, 文件名) 批量回调，类型为 added/removed/modified。
+
+ADDED, REMOVED, MODIFIED = 'added', 'removed', 'modified'
+COALESCE_DELAY = 0.2  # 合并短时间内的连续事件（例如复制大文件时的多次写入）
+
+
+def coalesce(events):
+    """
+    合并同一文件的多个事件，保留有意义的最终状态
+    """
+    state = {}
+    for kind, name in events:
+        prev = state.get(name)
+        if prev == ADDED and kind == MODIFIED:
+            continue
+        if prev == REMOVED and kind == ADDED:
+            kind = MODIFIED  # 删除后又创建（覆盖保存），视为修改
+        if prev == ADDED and kind == REMOVED:
+            state.pop(name)
+            continue
+        state[name] = kind
+    return [(kind, name) for name, kind in state.items()]
+
+
+class DirWatcher:
+    """
+    后台监视目录中指定后缀的文件，on_events在监视线程中被调用
+    """
+    def __init__(self, path, on_events, suffix='.json', poll_interval=1.0, rescan_interval=10.0):
+        self.path = path
+        self.on_events = on_events
+        self.suffix = suffix
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval  # 轮询模式下定期全量比对，捕获原地修改
+        self.backend = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        for backend, run in (('win32', self._run_win32), ('inotify', self._run_inotify)):
+            try:
+                handle = getattr(self, f'_open_{backend}')()
+            except Exception:
+                continue
+            self.backend = backend
+            break
+        else:
+            handle, run = None, self._run_poll
+            self.backend = 'poll'
+        self._thread = threading.Thread(target=run, args=(handle,), daemon=True, name='DirWatcher')
+        self._thread.start()
+        return self.backend
+
+    def stop(self):
+        self._stop.set()
+
+    def _emit(self, events):
+        events = coalesce([(k, n) for k, n in events if n.endswith(self.suffix)])
+        if events and not self._stop.is_set():
+            try:
+                self.on_events(events)
+            except Exception:
+                pass
+
+    # ====== 轮询：目录修改时间变化时才列目录 ======
+    def _snapshot(self):
+        snap = {}
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.name.endswith(self.suffix):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    snap[entry.name] = (st.st_size, st.st_mtime_ns)
+        return snap
+
+    def _run_poll(self, _handle):
+        try:
+            dir_mtime = os.stat(self.path).st_mtime_ns
+            snap = self._snapshot()
+        except OSError:
+            dir_mtime, snap = None, {}
+        last_rescan = time.monotonic()
+        while not self._stop.wait(self.poll_interval):
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                continue
+            now = time.monotonic()
+            if mtime == dir_mtime and now - last_rescan < self.rescan_interval:
+                continue
+            dir_mtime, last_rescan = mtime, now
+            try:
+                new_snap = self._snapshot()
+            except OSError:
+                continue
+            events = [(REMOVED, n) for n in snap if n not in new_snap]
+            for name, stat in new_snap.items():
+                if name not in snap:
+                    events.append((ADDED, name))
+                elif snap[name] != stat:
+                    events.append((MODIFIED, name))
+            snap = new_snap
+            self._emit(events)
+
+    # ====== Windows: ReadDirectoryChangesW ======
+    def _open_win32(self):
+        if sys.platform != 'win32':
+            raise OSError('not windows')
+        import win32file
+        import win32con
+        return win32file.CreateFile(
+            self.path, 0x0001,  # FILE_LIST_DIRECTORY
+            win32con.FILE_SHARE_READ | win32con.FILE_SHARE_WRITE | win32con.FILE_SHARE_DELETE,
+            None, win32con.OPEN_EXISTING, win32con.FILE_FLAG_BACKUP_SEMANTICS, None)
+
+    def _run_win32(self, handle):
+        import win32file
+        import win32con
+        actions = {1: ADDED, 2: REMOVED, 3: MODIFIED, 4: REMOVED, 5: ADDED}
+        flags = (win32con.FILE_NOTIFY_CHANGE_FILE_NAME | win32con.FILE_NOTIFY_CHANGE_SIZE |
+                 win32con.FILE_NOTIFY_CHANGE_LAST_WRITE)
+        while not self._stop.is_set():
+            try:
+                results = win32file.ReadDirectoryChangesW(handle, 65536, False, flags, None, None)
+            except Exception:
+                # 句柄失效（如目录被删除）时退回轮询
+                self.backend = 'poll'
+                return self._run_poll(None)
+            events = [(actions[a], n) for a, n in results if a in actions]
+            time.sleep(COALESCE_DELAY)
+            self._emit(events)
+
+    # ====== Linux: inotify（通过ctypes调用libc） ======
+    def _open_inotify(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError('not linux')
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        # IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        mask = 0x08 | 0x40 | 0x80 | 0x100 | 0x200
+        if libc.inotify_add_watch(fd, os.fsencode(self.path), mask) < 0:
+            os.close(fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+        return fd
+
+    def _run_inotify(self, fd):
+        import select
+        header = struct.Struct('iIII')
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([fd], [], [], 0.5)
+                if not ready:
+                    continue
+                time.sleep(COALESCE_DELAY)
+                events = []
+                while True:
+                    try:
+                        buf = os.read(fd, 65536)
+                    except BlockingIOError:
+                        break
+                    pos = 0
+                    while pos + header.size <= len(buf):
+                        _, mask, _, length = header.unpack_from(buf, pos)
+                        name = os.fsdecode(buf[pos + header.size:pos + header.size + length].rstrip(b'\0'))
+                        pos += header.size + length
+                        if mask & (0x40 | 0x200):
+                            events.append((REMOVED, name))
+                        elif mask & (0x80 | 0x100):
+                            events.append((ADDED, name))
+                        elif mask & 0x08:
+                            events.append((MODIFIED, name))
+                self._emit(events)
+        finally:
+            os.close(fd)
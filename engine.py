@@ -0,0 +1,377 @@
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+from backends import NullBackend
+from scheduler import DeadlineScheduler, REAL_CLOCK
+from tracing import TRACE
+
+# 无界面演奏引擎：load/play/pause/resume/seek/loop/stop，按键通过可替换的后端发出，
+# 不依赖Tk和win32，图形界面和命令行都只是它的调用方。
+
+HOLD_TIME = 0.05  # 每个和弦按下后保持的时间(秒)，可全局或按曲目设置
+RETRIGGER_GAP = 0.01  # 仍按住的键再次按下前，提前该时间(秒)抬起，保证游戏能识别为新的一次按键
+RELEASE, PRESS = 0, 1  # 事件类型，同一时刻先抬起后按下
+START_DELAY = 0.5  # 开始演奏前的等待时间(秒)，留出切换到游戏窗口的时间
+STOP_JOIN_TIMEOUT = 1.0  # stop()等待演奏线程退出的最长时间(秒)
+
+
+class ProgressChannel:
+    """
+    演奏线程写、界面线程读的进度通道：每次只替换整个元组引用，读写都无需加锁。
+    界面按固定频率poll()，演奏节奏与界面刷新开销完全无关
+    """
+    __slots__ = ('state', 'track', 'stats', 'finished', 'completed', 'error')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.state = (0, 0, 0)  # (已演奏和弦数, 和弦总数, 当前和弦相对首音的毫秒数)
+        self.track = (None, 0)  # (当前曲目, 曲目时长毫秒)，连续播放时切歌后变化
+        self.stats = None
+        self.finished = False  # 演奏线程已退出
+        self.completed = False  # 完整演奏到结尾（而不是被停止）
+        self.error = None  # 演奏线程因异常（如按键注入失败）退出时的异常
+
+    def start_track(self, key, duration_ms, total):
+        self.track = (key, duration_ms)
+        self.state = (0, total, 0)
+
+    def publish(self, done, total, elapsed_ms):
+        self.state = (done, total, elapsed_ms)
+
+    def finish(self, stats, completed, error=None):
+        self.stats = stats
+        self.completed = completed
+        self.error = error
+        self.finished = True
+
+    def poll(self):
+        return self.state
+
+
+class PlaybackEngine:
+    """
+    on_progress(已演奏和弦数, 和弦总数, 当前和弦相对首音的毫秒数) 与 on_finish(延迟统计)
+    在演奏线程中回调；界面程序应改为轮询self.progress
+    """
+    def __init__(self, backend=None, hold=HOLD_TIME, start_delay=START_DELAY,
+                 scheduler_factory=DeadlineScheduler, clock=REAL_CLOCK):
+        self.backend = backend or NullBackend()
+        self.clock = clock
+        self.hold = hold
+        self.start_delay = start_delay
+        self.scheduler_factory = scheduler_factory
+        self.scheduler = None
+        self.timeline = None
+        self.song_hold = None
+        self.track = None  # 当前曲目标识（如文件名），只用于进度通道
+        self.position = 0  # 下一个要演奏的和弦索引
+        # 连续播放：一首结束后在演奏线程中调用next_provider()取下一首(曲目标识, Timeline, hold)，
+        # 返回None则结束；两首之间间隔gap秒
+        self.next_provider = None
+        self.gap = 1.0
+        self.loop = None  # A-B循环区间 (起始和弦索引, 结束和弦索引(不含), 结束毫秒)
+        self.is_playing = False
+        self.on_progress = None
+        self.on_finish = None
+        self.progress = ProgressChannel()
+        self._cond = threading.Condition()
+        self._paused = False
+        self._seek_to = None  # 演奏中请求跳转到的和弦索引
+        # 每次play()新建停止/打断信号和进度通道并交给该次的演奏线程，
+        # 旧线程即使还没退出，也只会看到自己的停止信号、只改动自己的进度
+        self._stop = threading.Event()
+        self._wake = threading.Event()  # 停止/暂停/跳转时打断演奏线程的等待
+        self._thread = None
+
+    def load(self, timeline, hold=None, track=None):
+        """
+        timeline应已经过transforms.apply_transforms处理，times即最终的演奏时间(毫秒)；
+        hold为该曲目的按住时长(秒)，None时使用引擎的全局设置
+        """
+        self.stop()
+        self.timeline = timeline
+        self.song_hold = hold
+        self.track = track
+        self.position = 0
+        self.loop = None
+        self.backend.prepare(timeline.masks)
+
+    def index_at(self, ms):
+        # 相对首音ms毫秒处的第一个和弦索引，二分查找O(log n)
+        times = self.timeline.times
+        if not times:
+            return 0
+        return min(bisect_left(times, times[0] + max(0, int(ms))), len(times))
+
+    def seek(self, ms):
+        """
+        定位到相对首音ms毫秒处的第一个和弦：停止时设置下次开始的位置，演奏中立即跳转并重新对齐节奏
+        """
+        idx = self.index_at(ms)
+        with self._cond:
+            if self.is_playing:
+                self._seek_to = idx
+                self._wake.set()
+            else:
+                self.position = idx
+        return idx
+
+    def set_loop(self, a_ms, b_ms):
+        """
+        设置A-B循环：演奏到B处后回到A处继续；区间内没有和弦时返回False
+        """
+        if a_ms > b_ms:
+            a_ms, b_ms = b_ms, a_ms
+        a, b = self.index_at(a_ms), self.index_at(b_ms)
+        if b <= a:
+            return False
+        self.loop = (a, b, self.timeline.times[0] + int(b_ms))
+        return True
+
+    def clear_loop(self):
+        self.loop = None
+
+    def play(self, on_progress=None, on_finish=None, block=False):
+        if self.timeline is None or self.is_playing:
+            return False
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.is_playing = True
+        self.progress = ProgressChannel()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._paused = False
+        self._seek_to = None
+        run = (self._stop, self._wake, self.progress)
+        if block:
+            self._run(*run)
+        else:
+            self._thread = threading.Thread(target=self._run, args=run, daemon=True)
+            self._thread.start()
+        return True
+
+    def wait(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    @property
+    def is_paused(self):
+        return self._paused
+
+    def pause(self):
+        with self._cond:
+            self._paused = True
+            self._wake.set()
+
+    def resume(self):
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._stop.set()
+            self._wake.set()
+            self._paused = False
+            self._cond.notify_all()
+            self.is_playing = False
+            self.position = 0
+        # 等上一次的演奏线程抬起按键并退出，紧接着play()时不会有两个线程同时按键；
+        # 在演奏线程自身（如on_finish回调）中调用时不等待
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(STOP_JOIN_TIMEOUT)
+
+    def _next_index(self, idx):
+        # 下一个要演奏的和弦索引，处于A-B循环末尾时回到A
+        loop = self.loop
+        if loop and idx + 1 == loop[1]:
+            return loop[0]
+        return idx + 1
+
+    def _run(self, stop, wake, progress):
+        # 任何异常（如按键注入失败）都结束演奏并通过进度通道报告，保证is_playing复位、finished置位；
+        # 已被stop()后再次play()取代时，只结束自己的进度通道，不改动新一次演奏的状态
+        delay = self.start_delay
+        error = None
+        scheduler = None
+        try:
+            while True:
+                timeline = self.timeline
+                progress.start_track(self.track, timeline.duration_ms(), len(timeline))
+                with TRACE.span('song', 'engine', track=self.track, chords=len(timeline)):
+                    scheduler = self._play_song(delay, stop, wake, progress)
+                if stop.is_set() or self.next_provider is None:
+                    break
+                nxt = self.next_provider()
+                if nxt is None or stop.is_set():
+                    break
+                # 接着演奏下一首：上一首的抬起事件已全部执行，从此刻起等待gap秒
+                self.track, self.timeline, self.song_hold = nxt
+                self.backend.prepare(self.timeline.masks)
+                self.position = 0
+                self.loop = None
+                delay = self.gap
+        except Exception as e:
+            error = e
+        finally:
+            finished = error is None and not stop.is_set()
+            current = self._stop is stop
+            if current:
+                self.is_playing = False
+                if finished:
+                    self.position = 0
+            stats = scheduler.stats if scheduler is not None else None
+            progress.finish(stats, finished, error)
+        if current and error is None and self.on_finish:
+            self.on_finish(stats)
+
+    def _play_song(self, delay, stop, wake, progress):
+        """
+        按下和抬起是同一个优先队列里的独立定时事件：抬起不阻塞线程，可与后续和弦的起音重叠。
+        队列中始终只放下一个和弦的按下事件，弹出后再放入下一个。
+        暂停、跳转、停止都会打断当前等待，暂停期间阻塞在条件变量上，恢复后整体顺延截止时间。
+        启用跟踪时记录每次按下/抬起的发送耗时和按下时的延迟，是否启用只在开始时判断一次
+        """
+        total = self.timeline.wait_more(self.position)  # 边解析边演奏时只计入已完整的和弦
+        times, masks = self.timeline.times, self.timeline.masks
+        hold = self.hold if self.song_hold is None else self.song_hold
+        backend = self.backend
+        clock = self.clock
+        self.scheduler = scheduler = self.scheduler_factory(clock=clock)
+        start = self.position
+        queue = []
+        seq = 0
+        held = 0  # 当前按住的键位掩码
+        owner = {}  # 键位 -> 最近一次按下它的和弦索引，旧和弦的抬起事件不影响重新按下的键
+        trace = TRACE if TRACE.enabled else None
+        t0 = times[start] if start < total else 0
+        if start < total:
+            scheduler.begin(delay=delay)
+            queue.append((0.0, PRESS, seq, start))
+
+        def onset(i):
+            return (times[i] - t0) / 1000.0
+
+        try:
+            while queue and not stop.is_set():
+                if wake.is_set():
+                    with self._cond:
+                        wake.clear()
+                        seek_to, self._seek_to = self._seek_to, None
+                        paused = self._paused
+                    if held:
+                        backend.release_mask(held)
+                        held = 0
+                    if paused:
+                        paused_at = clock.now()
+                        with self._cond:
+                            while self._paused and not stop.is_set():
+                                self._cond.wait()
+                        scheduler.shift(clock.now() - paused_at)
+                    if seek_to is not None:
+                        # 从新位置重新起算节奏，队列中旧的事件全部作废
+                        queue = []
+                        self.position = seek_to
+                        if seek_to >= total:
+                            break
+                        t0 = times[seek_to]
+                        scheduler.rebase()
+                        seq += 1
+                        queue.append((0.0, PRESS, seq, seek_to))
+                    continue
+                offset, kind, _, payload = queue[0]
+                if kind == RELEASE:
+                    if not scheduler.wait_until(offset, wake):
+                        continue
+                    heapq.heappop(queue)
+                    mask, idx = payload
+                    if idx is not None:
+                        mask = self._owned(mask, idx, owner)
+                    mask &= held
+                    if mask:
+                        if trace:
+                            t = trace.clock()
+                        backend.release_mask(mask)
+                        held &= ~mask
+                        if trace:
+                            trace.complete('release', t, trace.clock(), 'dispatch')
+                    continue
+                idx = payload
+                played = scheduler.wait(offset, wake)
+                if wake.is_set():
+                    continue
+                heapq.heappop(queue)
+                mask = masks[idx]
+                if played:
+                    if trace:
+                        t = trace.clock()
+                        trace.counter('lateness_ms', (clock.now() - scheduler.deadline(offset)) * 1000, 'dispatch')
+                    repeat = mask & held
+                    if repeat:
+                        backend.release_mask(repeat)
+                    held |= mask  # 先记入按住的键，注入中途失败时也会被抬起
+                    backend.press_mask(mask)
+                    if trace:
+                        trace.complete('chord', t, trace.clock(), 'dispatch', {'index': idx, 'mask': mask})
+                    bit = mask
+                    while bit:
+                        low = bit & -bit
+                        owner[low] = idx
+                        bit ^= low
+                    seq += 1
+                    heapq.heappush(queue, (offset + hold, RELEASE, seq, (mask, idx)))
+                done, played_at = idx + 1, times[idx] - times[0]
+                nxt_idx = self._next_index(idx)
+                if nxt_idx >= total:
+                    # 边解析边演奏时等待后续和弦解析出来；已完整的时间轴直接返回原长度
+                    total = self.timeline.wait_more(nxt_idx)
+                    if self.timeline.times is not times:
+                        # 解析中遇到乱序音符，解析结束时换成了重新排序的数组：旧索引不再对应，
+                        # 按时间从已演奏的和弦之后继续（插入到已演奏部分之前的音符已错过）
+                        self.timeline.wait_loaded()
+                        nxt_idx = done = bisect_right(self.timeline.times, times[idx])
+                        total = len(self.timeline.times)
+                    times, masks = self.timeline.times, self.timeline.masks
+                self.position = nxt_idx
+                if nxt_idx < total:
+                    if nxt_idx <= idx:
+                        # A-B循环回到A：B点到A点无缝衔接，重新计算时间基准
+                        gap = max(0, self.loop[2] - times[idx]) / 1000.0
+                        t0 = times[nxt_idx] - (offset + gap) * 1000.0
+                    nxt = onset(nxt_idx)
+                    repeat = masks[nxt_idx] & held
+                    if repeat:
+                        # 下一个和弦要重复按的键，在其起音前提前抬起
+                        seq += 1
+                        heapq.heappush(queue, (max((offset + nxt) / 2, nxt - RETRIGGER_GAP), RELEASE, seq, (repeat, None)))
+                    seq += 1
+                    heapq.heappush(queue, (nxt, PRESS, seq, nxt_idx))
+                if played:
+                    progress.publish(done, total, played_at)
+                    if self.on_progress:
+                        self.on_progress(done, total, played_at)
+        except BaseException:
+            # 异常退出时尽量抬起仍按住的键，抬起失败也不覆盖原来的异常
+            if held:
+                try:
+                    backend.release_mask(held)
+                except Exception:
+                    pass
+            raise
+        if held:
+            backend.release_mask(held)
+        return scheduler
+
+    @staticmethod
+    def _owned(mask, idx, owner):
+        # 只保留最近一次由idx和弦按下的键位
+        result = 0
+        while mask:
+            low = mask & -mask
+            if owner.get(low) == idx:
+                result |= low
+            mask ^= low
+        return result
@@ -0,0 +1,256 @@
+import heapq
+import threading
+from timeline import compile_notes, compile_sheet, SheetFormatError
+from backends import NullBackend
+from engine import PlaybackEngine, ProgressChannel, HOLD_TIME, RETRIGGER_GAP, RELEASE, PRESS, START_DELAY
+from scheduler import DeadlineScheduler, LatenessStats, REAL_CLOCK
+from tracing import TRACE
+
+# 合奏：多份乐谱（或同一乐谱拆出的1Key/2Key声部）分别输出到各自的后端，
+# 所有声部的按下/抬起事件放在同一个优先队列里，由一个调度线程按同一个单调时钟的截止时间依次发出，
+# 不再是每个声部一个线程、各自一条睡眠链。同一时刻起音的各声部之间实际发出的时间差记为声部间偏差(skew)。
+
+PARTS = ('1Key', '2Key')  # Sky乐谱的两组按键前缀
+
+
+def split_sheet(data):
+    """
+    把已解析的乐谱json按1Key/2Key拆成声部，返回[(声部名, Timeline)]，只包含有音符的声部。
+    各声部保留原乐谱中的绝对时间，合奏时应以整首的首音（各声部首音的最小值）为共同的Part.origin
+    """
+    full = compile_sheet(data)  # 校验结构并取得bpm等网格信息，格式不对时抛出SheetFormatError
+    notes = [n for n in data[0]['songNotes'] if isinstance(n, dict) and isinstance(n.get('key'), str)]
+    parts = []
+    for prefix in PARTS:
+        timeline = compile_notes([n for n in notes if n['key'].startswith(prefix)], full.bpm, full.bits_per_page)
+        if len(timeline):
+            parts.append((prefix, timeline))
+    if not parts:
+        raise SheetFormatError("乐谱中没有可演奏的音符。")
+    return parts
+
+
+class Part:
+    """
+    合奏中的一个声部：timeline中时间为origin的音符在合奏开始后offset_ms毫秒发出；
+    hold为该声部的按住时长(秒)，None时使用合奏的全局设置
+    """
+    def __init__(self, name, timeline, backend=None, origin=None, offset_ms=0, hold=None):
+        self.name = name
+        self.timeline = timeline
+        self.backend = backend or NullBackend()
+        self.origin = origin if origin is not None else (timeline.times[0] if len(timeline) else 0)
+        self.offset_ms = offset_ms
+        self.hold = hold
+        self.stats = LatenessStats()
+        self.played = 0
+        self.held = 0
+        self.owner = {}
+
+    def reset(self):
+        self.stats = LatenessStats()
+        self.played = 0
+        self.held = 0
+        self.owner = {}
+
+    def end_ms(self, speed=1.0):
+        # 该声部最后一个和弦相对合奏开始的毫秒数
+        if not len(self.timeline):
+            return 0
+        return (self.timeline.times[-1] - self.origin) / speed + self.offset_ms
+
+
+class EnsembleEngine:
+    """
+    单线程合奏调度：play/stop/wait，进度通过self.progress轮询（与PlaybackEngine相同），
+    结束后report()给出各声部的延迟和声部间偏差。speed为整体速度倍率（对所有声部按共同起点缩放）
+    """
+    def __init__(self, parts, hold=HOLD_TIME, start_delay=START_DELAY, speed=1.0,
+                 scheduler_factory=DeadlineScheduler, clock=REAL_CLOCK):
+        if not parts:
+            raise ValueError("合奏至少需要一个声部")
+        if speed <= 0:
+            raise ValueError("速度倍率必须大于0")
+        self.parts = list(parts)
+        self.hold = hold
+        self.start_delay = start_delay
+        self.speed = speed
+        self.scheduler_factory = scheduler_factory
+        self.clock = clock
+        self.scheduler = None
+        self.track = ' + '.join(part.name for part in self.parts)
+        self.skew = LatenessStats()
+        self.is_playing = False
+        self.progress = ProgressChannel()
+        self._stop = threading.Event()
+        self._thread = None
+        for part in self.parts:
+            part.backend.prepare(part.timeline.masks)
+
+    def duration_ms(self):
+        return max(part.end_ms(self.speed) for part in self.parts)
+
+    def play(self, block=False):
+        if self.is_playing:
+            return False
+        self.is_playing = True
+        self.progress.reset()
+        self._stop.clear()
+        if block:
+            self._run()
+        else:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return True
+
+    def wait(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stop(self):
+        self._stop.set()
+        self.is_playing = False
+
+    def _onset(self, part, i):
+        return ((part.timeline.times[i] - part.origin) / self.speed + part.offset_ms) / 1000.0
+
+    def _run(self):
+        # 与PlaybackEngine._run相同：任何声部的后端出错都结束合奏并通过进度通道报告
+        total = sum(len(part.timeline) for part in self.parts)
+        self.progress.start_track(self.track, self.duration_ms(), total)
+        error = None
+        try:
+            with TRACE.span('ensemble', 'engine', parts=len(self.parts), chords=total):
+                self._dispatch(total)
+        except Exception as e:
+            error = e
+        finally:
+            finished = error is None and not self._stop.is_set()
+            self.is_playing = False
+            stats = self.scheduler.stats if self.scheduler is not None else None
+            self.progress.finish(stats, finished, error)
+
+    def _dispatch(self, total):
+        """
+        与PlaybackEngine._play_song相同的按下/抬起事件模型，队列元素带声部编号；
+        同一截止时间的事件先抬起后按下，各声部的按下依次发出，记录首个与最后一个之间的时间差
+        """
+        parts = self.parts
+        clock = self.clock
+        self.scheduler = scheduler = self.scheduler_factory(clock=clock)
+        self.skew = skew = LatenessStats()
+        queue = []
+        seq = 0
+        for n, part in enumerate(parts):
+            part.reset()
+            if len(part.timeline):
+                seq += 1
+                queue.append((self._onset(part, 0), PRESS, seq, n, 0))
+        heapq.heapify(queue)
+        trace = TRACE if TRACE.enabled else None
+        done = 0
+        group_key, group_first, group_last, group_size = None, 0.0, 0.0, 0
+        scheduler.begin(delay=self.start_delay)
+        try:
+            while queue and not self._stop.is_set():
+                offset, kind, _, n, payload = queue[0]
+                part = parts[n]
+                if kind == RELEASE:
+                    if not scheduler.wait_until(offset, self._stop):
+                        break
+                    heapq.heappop(queue)
+                    mask, idx = payload
+                    if idx is not None:
+                        mask = PlaybackEngine._owned(mask, idx, part.owner)
+                    mask &= part.held
+                    if mask:
+                        part.backend.release_mask(mask)
+                        part.held &= ~mask
+                    continue
+                idx = payload
+                played = scheduler.wait(offset, self._stop)
+                if self._stop.is_set():
+                    break
+                heapq.heappop(queue)
+                times, masks = part.timeline.times, part.timeline.masks
+                mask = masks[idx]
+                if played:
+                    now = clock.now()
+                    part.stats.add(now - scheduler.deadline(offset))
+                    key = round(offset, 6)
+                    if key != group_key:
+                        if group_size > 1:
+                            skew.add(group_last - group_first)
+                        group_key, group_first, group_size = key, now, 0
+                    group_last = now
+                    group_size += 1
+                    if trace:
+                        t = trace.clock()
+                    repeat = mask & part.held
+                    if repeat:
+                        part.backend.release_mask(repeat)
+                    part.backend.press_mask(mask)
+                    if trace:
+                        trace.complete('chord', t, trace.clock(), 'dispatch', {'part': part.name, 'index': idx})
+                    part.held |= mask
+                    bit = mask
+                    while bit:
+                        low = bit & -bit
+                        part.owner[low] = idx
+                        bit ^= low
+                    part.played += 1
+                    hold = self.hold if part.hold is None else part.hold
+                    seq += 1
+                    heapq.heappush(queue, (offset + hold, RELEASE, seq, n, (mask, idx)))
+                else:
+                    part.stats.skipped += 1
+                nxt_idx = idx + 1
+                if nxt_idx < len(times):
+                    nxt = self._onset(part, nxt_idx)
+                    repeat = masks[nxt_idx] & part.held
+                    if repeat:
+                        seq += 1
+                        heapq.heappush(queue, (max((offset + nxt) / 2, nxt - RETRIGGER_GAP), RELEASE, seq, n,
+                                               (repeat, None)))
+                    seq += 1
+                    heapq.heappush(queue, (nxt, PRESS, seq, n, nxt_idx))
+                done += 1
+                self.progress.publish(done, total, offset * 1000)
+            if group_size > 1:
+                skew.add(group_last - group_first)
+        except BaseException:
+            # 异常退出时尽量抬起各声部仍按住的键，抬起失败也不覆盖原来的异常
+            for part in parts:
+                if part.held:
+                    try:
+                        part.backend.release_mask(part.held)
+                    except Exception:
+                        pass
+                    part.held = 0
+            raise
+        for part in parts:
+            if part.held:
+                part.backend.release_mask(part.held)
+                part.held = 0
+        return scheduler
+
+    def report(self):
+        """
+        各声部的演奏数和延迟统计(秒)，以及同一时刻起音的声部间偏差统计(秒)
+        """
+        return {
+            'parts': [dict(part.stats.summary(), name=part.name, backend=part.backend.name,
+                           chords=len(part.timeline), played=part.played) for part in self.parts],
+            'skew': self.skew.summary(),
+        }
+
+    def format_report(self):
+        lines = []
+        for part in self.parts:
+            lines.append(f"{part.name}（{part.backend.name}）：{part.played}/{len(part.timeline)}个和弦，"
+                         f"{part.stats.format()}")
+        s = self.skew.summary()
+        if s['count']:
+            lines.append(f"声部间偏差（{s['count']}处同时起音）平均{s['mean'] * 1000:.3f}ms / "
+                         f"P99 {s['p99'] * 1000:.3f}ms / 最大{s['max'] * 1000:.3f}ms")
+        return '\n'.join(lines)
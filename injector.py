@@ -0,0 +1,148 @@
+import sys
+import time
+
+# 按键注入层：一个和弦的所有按下（或抬起）事件组成一批，一次调用发出。
+# 扫描码在加载乐谱时解析好并预先组装成批，演奏时只做一次send。
+# Windows上用SendInput一次提交整批INPUT；其它平台退回keyboard库或pyautogui（关闭其每次调用后的PAUSE）；
+# FakeInjector只记录批次，用于在Linux上测试。
+
+
+class Injector:
+    """
+    注入器基类：resolve(按键)→扫描码，build([(扫描码, 是否抬起)])→批次，send(批次)
+    """
+    name = 'base'
+
+    def resolve(self, key):
+        return key
+
+    def build(self, events):
+        return tuple(events)
+
+    def send(self, batch):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FakeInjector(Injector):
+    """
+    不发送按键，只记录 (发送时刻, 批次内容)
+    """
+    name = 'fake'
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.batches = []
+
+    def send(self, batch):
+        self.batches.append((self.clock(), batch))
+
+
+class SendInputInjector(Injector):
+    """
+    Windows SendInput：整批INPUT数组一次提交，系统保证批内事件不被其它输入插入
+    """
+    name = 'sendinput'
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+        self.ctypes = ctypes
+        user32 = ctypes.WinDLL('user32', use_last_error=True)
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [('wVk', wintypes.WORD), ('wScan', wintypes.WORD), ('dwFlags', wintypes.DWORD),
+                        ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)]
+
+        class MOUSEINPUT(ctypes.Structure):
+            # 只为让联合体大小与系统定义一致
+            _fields_ = [('dx', wintypes.LONG), ('dy', wintypes.LONG), ('mouseData', wintypes.DWORD),
+                        ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t)]
+
+        class _INPUTUNION(ctypes.Union):
+            _fields_ = [('ki', KEYBDINPUT), ('mi', MOUSEINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _fields_ = [('type', wintypes.DWORD), ('u', _INPUTUNION)]
+
+        self.INPUT = INPUT
+        self.user32 = user32
+        user32.SendInput.argtypes = (wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int)
+        user32.SendInput.restype = wintypes.UINT
+
+    def resolve(self, key):
+        vk = self.user32.VkKeyScanW(ord(key.lower())) & 0xFF
+        return self.user32.MapVirtualKeyW(vk, 0)  # MAPVK_VK_TO_VSC
+
+    def build(self, events):
+        batch = (self.INPUT * len(events))()
+        for item, (scan, up) in zip(batch, events):
+            item.type = 1  # INPUT_KEYBOARD
+            item.u.ki.wScan = scan
+            item.u.ki.dwFlags = 0x0008 | (0x0002 if up else 0)  # KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP
+        return batch
+
+    def send(self, batch):
+        self.user32.SendInput(len(batch), batch, self.ctypes.sizeof(self.INPUT))
+
+
+class KeyboardInjector(Injector):
+    """
+    keyboard库：扫描码预先解析，批内逐个发送但不再有逐键的异常回退
+    """
+    name = 'keyboard'
+
+    def __init__(self):
+        import keyboard
+        self.keyboard = keyboard
+
+    def resolve(self, key):
+        return self.keyboard.key_to_scan_codes(key.lower())[0]
+
+    def send(self, batch):
+        press, release = self.keyboard.press, self.keyboard.release
+        for scan, up in batch:
+            if up:
+                release(scan)
+            else:
+                press(scan)
+
+
+class PyautoguiInjector(Injector):
+    """
+    pyautogui：关闭每次调用后的PAUSE等待；保留FAILSAFE（鼠标移到屏幕角落可中止演奏），按键名无需解析
+    """
+    name = 'pyautogui'
+
+    def __init__(self):
+        import pyautogui
+        pyautogui.PAUSE = 0
+        self.pyautogui = pyautogui
+
+    def resolve(self, key):
+        return key.lower()
+
+    def send(self, batch):
+        down, up = self.pyautogui.keyDown, self.pyautogui.keyUp
+        for key, is_up in batch:
+            if is_up:
+                up(key, _pause=False)
+            else:
+                down(key, _pause=False)
+
+
+def create_injector():
+    """
+    按平台选择可用的注入器：Windows优先SendInput，其次keyboard，最后pyautogui
+    """
+    candidates = (SendInputInjector, KeyboardInjector, PyautoguiInjector) if sys.platform == 'win32' \
+        else (KeyboardInjector, PyautoguiInjector)
+    errors = []
+    for cls in candidates:
+        try:
+            return cls()
+        except Exception as e:
+            errors.append(f"{cls.name}: {e}")
+    raise RuntimeError("没有可用的按键注入方式（" + "；".join(errors) + "）")
@@ -0,0 +1,340 @@
+import os
+import json
+import struct
+from array import array
+from bisect import bisect_right
+from startup import lazy_import
+from timeline import Timeline, MASK_TYPECODE, DEFAULT_BITS_PER_PAGE
+
+# MIDI导入：解析标准MIDI文件(SMF 0/1)的音符起始时刻，按拍量化，挑选最合适的移调放进15键(两个八度的C大调)，
+# 同一时刻的音符合并为和弦，输出Sky Studio格式的乐谱json或编译好的二进制缓存(.skc)。
+# 安装NumPy时一次性给所有候选移调打分、对整首曲子做向量化量化和换算；没有时用纯Python计算，结果相同。
+
+KEY_PITCHES = (60, 62, 64, 65, 67, 69, 71, 72, 74, 76, 77, 79, 81, 83, 84)  # 1Key0~1Key14 对应 C4~C6 的白键
+KEY_OF_PITCH = {p: i for i, p in enumerate(KEY_PITCHES)}
+SCALE_CLASSES = frozenset(p % 12 for p in KEY_PITCHES)
+MAX_SHIFT = 48  # 候选移调范围：±4个八度
+FOLD_WEIGHT = 0.5  # 超出音域、需移八度才能弹的音符在打分时按半个计
+DRUM_CHANNEL = 9  # 通道10为打击乐
+DEFAULT_DIVISION = 4  # 默认量化到十六分音符（每拍4格）
+DEFAULT_TEMPO = 500000  # 微秒/四分音符，即120bpm
+MIDI_SUFFIXES = ('.mid', '.midi')
+OUTPUT_FORMATS = ('json', 'skc')
+_LUT_LOW, _LUT_HIGH = -64, 192  # 移调后参与折叠的音高范围
+_numpy = None  # False表示未安装
+
+
+def _get_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            _numpy = lazy_import('numpy')
+        except ImportError:  # 可选依赖
+            _numpy = False
+    return _numpy
+
+
+class MidiFormatError(ValueError):
+    """
+    不是有效的MIDI文件
+    """
+
+
+class MidiSong:
+    """
+    解析结果：notes为[(tick, 音高, 力度, 通道)]（只含音符起始），tempos为[(tick, 微秒/四分音符)]
+    """
+    __slots__ = ('division', 'smpte', 'notes', 'tempos', 'name')
+
+    def __init__(self, division, smpte=None):
+        self.division = division  # 每四分音符的tick数；SMPTE计时时为每秒tick数
+        self.smpte = smpte
+        self.notes = []
+        self.tempos = []
+        self.name = ''
+
+
+def _read_vlq(data, pos):
+    value = 0
+    while True:
+        if pos >= len(data):
+            raise MidiFormatError("MIDI数据意外结束")
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, pos
+
+
+_DATA_LEN = {0x80: 2, 0x90: 2, 0xA0: 2, 0xB0: 2, 0xC0: 1, 0xD0: 1, 0xE0: 2}
+
+
+def _parse_track(data, song):
+    pos, tick, running = 0, 0, None
+    while pos < len(data):
+        delta, pos = _read_vlq(data, pos)
+        tick += delta
+        if pos >= len(data):
+            break
+        status = data[pos]
+        if status == 0xFF:
+            kind = data[pos + 1]
+            length, pos = _read_vlq(data, pos + 2)
+            payload = data[pos:pos + length]
+            pos += length
+            running = None
+            if kind == 0x51 and length == 3:
+                song.tempos.append((tick, int.from_bytes(payload, 'big')))
+            elif kind == 0x03 and not song.name:
+                song.name = payload.decode('utf-8', 'replace').strip()
+            elif kind == 0x2F:
+                break
+            continue
+        if status in (0xF0, 0xF7):
+            length, pos = _read_vlq(data, pos + 1)
+            pos += length
+            running = None
+            continue
+        if status & 0x80:
+            running = status
+            pos += 1
+        elif running is None:
+            raise MidiFormatError("MIDI事件缺少状态字节")
+        kind = running & 0xF0
+        size = _DATA_LEN.get(kind)
+        if size is None:
+            raise MidiFormatError(f"未知的MIDI事件: {running:#x}")
+        if kind == 0x90 and pos + 1 < len(data) and data[pos + 1] > 0:
+            song.notes.append((tick, data[pos], data[pos + 1], running & 0x0F))
+        pos += size
+
+
+def read_midi(raw):
+    """
+    解析MIDI文件内容(bytes)，返回MidiSong。格式2的各轨也按同时开始处理
+    """
+    if raw[:4] != b'MThd' or len(raw) < 14:
+        raise MidiFormatError("不是MIDI文件（缺少MThd头）")
+    header_len = struct.unpack('>I', raw[4:8])[0]
+    _, ntracks, division = struct.unpack('>HHH', raw[8:14])
+    if division & 0x8000:
+        fps, per_frame = 256 - (division >> 8), division & 0xFF
+        song = MidiSong(fps * per_frame, smpte=fps)
+    else:
+        song = MidiSong(division or 480)
+    pos = 8 + header_len
+    while pos + 8 <= len(raw) and ntracks:
+        kind, length = struct.unpack('>4sI', raw[pos:pos + 8])
+        pos += 8
+        if kind == b'MTrk':
+            _parse_track(raw[pos:pos + length], song)
+            ntracks -= 1
+        pos += length
+    song.tempos.sort()
+    return song
+
+
+def _tempo_segments(song):
+    # 速度段：(起始tick, 起始毫秒, 每tick毫秒)
+    if song.smpte:
+        return [(0, 0.0, 1000.0 / song.division)]
+    segments, tick0, ms0 = [], 0, 0.0
+    tempo = DEFAULT_TEMPO
+    for tick, new_tempo in song.tempos:
+        if tick > tick0:
+            segments.append((tick0, ms0, tempo / 1000.0 / song.division))
+            ms0 += (tick - tick0) * tempo / 1000.0 / song.division
+            tick0 = tick
+        tempo = new_tempo
+    segments.append((tick0, ms0, tempo / 1000.0 / song.division))
+    return segments
+
+
+def score_shifts(pitches, max_shift=MAX_SHIFT):
+    """
+    给每个候选移调打分，返回[(移调, 得分)]：移调后落在15键上的音符计1分，
+    音名在C大调内但超出音域（需移八度）的计FOLD_WEIGHT分，其余（黑键）不得分；同分时移调幅度小的略优先
+    """
+    hist = [0] * 128
+    for p in pitches:
+        hist[p] += 1
+    shifts = range(-max_shift, max_shift + 1)
+    np = _get_numpy()
+    if np:
+        shift_arr = np.arange(-max_shift, max_shift + 1)
+        target = np.arange(128)[None, :] + shift_arr[:, None]
+        exact = np.isin(target, KEY_PITCHES)
+        folded = ~exact & np.isin(target % 12, list(SCALE_CLASSES))
+        weights = exact + FOLD_WEIGHT * folded
+        scores = weights @ np.asarray(hist, dtype=np.float64) - np.abs(shift_arr) * 1e-3
+        return list(zip(shifts, scores.tolist()))
+    used = [(p, n) for p, n in enumerate(hist) if n]
+    result = []
+    for shift in shifts:
+        score = 0.0
+        for p, n in used:
+            q = p + shift
+            if q in KEY_OF_PITCH:
+                score += n
+            elif q % 12 in SCALE_CLASSES:
+                score += FOLD_WEIGHT * n
+        result.append((shift, score - abs(shift) * 1e-3))
+    return result
+
+
+def best_shift(pitches, max_shift=MAX_SHIFT):
+    if not pitches:
+        return 0
+    return max(score_shifts(pitches, max_shift), key=lambda item: item[1])[0]
+
+
+def _fold(pitch):
+    # 音名在C大调内、超出音域的音符移八度放进音域，返回键位索引；黑键返回None
+    if pitch % 12 not in SCALE_CLASSES:
+        return None
+    low, high = KEY_PITCHES[0], KEY_PITCHES[-1]
+    if pitch < low:
+        pitch = low + (pitch - low) % 12
+    elif pitch > high:
+        pitch = high - 12 + (pitch - high) % 12
+    return KEY_OF_PITCH.get(pitch)
+
+
+def convert(song, division=DEFAULT_DIVISION, shift=None, fold=True, drums=False):
+    """
+    把MidiSong转为Timeline：division为每拍量化格数（0不量化），shift为None时自动选移调。
+    返回(Timeline, 信息)，信息含notes/kept/folded/dropped/shift/bpm
+    """
+    notes = [n for n in song.notes if drums or n[3] != DRUM_CHANNEL]
+    pitches = [n[1] for n in notes]
+    if shift is None:
+        shift = best_shift(pitches)
+    segments = _tempo_segments(song)
+    grid = song.division / division if division and not song.smpte else 0
+    first_tempo = song.tempos[0][1] if song.tempos and song.tempos[0][0] == 0 else DEFAULT_TEMPO
+    info = {'notes': len(notes), 'kept': 0, 'folded': 0, 'dropped': 0, 'shift': shift,
+            'bpm': round(60000000 / first_tempo) if not song.smpte else 120}
+    if not notes:
+        return Timeline(array('I'), array(MASK_TYPECODE), info['bpm'], DEFAULT_BITS_PER_PAGE), info
+    np = _get_numpy()
+    if np:
+        times, masks, kept, folded = _map_numpy(np, notes, shift, fold, grid, segments)
+    else:
+        times, masks, kept, folded = _map_python(notes, shift, fold, grid, segments)
+    info.update(kept=kept, folded=folded, dropped=len(notes) - kept)
+    return Timeline(array('I', times), array(MASK_TYPECODE, masks), info['bpm'], DEFAULT_BITS_PER_PAGE), info
+
+
+def _map_numpy(np, notes, shift, fold, grid, segments):
+    ticks = np.fromiter((n[0] for n in notes), dtype=np.float64, count=len(notes))
+    pitch = np.fromiter((n[1] for n in notes), dtype=np.int64, count=len(notes)) + shift
+    if grid:
+        ticks = np.rint(ticks / grid) * grid
+    seg_tick, seg_ms, seg_rate = (np.asarray(col, dtype=np.float64) for col in zip(*segments))
+    idx = np.searchsorted(seg_tick, ticks, side='right') - 1
+    ms = np.rint(seg_ms[idx] + (ticks - seg_tick[idx]) * seg_rate[idx]).astype(np.int64)
+    lut = np.full(_LUT_HIGH - _LUT_LOW, -1, dtype=np.int64)  # 移调后的音高 -> 键位，-1为无法弹奏
+    for p in range(_LUT_LOW, _LUT_HIGH):
+        key = KEY_OF_PITCH.get(p)
+        if key is None and fold:
+            key = _fold(p)
+        if key is not None:
+            lut[p - _LUT_LOW] = key
+    in_range = (pitch >= _LUT_LOW) & (pitch < _LUT_HIGH)
+    keys = np.where(in_range, lut[np.clip(pitch - _LUT_LOW, 0, len(lut) - 1)], -1)
+    keep = keys >= 0
+    folded = int((keep & ~np.isin(pitch, KEY_PITCHES)).sum())
+    # 合并和弦：按时间排序后，同一时间的按键位按位或
+    ms, bits = ms[keep], np.left_shift(1, keys[keep])
+    order = np.argsort(ms, kind='stable')
+    ms, bits = ms[order], bits[order]
+    times, starts = np.unique(ms, return_index=True)
+    masks = np.bitwise_or.reduceat(bits, starts) if len(bits) else bits
+    return times.tolist(), masks.tolist(), len(bits), folded
+
+
+def _map_python(notes, shift, fold, grid, segments):
+    starts = [s[0] for s in segments]
+    chords, kept, folded = {}, 0, 0
+    for tick, pitch, _, _ in notes:
+        pitch += shift
+        key = KEY_OF_PITCH.get(pitch)
+        if key is None:
+            key = _fold(pitch) if fold and _LUT_LOW <= pitch < _LUT_HIGH else None
+            if key is None:
+                continue
+            folded += 1
+        if grid:
+            tick = round(tick / grid) * grid
+        seg_tick, seg_ms, rate = segments[bisect_right(starts, tick) - 1]
+        t = int(round(seg_ms + (tick - seg_tick) * rate))
+        chords[t] = chords.get(t, 0) | (1 << key)
+        kept += 1
+    times = sorted(chords)
+    return times, [chords[t] for t in times], kept, folded
+
+
+def to_sheet(timeline, name, shift=0):
+    """
+    生成Sky Studio格式的乐谱数据；pitchLevel记录移调前的调，游戏内设置该调即可还原原曲音高
+    """
+    notes = []
+    for t, mask in zip(timeline.times, timeline.masks):
+        for i in range(len(KEY_PITCHES)):
+            if mask >> i & 1:
+                notes.append({'time': int(t), 'key': f"1Key{i}"})
+    return [{'name': name, 'author': '', 'transcribedBy': 'MIDI导入', 'isComposed': True,
+             'bpm': timeline.bpm, 'bitsPerPage': timeline.bits_per_page, 'pitchLevel': (-shift) % 12,
+             'isEncrypted': False, 'songNotes': notes}]
+
+
+def import_midi(src_path, out_dir, fmt='json', division=DEFAULT_DIVISION, shift=None, fold=True,
+                drums=False, force=False, cache_dir=None):
+    """
+    导入单个MIDI文件，把乐谱json写入out_dir，返回(输出路径, 信息)；输出已存在且未指定force时抛出FileExistsError。
+    fmt为'skc'时同时在cache_dir（默认为预编译缓存目录）写入与该json对应的缓存，首次演奏即可直接mmap
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"未知的输出格式: {fmt}")
+    with open(src_path, 'rb') as f:
+        raw = f.read()
+    song = read_midi(raw)
+    timeline, info = convert(song, division, shift, fold, drums)
+    if not len(timeline):
+        raise MidiFormatError("没有可导入的音符")
+    filename = os.path.splitext(os.path.basename(src_path))[0] + '.json'
+    out_path = os.path.join(out_dir, filename)
+    if os.path.exists(out_path) and not force:
+        raise FileExistsError(f"已存在: {out_path}")
+    data = to_sheet(timeline, song.name or filename[:-5], info['shift'])
+    blob = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    tmp = out_path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(blob)
+    os.replace(tmp, out_path)
+    if fmt == 'skc':
+        # 缓存以写出的json为源文件（大小、mtime、sha1），与sheet_cache.build的结果相同
+        sheet_cache = lazy_import('sheet_cache')
+        sheet_index = lazy_import('sheet_index')
+        if cache_dir is None:
+            cache_dir = lazy_import('paths').SHEET_CACHE_DIR
+        st = os.stat(out_path)
+        meta = sheet_index.meta_from_head(data[0], len(data[0]['songNotes']), timeline.duration_ms())
+        sheet_cache.write_cache(sheet_cache.cache_path(cache_dir, filename), timeline, st.st_size, st.st_mtime_ns,
+                                sheet_cache.source_digest(blob), meta)
+    info['chords'] = len(timeline)
+    return out_path, info
+
+
+def find_midi_files(paths):
+    """
+    展开文件和文件夹（递归）为MIDI文件列表
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(MIDI_SUFFIXES))
+        else:
+            found.append(path)  # 不存在的文件也列出，导入时报告错误
+    return found
@@ -0,0 +1,16 @@
+import os
+import sys
+
+# 资源路径适配函数，兼容PyInstaller打包和开发环境
+def resource_path(relative_path):
+    base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_path, relative_path)
+
+# 配置
+SHEET_MUSIC_DIR = resource_path('Sheet Music')
+SHEET_CACHE_DIR = resource_path('Sheet Cache')  # 预编译乐谱缓存，与乐谱目录并列
+CONFIG_FILE = resource_path('config.json')
+INDEX_FILE = resource_path('sheet_index.json')
+FAVORITES_FILE = resource_path('favorites.json')
+STARTUP_REPORT_FILE = resource_path('startup_report.txt')  # 无控制台时的启动耗时报告
+TRACE_FILE = resource_path('trace.json')  # 性能跟踪（Chrome trace格式），汇总写入同名.txt
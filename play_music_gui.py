@@ -1,39 +1,33 @@
+from startup import STARTUP, lazy_import
 import os
+import sys
 import json
-import time
 import threading
+import queue
 import tkinter as tk
-from tkinter import ttk, messagebox
-import pyautogui
-import keyboard
-from collections import defaultdict
-import win32gui
-import win32process
-import win32con
-import psutil
-import sys
-import ctypes
-import webbrowser
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from paths import SHEET_MUSIC_DIR, SHEET_CACHE_DIR, CONFIG_FILE, INDEX_FILE, FAVORITES_FILE, STARTUP_REPORT_FILE, TRACE_FILE
+from dir_watcher import DirWatcher, ADDED, REMOVED
+from backends import KeyboardBackend
+from engine import PlaybackEngine, HOLD_TIME
+from transforms import apply_transforms, SPEED_RANGE
+from playlist import Playlist, Preloader, REPEAT_MODES, PLAYLIST_GAP
+from search_index import SearchIndex
+from sheet_index import SheetIndex
+from sheet_cache import load_timeline, load_timeline_progressive
+from timeline import SheetFormatError
+from virtual_list import VirtualListbox
+from window_locator import create_window_locator
+from sheet_stats import DIFFICULTY_LEVELS, difficulty_level
+from sheet_dedup import find_duplicates, duplicate_map
+from tracing import TRACE
+# keyboard、webbrowser等较重或平台相关的模块在首次使用时才导入（lazy_import）
+STARTUP.mark('imports')
 
-# 资源路径适配函数，兼容PyInstaller打包和开发环境
-def resource_path(relative_path):
-    base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
-    return os.path.join(base_path, relative_path)
-
-# 配置
-SHEET_MUSIC_DIR = resource_path('Sheet Music')
 if not os.path.exists(SHEET_MUSIC_DIR):
     os.makedirs(SHEET_MUSIC_DIR)
-note_to_key = {
-    "1Key0": "Y", "1Key1": "U", "1Key2": "I", "1Key3": "O", "1Key4": "P",
-    "1Key5": "H", "1Key6": "J", "1Key7": "K", "1Key8": "L", "1Key9": ";",
-    "1Key10": "N", "1Key11": "M", "1Key12": ",", "1Key13": ".", "1Key14": "/",
-    "2Key0": "Y", "2Key1": "U", "2Key2": "I", "2Key3": "O", "2Key4": "P",
-    "2Key5": "H", "2Key6": "J", "2Key7": "K", "2Key8": "L", "2Key9": ";",
-    "2Key10": "N", "2Key11": "M", "2Key12": ",", "2Key13": ".", "2Key14": "/"
-}
-
-CONFIG_FILE = resource_path('config.json')
+SEARCH_DEBOUNCE_MS = 150  # 搜索输入防抖间隔
+PROGRESS_POLL_MS = 66  # 演奏进度刷新间隔(约15Hz)，演奏线程不直接操作界面
 
 def is_dark_mode():
     try:
@@ -45,56 +39,6 @@ def is_dark_mode():
     except Exception:
         return False
 
-class AutoPlayer:
-    def __init__(self, notes_by_time, sorted_times):
-        self.notes_by_time = notes_by_time
-        self.sorted_times = sorted_times
-        self._stop = threading.Event()
-        self._pause = threading.Event()
-        self._pause.set()  # 初始为未暂停
-        self.current_idx = 0
-        self.is_playing = False
-
-    def play(self, update_status):
-        self.is_playing = True
-        self._stop.clear()
-        self._pause.set()
-        for idx in range(self.current_idx, len(self.sorted_times)):
-            if self._stop.is_set():
-                break
-            while not self._pause.is_set():
-                time.sleep(0.1)
-            t = self.sorted_times[idx]
-            keys = self.notes_by_time[t]
-            for k in keys:
-                key = note_to_key.get(k)
-                if key:
-                    pyautogui.keyDown(key)
-            time.sleep(0.05)
-            for k in keys:
-                key = note_to_key.get(k)
-                if key:
-                    pyautogui.keyUp(key)
-            update_status(f"演奏进度: {idx+1}/{len(self.sorted_times)}")
-            if idx < len(self.sorted_times) - 1:
-                interval = (self.sorted_times[idx + 1] - t) / 1000.0
-                if interval > 0:
-                    time.sleep(interval)
-            self.current_idx = idx + 1
-        self.is_playing = False
-        update_status("演奏结束！")
-
-    def stop(self):
-        self._stop.set()
-        self.is_playing = False
-        self.current_idx = 0
-
-    def pause(self):
-        self._pause.clear()
-
-    def resume(self):
-        self._pause.set()
-
 class MusicGUI:
     def __init__(self, root):
         self.root = root
@@ -102,6 +46,14 @@ class MusicGUI:
         # 读取窗口配置
         win_w, win_h = 600, 480
         x, y = None, None
+        self.hold_ms = int(HOLD_TIME * 1000)  # 全局按住时长(毫秒)
+        self.song_hold_ms = {}  # 文件名 -> 该曲目的按住时长(毫秒)
+        # 加载时执行的时间轴变换：quantize为每拍格数(0按bitsPerPage推算，None不量化)
+        self.transform_options = {'speed': 1.0, 'quantize': None, 'min_gap_ms': 0, 'humanize_ms': 0, 'seed': None}
+        # 连续播放：以当前列表（全部或收藏页）为播放列表，演奏时后台预加载下一首
+        self.playlist_options = {'enabled': False, 'shuffle': False, 'repeat': 'off', 'gap': PLAYLIST_GAP}
+        # 乐谱列表的排序字段和难度筛选（None为全部），依据元数据索引中的乐谱统计；collapse为合并显示重复乐谱
+        self.library_options = {'sort': 'default', 'level': None, 'collapse': False}
         if os.path.exists(CONFIG_FILE):
             try:
                 with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
@@ -110,6 +62,11 @@ class MusicGUI:
                 win_h = cfg.get('height', win_h)
                 x = cfg.get('x')
                 y = cfg.get('y')
+                self.hold_ms = cfg.get('hold_ms', self.hold_ms)
+                self.song_hold_ms = cfg.get('song_hold_ms', {})
+                self.transform_options.update(cfg.get('transforms', {}))
+                self.playlist_options.update(cfg.get('playlist', {}))
+                self.library_options.update(cfg.get('library', {}))
             except Exception:
                 pass
         if x is not None and y is not None:
@@ -120,6 +77,7 @@ class MusicGUI:
             x = (screen_w - win_w) // 2
             y = (screen_h - win_h) // 2
             self.root.geometry(f"{win_w}x{win_h}+{x}+{y}")
+        STARTUP.mark('config')
         self.root.resizable(True, True)
         self.root.minsize(480, 360)
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -147,23 +105,60 @@ class MusicGUI:
             'name': tk.StringVar(),
             'author': tk.StringVar(),
             'transcribedBy': tk.StringVar(),
+            'stats': tk.StringVar(),
         }
         self.filtered_music_files = []  # 先初始化，防止后续方法引用时报错
         self.favorites = set()  # 收藏的乐谱文件名集合，可持久化
-        self.favorite_file = resource_path('favorites.json')  # 用resource_path，兼容打包
+        self.favorite_file = FAVORITES_FILE  # paths中已用resource_path，兼容打包
         self.load_favorites()  # 启动时加载收藏
+        self.sheet_index = SheetIndex(INDEX_FILE, SHEET_MUSIC_DIR)  # 乐谱元数据索引
+        self.sheet_index.load()
+        STARTUP.mark('sheet index')
+        self.search_index = None  # 后台建立，完成前搜索退回文件名匹配
+        self._search_lock = threading.Lock()  # 保护search_index的替换、增量更新和_search_logs
+        self._search_logs = []  # 每个正在进行的重建各有一份：列目录之后的目录事件，换入新索引前补上
+        self.duplicates = {}  # 文件名 -> 所在重复组的文件名列表，后台根据索引中的哈希和指纹计算
+        self._search_after = None
+        self._search_seq = 0
+        self.ui_calls = queue.Queue()  # 后台线程通过post_to_ui把回调交给界面线程执行
+        self.meta_requests = queue.LifoQueue()  # 后进先出：最新选中/可见的曲谱优先加载
+        self._meta_pending = set()
         self.create_widgets()
-        # 关键：初始化后立即加载乐谱列表并刷新
-        self.all_music_files = self.get_all_music_files() or []
+        STARTUP.mark('widgets')
+        # 先用上次保存的元数据索引显示乐谱列表，不等待扫描目录；目录的实际内容在后台核对
+        # （索引为空，例如首次运行时，才同步列出目录）
+        self.all_music_files = list(self.sheet_index.entries) or self.get_all_music_files()
         self.filtered_music_files = self.all_music_files.copy()
         self.refresh_music_listbox()
-        self.player = None
+        STARTUP.mark('sheet list')
+        self.player = None  # PlaybackEngine
+        self.backend = None  # 按键输出后端，首次演奏时创建
+        self.window_locator = None  # 游戏窗口定位器，首次演奏时创建
         self.music_data = None
-        self.notes_by_time = None
-        self.sorted_times = None
-        self.play_thread = None
-        self.last_music_files = set(self.all_music_files or [])
-        self.schedule_music_dir_watch()
+        self.timeline = None
+        self.current_music_file = None
+        self.seek_file = None  # 进度条位置所属的乐谱
+        self.loop_points = None  # (文件名, A点毫秒, B点毫秒或None)
+        self._last_progress = None
+        self._seek_dragging = False
+        self._shown_track = None
+        self._shown_duration = None
+        self._transform_kw = {}
+        self.playlist = None
+        self.preloader = None
+        self.pump_ui_calls()
+        threading.Thread(target=self.meta_worker, daemon=True).start()
+        self.start_refresh_sheet_index()
+        self.start_music_dir_watch()
+        self.root.after_idle(self.on_first_idle)
+
+    def on_first_idle(self):
+        # 窗口首次绘制完成，输出启动耗时报告（仅在启用时）
+        STARTUP.mark('first frame')
+        STARTUP.emit(STARTUP_REPORT_FILE)
+
+    def open_url(self, url):
+        lazy_import('webbrowser').open(url)
 
     def set_style(self):
         style = ttk.Style()
@@ -252,6 +247,9 @@ class MusicGUI:
         # 文件名
         ttk.Label(self.music_info_frame, text="文件名:", width=7, anchor="e").grid(row=3, column=0, sticky="e", pady=(6,0))
         ttk.Label(self.music_info_frame, textvariable=self.music_info_vars['filename'], width=18, anchor="w", font=("微软雅黑", 9), foreground="#888").grid(row=3, column=1, sticky="w", pady=(6,0))
+        # 难度与密度
+        ttk.Label(self.music_info_frame, text="难度:", width=7, anchor="e").grid(row=4, column=0, sticky="e", pady=(2,0))
+        ttk.Label(self.music_info_frame, textvariable=self.music_info_vars['stats'], width=18, anchor="w", font=("微软雅黑", 9), foreground="#888").grid(row=4, column=1, sticky="w", pady=(2,0))
         # ====== 左侧乐谱区 ======
         left_frame = ttk.Frame(main_frame, width=220)
         left_frame.grid(row=0, column=0, sticky="nswe", padx=(10, 0), pady=10)
@@ -274,11 +272,31 @@ class MusicGUI:
         self.search_var = tk.StringVar()
         self.search_entry = ttk.Entry(left_frame, textvariable=self.search_var, font=("微软雅黑", 10), width=18)
         self.search_entry.pack(fill="x", padx=(0, 2), pady=(0, 6))
-        self.search_entry.bind('<KeyRelease>', self.on_search)
+        self.search_entry.bind('<KeyRelease>', self.on_search_key)
+
+        # ====== 排序与难度筛选 ======
+        order_frame = ttk.Frame(left_frame)
+        order_frame.pack(fill="x", pady=(0, 6))
+        self.sort_labels = {'default': "默认顺序", 'difficulty': "按难度", 'duration': "按时长", 'nps_mean': "按密度"}
+        self.sort_var = tk.StringVar(value=self.sort_labels.get(self.library_options['sort'], "默认顺序"))
+        sort_box = ttk.Combobox(order_frame, textvariable=self.sort_var, values=list(self.sort_labels.values()),
+                                state="readonly", width=8)
+        sort_box.pack(side="left")
+        sort_box.bind('<<ComboboxSelected>>', lambda e: self.refresh_music_listbox())
+        self.level_labels = ["全部难度"] + [name for name, _ in reversed(DIFFICULTY_LEVELS)]
+        self.level_var = tk.StringVar(value=self.library_options['level'] or "全部难度")
+        level_box = ttk.Combobox(order_frame, textvariable=self.level_var, values=self.level_labels,
+                                 state="readonly", width=8)
+        level_box.pack(side="left", padx=(4, 0))
+        level_box.bind('<<ComboboxSelected>>', lambda e: self.refresh_music_listbox())
+        self.collapse_var = tk.BooleanVar(value=self.library_options['collapse'])
+        ttk.Checkbutton(order_frame, text="合并重复", variable=self.collapse_var,
+                        command=self.refresh_music_listbox).pack(side="left", padx=(4, 0))
 
         # ====== 乐谱列表区 ======
         # 可自定义：height 控制显示行数，width 控制显示宽度
-        self.music_listbox = tk.Listbox(left_frame, width=22, height=22, font=("微软雅黑", 10), activestyle='dotbox', borderwidth=1, relief='solid')
+        # 虚拟化列表：只渲染可见行，可见行的曲谱信息在后台懒加载
+        self.music_listbox = VirtualListbox(left_frame, on_visible=self.prefetch_song_info, width=22, height=22, font=("微软雅黑", 10), activestyle='dotbox', borderwidth=1, relief='solid')
         self.music_listbox.pack(fill="both", expand=True)
         self.music_listbox.bind('<<ListboxSelect>>', self.on_listbox_select)
         self.music_listbox.bind('<Button-3>', self.on_music_listbox_right_click)  # 右键菜单
@@ -304,6 +322,12 @@ class MusicGUI:
         ttk.Label(time_inner, textvariable=self.elapsed_time_var, font=("Consolas", 11, "bold"), foreground=self.accent, width=7, anchor="e").pack(side="left")
         ttk.Label(time_inner, text="/", font=("微软雅黑", 10, "bold"), foreground="#888", width=2, anchor="center").pack(side="left", padx=2)
         ttk.Label(time_inner, textvariable=self.total_time_var, font=("Consolas", 11, "bold"), foreground="#888", width=7, anchor="w").pack(side="left")
+        # 进度条：拖动后跳转（演奏中立即跳转，停止时作为下次开始的位置）
+        self.seek_var = tk.DoubleVar(value=0)
+        self.seek_scale = ttk.Scale(center_frame, from_=0, to=1, variable=self.seek_var, orient="horizontal")
+        self.seek_scale.pack(fill="x", padx=16)
+        self.seek_scale.bind('<ButtonPress-1>', lambda e: setattr(self, '_seek_dragging', True))
+        self.seek_scale.bind('<ButtonRelease-1>', self.on_seek_release)
         # 操作按钮组
         btn_frame = ttk.Frame(center_frame, width=220)
         btn_frame.pack(pady=12)
@@ -312,11 +336,38 @@ class MusicGUI:
         self.start_btn.grid(row=0, column=0, padx=10, pady=6)
         self.stop_btn = ttk.Button(btn_frame, text="停止 (F7)", command=self.stop_play, state="disabled", style='Accent.TButton', width=14)
         self.stop_btn.grid(row=0, column=1, padx=10, pady=6)
+        self.pause_btn = ttk.Button(btn_frame, text="暂停", command=self.toggle_pause, state="disabled", width=14)
+        self.pause_btn.grid(row=1, column=0, padx=10, pady=2)
+        loop_frame = ttk.Frame(btn_frame)
+        loop_frame.grid(row=1, column=1, padx=10, pady=2)
+        ttk.Button(loop_frame, text="A", command=self.set_loop_a, width=3).pack(side="left")
+        ttk.Button(loop_frame, text="B", command=self.set_loop_b, width=3).pack(side="left", padx=2)
+        ttk.Button(loop_frame, text="清除", command=self.clear_loop, width=5).pack(side="left")
+        speed_frame = ttk.Frame(btn_frame)
+        speed_frame.grid(row=2, column=0, columnspan=2, pady=2)
+        ttk.Label(speed_frame, text="速度倍率").pack(side="left")
+        self.speed_var = tk.StringVar(value=str(self.transform_options['speed']))
+        lo, hi = SPEED_RANGE
+        ttk.Spinbox(speed_frame, from_=lo, to=hi, increment=0.05, textvariable=self.speed_var, width=6).pack(side="left", padx=4)
+        playlist_frame = ttk.Frame(btn_frame)
+        playlist_frame.grid(row=3, column=0, columnspan=2, pady=2)
+        self.playlist_var = tk.BooleanVar(value=self.playlist_options['enabled'])
+        self.shuffle_var = tk.BooleanVar(value=self.playlist_options['shuffle'])
+        self.repeat_labels = dict(zip(REPEAT_MODES, ("不循环", "列表循环", "单曲循环")))
+        self.repeat_var = tk.StringVar(value=self.repeat_labels.get(self.playlist_options['repeat'], "不循环"))
+        ttk.Checkbutton(playlist_frame, text="连续播放", variable=self.playlist_var).pack(side="left")
+        ttk.Checkbutton(playlist_frame, text="随机", variable=self.shuffle_var).pack(side="left", padx=4)
+        ttk.Combobox(playlist_frame, textvariable=self.repeat_var, values=list(self.repeat_labels.values()),
+                     state="readonly", width=8).pack(side="left")
         # 状态栏
         self.status_label = ttk.Label(center_frame, textvariable=self.status_var, anchor="center", font=("微软雅黑", 10, "bold"), background=self.bg_color, foreground=self.accent, width=32)
         self.status_label.pack(pady=6, fill="x")
-        # 设置Tab内容
-        self.create_hotkey_settings(parent=settings_tab)
+        # 说明Tab的内容首次切换到该页时再创建，不占用首屏时间
+        notebook.bind('<<NotebookTabChanged>>', lambda e: self.on_notebook_tab_changed(notebook, settings_tab))
+
+    def on_notebook_tab_changed(self, notebook, settings_tab):
+        if notebook.select() == str(settings_tab) and not settings_tab.winfo_children():
+            self.create_hotkey_settings(parent=settings_tab)
 
     def create_hotkey_settings(self, parent=None):
         frame = ttk.LabelFrame(parent or self.root, text="程序说明", padding=14)
@@ -324,11 +375,11 @@ class MusicGUI:
         # 作者超链接
         author_label = tk.Label(frame, text="作者: 傅卿何（点击访问主页）", fg="#3366cc", cursor="hand2", font=("微软雅黑", 10, "underline"))
         author_label.grid(row=0, column=0, sticky="w", padx=4, pady=4)
-        author_label.bind("<Button-1>", lambda e: webbrowser.open("https://gitee.com/Tloml-Starry"))
+        author_label.bind("<Button-1>", lambda e: self.open_url("https://gitee.com/Tloml-Starry"))
         # 交流群超链接
         group_label = tk.Label(frame, text="交流群（点击加入）", fg="#3366cc", cursor="hand2", font=("微软雅黑", 10, "underline"))
         group_label.grid(row=1, column=0, sticky="w", padx=4, pady=4)
-        group_label.bind("<Button-1>", lambda e: webbrowser.open("https://qm.qq.com/q/XVf2HjGJgK"))
+        group_label.bind("<Button-1>", lambda e: self.open_url("https://qm.qq.com/q/XVf2HjGJgK"))
         # 其它说明
         ttk.Label(frame, text="本程序完全免费，仅供学习交流，严禁商用.").grid(row=2, column=0, sticky="w", padx=4, pady=4)
         ttk.Label(frame, text="右键曲谱可以收藏曲谱，方便下次演奏.").grid(row=3, column=0, sticky="w", padx=4, pady=4)
@@ -339,6 +390,25 @@ class MusicGUI:
         ttk.Label(frame, textvariable=self.hotkey_vars['start'], font=("微软雅黑", 10, "bold"), foreground=self.accent).grid(row=0, column=1, sticky="w", padx=4, pady=4)
         ttk.Label(frame, text="停止:").grid(row=2, column=0, sticky="e", padx=4, pady=4)
         ttk.Label(frame, textvariable=self.hotkey_vars['stop'], font=("微软雅黑", 10, "bold"), foreground=self.accent).grid(row=2, column=1, sticky="w", padx=4, pady=4)
+        # 性能跟踪：记录查找窗口、加载乐谱、每个和弦的发送耗时等，导出后可在 chrome://tracing 或 Perfetto 中查看
+        frame = ttk.LabelFrame(parent or self.root, text="性能跟踪", padding=14)
+        frame.pack(pady=10, fill="x", padx=8)
+        self.trace_var = tk.BooleanVar(value=TRACE.enabled)
+        ttk.Checkbutton(frame, text="记录性能跟踪", variable=self.trace_var,
+                        command=lambda: TRACE.enable(self.trace_var.get())).grid(row=0, column=0, sticky="w", padx=4, pady=4)
+        ttk.Button(frame, text="导出跟踪", command=self.export_trace).grid(row=0, column=1, sticky="w", padx=4, pady=4)
+
+    def export_trace(self):
+        if not TRACE.events:
+            self.status_var.set("还没有跟踪记录，请勾选“记录性能跟踪”后演奏")
+            return
+        try:
+            json_path, summary_path = TRACE.write(TRACE_FILE)
+        except OSError as e:
+            messagebox.showerror("错误", f"导出跟踪失败: {e}")
+            return
+        TRACE.clear()
+        self.status_var.set(f"已导出 {os.path.basename(json_path)} 和 {os.path.basename(summary_path)}")
 
     def get_all_music_files(self):
         return [f for f in os.listdir(SHEET_MUSIC_DIR) if f.endswith('.json')]
@@ -353,30 +423,124 @@ class MusicGUI:
                 files = self.filtered_music_files or []
         else:
             files = self.filtered_music_files or []
-        self.music_listbox.delete(0, tk.END)
-        # 只显示文件名（带.json），不做display_name截断，保证索引一一对应
-        for f in files:
-            self.music_listbox.insert(tk.END, f)
+        files = self.collapse_duplicates(self.order_music_files(files))
+        # 只显示文件名（带.json），列表按差异更新，原选中项仍在列表中时保持选中
+        self.music_listbox.set_items(files)
         if files:
-            self.music_listbox.selection_set(0)
-            self.update_song_info(files[0])
+            if not self.music_listbox.curselection():
+                self.music_listbox.selection_set(0)
+            self.update_song_info(self.music_listbox.get(self.music_listbox.curselection()[0]))
         else:
             self.update_song_info(None)
 
+    def get_sort_key(self):
+        labels = {v: k for k, v in self.sort_labels.items()}
+        return labels.get(self.sort_var.get(), 'default')
+
+    def get_level(self):
+        level = self.level_var.get()
+        return level if level in self.level_labels[1:] else None
+
+    def order_music_files(self, files):
+        # 按索引中的乐谱统计筛选和排序（从易到难、从短到长、从疏到密）；还没有统计的乐谱排在最后，筛选时不显示
+        key, level = self.get_sort_key(), self.get_level()
+        if key == 'default' and level is None:
+            return files
+        entries = self.sheet_index.entries
+
+        def stats_of(filename):
+            entry = entries.get(filename)
+            return entry.get('stats') if entry else None
+        if level is not None:
+            files = [f for f in files if stats_of(f) and difficulty_level(stats_of(f)['difficulty']) == level]
+        if key == 'duration':
+            return sorted(files, key=lambda f: entries[f]['duration'] if stats_of(f) else float('inf'))
+        if key != 'default':
+            return sorted(files, key=lambda f: stats_of(f)[key] if stats_of(f) else float('inf'))
+        return files
+
+    def collapse_duplicates(self, files):
+        # 每个重复组只保留在当前顺序中最先出现的一个
+        if not (self.duplicates and self.collapse_var.get()):
+            return files
+        seen = set()
+        result = []
+        for f in files:
+            group = self.duplicates.get(f)
+            if group is None:
+                result.append(f)
+            elif group[0] not in seen:
+                seen.add(group[0])
+                result.append(f)
+        return result
+
+    def update_duplicates(self):
+        # 后台线程：按索引中的内容哈希和指纹查找重复组，结果交给界面线程
+        self.post_to_ui(self.apply_duplicates, duplicate_map(find_duplicates(self.sheet_index.snapshot())))
+
+    def apply_duplicates(self, duplicates):
+        changed = duplicates != self.duplicates
+        self.duplicates = duplicates
+        if changed and self.collapse_var.get():
+            self.refresh_music_listbox()
+
+    def post_to_ui(self, func, *args):
+        # 可在任意线程调用，func会在界面线程中执行
+        self.ui_calls.put((func, args))
+
+    def pump_ui_calls(self):
+        while True:
+            try:
+                func, args = self.ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            with TRACE.span(getattr(func, '__name__', 'ui call'), 'ui'):
+                func(*args)
+        self.root.after(50, self.pump_ui_calls)
+
+    def on_search_key(self, event=None):
+        # 输入防抖：停止输入一小段时间后才搜索
+        if self._search_after:
+            self.root.after_cancel(self._search_after)
+        self._search_after = self.root.after(SEARCH_DEBOUNCE_MS, self.on_search)
+
     def on_search(self, event=None):
-        keyword = self.search_var.get().lower()
-        if not keyword:
+        self._search_after = None
+        keyword = self.search_var.get()
+        self._search_seq += 1
+        if not keyword.strip():
             self.filtered_music_files = self.all_music_files.copy()
+            self.refresh_music_listbox()
+            return
+        # 搜索在后台线程执行，界面线程只取结果
+        threading.Thread(target=self.run_search, args=(self._search_seq, keyword, list(self.all_music_files)),
+                         daemon=True).start()
+
+    def run_search(self, seq, keyword, files):
+        index = self.search_index
+        if index is None:
+            # 索引尚未建立时退回文件名匹配
+            kw = keyword.lower()
+            results = [f for f in files if kw in f.lower()]
         else:
-            self.filtered_music_files = [f for f in self.all_music_files if keyword in f.lower()]
-        self.refresh_music_listbox()
+            known = set(files)
+            results = [f for f in index.search(keyword) if f in known]
+        self.post_to_ui(self.apply_search_results, seq, results)
+
+    def apply_search_results(self, seq, results):
+        if seq == self._search_seq:  # 丢弃过期的搜索结果
+            self.filtered_music_files = results
+            self.refresh_music_listbox()
 
     def on_listbox_select(self, event=None):
         sel = self.music_listbox.curselection()
         if sel:
-            filename = self.filtered_music_files[sel[0]]
+            filename = self.music_listbox.get(sel[0])
             self.update_song_info(filename)
-            self.status_var.set(f"已选择乐谱: {filename}")
+            others = len(self.duplicates.get(filename, ())) - 1
+            self.status_var.set(f"已选择乐谱: {filename}" + (f"（另有{others}个重复版本）" if others > 0 else ""))
+            if not (self.player and self.player.is_playing) and filename != self.seek_file:
+                self.seek_var.set(0)
 
     def refresh_music_list(self):
         # 兼容旧接口，实际不再用
@@ -385,202 +549,372 @@ class MusicGUI:
         self.refresh_music_listbox()
 
     def update_song_info(self, filename):
-        # 页面信息区展示选中曲谱详细信息
-        import os
-        import json
+        # 页面信息区展示选中曲谱详细信息，数据来自元数据索引；索引中没有时后台加载，不阻塞界面
+        self.music_info_vars['filename'].set(filename or "")
         if not filename:
-            self.music_info_vars['filename'].set("")
-            self.music_info_vars['name'].set("")
-            self.music_info_vars['author'].set("")
-            self.music_info_vars['transcribedBy'].set("")
+            self.show_song_meta(None)
             return
-        self.music_info_vars['filename'].set(filename)
-        path = os.path.join(SHEET_MUSIC_DIR, filename)  # SHEET_MUSIC_DIR已用resource_path
-        encodings = ['utf-8', 'utf-8-sig', 'gbk', 'utf-16', 'utf-16-le', 'utf-16-be']
-        data = None
-        last_err = None
-        for enc in encodings:
-            try:
-                with open(path, 'r', encoding=enc) as f:
-                    data = json.load(f)
-                break
-            except Exception as e:
-                last_err = e
-                data = None
-        if data is None:
+        entry = self.sheet_index.peek(filename)
+        self.show_song_meta(entry)
+        if entry is None:
+            self.request_song_meta(filename)
+
+    def show_song_meta(self, entry):
+        playing = getattr(self, 'player', None) and self.player.is_playing
+        if not entry or not entry.get('valid'):
             self.music_info_vars['name'].set('')
             self.music_info_vars['author'].set('')
             self.music_info_vars['transcribedBy'].set('')
+            self.music_info_vars['stats'].set('')
+            if not playing:
+                self.total_time_var.set("0:00")
             return
-        meta = {}
-        # 兼容多种结构
-        if isinstance(data, dict):
-            meta = data
-        elif isinstance(data, list) and len(data) > 0:
-            # 优先第一个元素
-            if isinstance(data[0], dict):
-                meta = data[0]
-            else:
-                for item in data:
-                    if isinstance(item, dict) and ('songName' in item or 'name' in item):
-                        meta = item
-                        break
-        # 兼容不同字段名
-        name = meta.get('songName') or meta.get('name') or ''
-        author = meta.get('author') or ''
-        transcribed = meta.get('transcribedBy') or meta.get('transcriber') or ''
-        self.music_info_vars['name'].set(name)
-        self.music_info_vars['author'].set(author)
-        self.music_info_vars['transcribedBy'].set(transcribed)
+        self.music_info_vars['name'].set(entry['name'])
+        self.music_info_vars['author'].set(entry['author'])
+        self.music_info_vars['transcribedBy'].set(entry['transcribedBy'])
+        stats = entry.get('stats')
+        if stats:
+            self.music_info_vars['stats'].set(
+                f"{stats['difficulty']:.1f} {difficulty_level(stats['difficulty'])}  "
+                f"{stats['nps_mean']:.1f}键/秒 峰值{stats['nps_peak']}")
+        else:
+            self.music_info_vars['stats'].set('')
+        if not playing:
+            # 演奏前显示乐谱总时长（演奏中由show_track显示变换后的时长）
+            self.total_time_var.set(self.format_ms(entry['duration'] * 1000))
+
+    def request_song_meta(self, filename):
+        if filename not in self._meta_pending:
+            self._meta_pending.add(filename)
+            self.meta_requests.put(filename)
+
+    def meta_worker(self):
+        # 后台线程：解析索引中缺失或过期的曲谱
+        while True:
+            filename = self.meta_requests.get()
+            entry = self.sheet_index.get(filename)
+            self.post_to_ui(self.on_song_meta_loaded, filename, entry)
+
+    def on_song_meta_loaded(self, filename, entry):
+        self._meta_pending.discard(filename)
+        if self.music_info_vars['filename'].get() == filename:
+            self.show_song_meta(entry)
+
+    def prefetch_song_info(self, visible):
+        # 虚拟列表可见行变化时预取这些曲谱的信息
+        for filename in visible:
+            if filename not in self._meta_pending and self.sheet_index.peek(filename) is None:
+                self.request_song_meta(filename)
+
+    def refresh_sheet_index(self, shown):
+        # 后台线程：列出目录，把与索引显示的列表的差异交给界面线程；
+        # 再同步索引，只重新扫描新增或改动的文件，随后建立搜索索引
+        # 列目录之前就开始记录监视事件：之后的改动不在filenames里，要补到新建的搜索索引上
+        log = []
+        with self._search_lock:
+            self._search_logs.append(log)
+        try:
+            filenames = self.get_all_music_files()
+            known, present = set(shown), set(filenames)
+            events = [(ADDED, f) for f in filenames if f not in known] + [(REMOVED, f) for f in shown if f not in present]
+            if events:
+                self.post_to_ui(self.apply_music_dir_events, events)
+            self.build_search_index(filenames, log)
+            if self.sheet_index.refresh(filenames):
+                self.build_search_index(filenames, log)
+                self.post_to_ui(self.refresh_music_listbox)  # 新的乐谱统计可能改变排序和筛选结果
+        finally:
+            with self._search_lock:
+                self._search_logs.remove(log)
+        self.update_duplicates()
+        self.sheet_index.save()
+
+    def build_search_index(self, filenames, log):
+        # 锁外建立新索引；换入前在锁内补上期间记录的目录事件，监视线程的改动不会留在被替换的旧索引里
+        index = SearchIndex()
+        index.build((f, self.sheet_index.entries.get(f)) for f in filenames)
+        with self._search_lock:
+            for kind, name, entry in log:
+                self.apply_search_event(index, kind, name, entry)
+            self.search_index = index
+
+    @staticmethod
+    def apply_search_event(index, kind, name, entry):
+        # 重复应用结果不变：同一事件会补到两次重建的索引上，也可能已在旧索引上应用过
+        if kind == REMOVED:
+            index.remove(name)
+        else:
+            index.add(name, entry)
+
+    def start_refresh_sheet_index(self):
+        threading.Thread(target=self.refresh_sheet_index, args=(list(self.all_music_files),), daemon=True).start()
 
     def start_play(self):
-        if not self.check_and_set_game_window():
+        with TRACE.span('find game window', 'start'):
+            found = self.check_and_set_game_window()
+        if not found:
             return
         if self.player and self.player.is_playing:
             return
-        if not self.load_music():
+        with TRACE.span('load music', 'start'):
+            loaded = self.load_music()
+        if not loaded:
             return
-        self.player = AutoPlayer(self.notes_by_time, self.sorted_times)
-        self.play_thread = threading.Thread(target=self.play_with_progress, args=(self.status_var.set,))
-        self.play_thread.daemon = True
-        self.play_thread.start()
+        # 变速/量化/抖动在加载时一次性算好，演奏时只读最终时间；参数在界面线程取好，预加载线程不访问Tk
+        self._transform_kw = self.current_transform_kw()
+        with TRACE.span('apply transforms', 'start'):
+            timeline = apply_transforms(self.timeline, **self._transform_kw)
+        if self.backend is None:
+            with TRACE.span('create backend', 'start'):
+                self.backend = KeyboardBackend()
+        self.player = PlaybackEngine(self.backend, hold=self.hold_ms / 1000)
+        with TRACE.span('prepare keys', 'start'):
+            self.player.load(timeline, hold=self.song_hold(self.current_music_file), track=self.current_music_file)
+        self.start_playlist()
+        # 从进度条所在位置开始，A-B循环只对当前选中的乐谱有效
+        self.show_track(self.current_music_file, timeline.duration_ms())
+        if self.loop_points and self.loop_points[0] == self.current_music_file:
+            _, a_ms, b_ms = self.loop_points
+            if b_ms is not None:
+                self.player.set_loop(a_ms, b_ms)
+        else:
+            self.loop_points = None
+        self.player.seek(self.seek_var.get() if self.seek_file == self.current_music_file else 0)
+        self.player.play()
+        self.poll_playback(self.player)
         self.start_btn.config(state="disabled")
         self.stop_btn.config(state="normal")
+        self.pause_btn.config(state="normal", text="暂停")
         self.status_var.set("演奏中... 可用F7停止")
 
-    def play_with_progress(self, update_status):
-        import keyboard
-        if self.sorted_times is None or self.notes_by_time is None or self.player is None:
-            update_status("未加载乐谱，无法演奏！")
+    def current_transform_kw(self):
+        opts = self.transform_options
+        return {'speed': self.get_speed(), 'quantize_division': opts['quantize'], 'min_gap_ms': opts['min_gap_ms'],
+                'jitter_ms': opts['humanize_ms'], 'seed': opts['seed']}
+
+    def song_hold(self, filename):
+        # 该曲目的按住时长(秒)，未单独设置时返回None使用全局值
+        ms = self.song_hold_ms.get(filename)
+        return ms / 1000 if ms is not None else None
+
+    def get_repeat(self):
+        for mode, label in self.repeat_labels.items():
+            if label == self.repeat_var.get():
+                return mode
+        return 'off'
+
+    def start_playlist(self):
+        """
+        连续播放：从当前曲目开始按列表顺序（或随机）播放，下一首在后台线程预加载
+        """
+        if self.preloader:
+            self.preloader.close()
+            self.preloader = None
+        self.playlist = None
+        if not self.playlist_var.get():
             return
-        total = len(self.sorted_times)
-        if total == 0:
+        items = list(self.music_listbox.items)
+        if self.current_music_file not in items:
+            return
+        self.playlist = Playlist(items, start=self.current_music_file, shuffle=self.shuffle_var.get(),
+                                 repeat=self.get_repeat())
+        self.preloader = Preloader(self.load_playlist_song)
+        self.player.gap = self.playlist_options['gap']
+        self.player.next_provider = self.next_playlist_song
+        following = self.playlist.peek()
+        if following:
+            self.preloader.request(following)
+
+    def load_playlist_song(self, filename):
+        # 预加载线程中执行
+        timeline = load_timeline(os.path.join(SHEET_MUSIC_DIR, filename), SHEET_CACHE_DIR)
+        return apply_transforms(timeline, **self._transform_kw)
+
+    def next_playlist_song(self):
+        # 演奏线程中调用：取出已预加载好的下一首，同时预加载再下一首；坏乐谱跳过
+        playlist, preloader = self.playlist, self.preloader
+        if playlist is None or preloader is None:
+            return None
+        for _ in range(len(playlist)):
+            filename = playlist.advance()
+            if filename is None:
+                return None
+            try:
+                timeline = preloader.get(filename)
+            except Exception:
+                continue
+            following = playlist.peek()
+            if following:
+                preloader.request(following)
+            if len(timeline):
+                return filename, timeline, self.song_hold(filename)
+        return None
+
+    def show_track(self, filename, duration):
+        # 切换到新曲目时刷新总时长、进度条和乐谱信息
+        self.current_music_file = filename
+        self.seek_scale.config(to=max(1, duration))
+        self.total_time_var.set(self.format_ms(duration))
+        self._shown_track = filename
+        self._shown_duration = duration
+
+    def get_speed(self):
+        # 输入无效时回退到1倍速
+        try:
+            speed = float(self.speed_var.get())
+        except (ValueError, tk.TclError):
+            return 1.0
+        lo, hi = SPEED_RANGE
+        return min(max(speed, lo), hi)
+
+    @staticmethod
+    def format_ms(ms):
+        m, s = divmod(int(ms / 1000), 60)
+        return f"{m}:{s:02d}"
+
+    def poll_playback(self, player):
+        # 界面线程定时读取进度通道，只在数值变化时刷新控件
+        if player is not self.player:
+            return
+        progress = player.progress
+        filename, duration = progress.track
+        if filename is not None and filename != self._shown_track:
+            # 连续播放切到了下一首
+            self.show_track(filename, duration)
+            self.update_song_info(filename)
+            if filename in self.music_listbox.items:
+                self.music_listbox.selection_set(self.music_listbox.items.index(filename))
+            self.seek_var.set(0)
             self.elapsed_time_var.set("0:00")
+            self.status_var.set(f"正在演奏: {filename}")
+        duration = player.timeline.duration_ms()
+        if duration != self._shown_duration:
+            # 边解析边演奏时总时长会随解析进度增长
+            self.show_track(self.current_music_file, duration)
+        state = progress.poll()
+        if state != self._last_progress:
+            self._last_progress = state
+            with TRACE.span('tk update', 'ui'):
+                self.on_play_progress(*state)
+        if progress.finished:
+            self._last_progress = None
+            if progress.error is not None:
+                self.on_play_failed(progress.error)
+            elif progress.completed:
+                self.on_play_finished(progress.stats)
             return
-        t0 = self.sorted_times[0]
-        # ====== bpm节奏系数，标准bpm为120，可自定义 ======
-        bpm = getattr(self, 'bpm', 120)
-        bpm_factor = 120 / bpm if bpm else 1.0  # bpm越大越快
-        time.sleep(0.5)
-        for idx in range(total):
-            if self.player._stop.is_set():
-                break
-            # 必须始终引用self.player._pause，防止对象被替换
-            while self.player and not self.player._pause.is_set():
-                time.sleep(0.05)
-            if not self.player or self.player._stop.is_set():
-                break
-            t = self.sorted_times[idx]
-            keys = self.notes_by_time[t]
-            for k in keys:
-                key = note_to_key.get(k)
-                if key:
-                    try:
-                        keyboard.press(key)
-                    except Exception:
-                        try:
-                            pyautogui.keyDown(key)
-                        except Exception:
-                            pass
-            time.sleep(0.05)
-            for k in keys:
-                key = note_to_key.get(k)
-                if key:
-                    try:
-                        keyboard.release(key)
-                    except Exception:
-                        try:
-                            pyautogui.keyUp(key)
-                        except Exception:
-                            pass
-            elapsed_sec = max(0, (t - t0) / 1000)
-            m, s = divmod(int(elapsed_sec), 60)
-            self.elapsed_time_var.set(f"{m}:{s:02d}")
-            update_status(f"演奏进度: {idx+1}/{total}")
-            if idx < total - 1:
-                interval = (self.sorted_times[idx + 1] - t) / 1000.0 * bpm_factor  # 按bpm调整节奏
-                if interval > 0:
-                    time.sleep(interval)
-            self.player.current_idx = idx + 1
+        self.root.after(PROGRESS_POLL_MS, self.poll_playback, player)
+
+    def on_play_progress(self, done, total, elapsed_ms):
+        if not done:
+            return
+        self.elapsed_time_var.set(self.format_ms(elapsed_ms))
+        if not self._seek_dragging:
+            self.seek_var.set(elapsed_ms)
+        self.seek_file = self.current_music_file
+        if not self.player.is_paused:
+            self.status_var.set(f"演奏进度: {done}/{total}")
+
+    def on_seek_release(self, event=None):
+        self._seek_dragging = False
+        ms = self.seek_var.get()
+        self.seek_file = self.current_music_file
+        self.elapsed_time_var.set(self.format_ms(ms))
+        if self.player and self.player.is_playing:
+            self.player.seek(ms)
+
+    def toggle_pause(self):
+        if not (self.player and self.player.is_playing):
+            return
+        if self.player.is_paused:
+            self.player.resume()
+            self.pause_btn.config(text="暂停")
+            self.status_var.set("演奏中... 可用F7停止")
+        else:
+            self.player.pause()
+            self.pause_btn.config(text="继续")
+            self.status_var.set("已暂停")
+
+    def set_loop_a(self):
+        # 以进度条当前位置作为A点
+        self.loop_points = (self.current_music_file, self.seek_var.get(), None)
+        if self.player:
+            self.player.clear_loop()
+        self.status_var.set(f"A点: {self.format_ms(self.seek_var.get())}，再设置B点开始循环")
+
+    def set_loop_b(self):
+        if not self.loop_points or self.loop_points[0] != self.current_music_file:
+            self.status_var.set("请先设置A点")
+            return
+        a_ms, b_ms = self.loop_points[1], self.seek_var.get()
+        self.loop_points = (self.current_music_file, min(a_ms, b_ms), max(a_ms, b_ms))
+        if self.player and self.player.is_playing and not self.player.set_loop(a_ms, b_ms):
+            self.status_var.set("A-B区间内没有音符")
+            return
+        self.status_var.set(f"循环 {self.format_ms(min(a_ms, b_ms))} - {self.format_ms(max(a_ms, b_ms))}")
+
+    def clear_loop(self):
+        self.loop_points = None
         if self.player:
-            self.player.is_playing = False
-            self.elapsed_time_var.set(self.total_time_var.get())
-        update_status("演奏结束！")
+            self.player.clear_loop()
+        self.status_var.set("已取消循环")
+
+    def on_play_finished(self, stats):
+        self.elapsed_time_var.set(self.total_time_var.get())
+        self.status_var.set(f"演奏结束！{stats.format()}")
+        self.seek_var.set(0)
+        self.start_btn.config(state="normal")
+        self.stop_btn.config(state="disabled")
+        self.pause_btn.config(state="disabled", text="暂停")
+
+    def on_play_failed(self, error):
+        # 演奏线程异常退出（如按键注入失败）：按键已抬起，恢复按钮状态并提示
+        self.status_var.set(f"演奏出错已停止: {error}")
+        self.start_btn.config(state="normal")
+        self.stop_btn.config(state="disabled")
+        self.pause_btn.config(state="disabled", text="暂停")
 
     def stop_play(self):
         if self.player:
             self.player.stop()
+        self.seek_var.set(0)
         self.status_var.set("已停止，点击开始或按F5重新演奏")
         self.start_btn.config(state="normal")
         self.stop_btn.config(state="disabled")
+        self.pause_btn.config(state="disabled", text="暂停")
 
     def check_and_set_game_window(self):
-        # 查找进程名为'Sky'或'光遇'的窗口，优先'Sky'
-        def enum_windows_callback(hwnd, result):
-            if win32gui.IsWindowVisible(hwnd) and win32gui.IsWindowEnabled(hwnd):
-                tid, pid = win32process.GetWindowThreadProcessId(hwnd)
-                try:
-                    proc = psutil.Process(pid)
-                    name = proc.name()
-                    # 进程名可能为Sky.exe、光遇.exe等
-                    if name.lower().startswith('sky'):
-                        result['Sky'] = hwnd
-                    elif '光遇' in name:
-                        result['光遇'] = hwnd
-                except Exception:
-                    pass
-        result = {}
-        win32gui.EnumWindows(enum_windows_callback, result)
-        hwnd = None
-        if 'Sky' in result:
-            hwnd = result['Sky']
-        elif '光遇' in result:
-            hwnd = result['光遇']
-        if hwnd:
-            # 置顶窗口
-            win32gui.ShowWindow(hwnd, win32con.SW_RESTORE)
-            win32gui.SetForegroundWindow(hwnd)
-            win32gui.SetWindowPos(hwnd, win32con.HWND_TOPMOST, 0, 0, 0, 0,
-                                  win32con.SWP_NOMOVE | win32con.SWP_NOSIZE)
+        # 查找进程名为'Sky'或'光遇'的窗口（优先'Sky'）并置顶；找到的窗口会被缓存，再次演奏时只做廉价校验
+        if self.window_locator is None:
+            try:
+                self.window_locator = create_window_locator()
+            except RuntimeError as e:
+                messagebox.showerror("错误", str(e))
+                return False
+        if self.window_locator.locate() is not None:
             return True
-        else:
-            messagebox.showwarning("未检测到游戏", "未找到进程名为 'Sky' 或 '光遇' 的游戏窗口，请先打开游戏！")
-            return False
+        messagebox.showwarning("未检测到游戏", "未找到进程名为 'Sky' 或 '光遇' 的游戏窗口，请先打开游戏！")
+        return False
 
     def load_music(self):
         sel = self.music_listbox.curselection()
         if not sel:
             messagebox.showwarning("提示", "请先选择乐谱！")
             return False
-        selected = self.filtered_music_files[sel[0]]
+        selected = self.music_listbox.get(sel[0])
         path = os.path.join(SHEET_MUSIC_DIR, selected)  # SHEET_MUSIC_DIR已用resource_path
-        encodings = ['utf-8', 'utf-8-sig', 'gbk', 'utf-16', 'utf-16-le', 'utf-16-be']
-        last_err = None
-        music_json = None
-        for enc in encodings:
-            try:
-                with open(path, 'r', encoding=enc) as f:
-                    music_json = json.load(f)
-                break
-            except Exception as e:
-                last_err = e
-                music_json = None
-        if music_json is None:
-            messagebox.showerror("错误", f"乐谱文件解析失败: {last_err}")
+        # 优先使用预编译缓存（mmap，无需解析json）；缓存失效时后台流式解析，前几秒就绪即可开始演奏
+        try:
+            self.timeline = load_timeline_progressive(path, SHEET_CACHE_DIR)
+        except SheetFormatError as e:
+            messagebox.showerror("错误", str(e))
             return False
-        if isinstance(music_json, list) and 'songNotes' in music_json[0]:
-            song_notes = music_json[0]['songNotes']
-            # 读取bpm字段，若无则默认120
-            self.bpm = music_json[0].get('bpm', 120)
-        else:
-            messagebox.showerror("错误", "乐谱文件格式不正确，未找到songNotes。")
+        except Exception as e:
+            messagebox.showerror("错误", f"乐谱文件解析失败: {e}")
             return False
-        notes_by_time = defaultdict(list)
-        for note in song_notes:
-            notes_by_time[note['time']].append(note['key'])
-        sorted_times = sorted(notes_by_time.keys())
-        self.notes_by_time = notes_by_time
-        self.sorted_times = sorted_times
+        # bpm字段随缓存保存，若无则默认120
+        self.bpm = self.timeline.bpm
+        self.current_music_file = selected
         return True
 
     def on_close(self):
@@ -591,24 +925,71 @@ class MusicGUI:
             size = size_pos[0].split('x')
             width, height = int(size[0]), int(size[1])
             x, y = int(size_pos[1]), int(size_pos[2])
-            cfg = {'width': width, 'height': height, 'x': x, 'y': y}
+            cfg = {'width': width, 'height': height, 'x': x, 'y': y,
+                   'hold_ms': self.hold_ms, 'song_hold_ms': self.song_hold_ms,
+                   'transforms': dict(self.transform_options, speed=self.get_speed()),
+                   'playlist': dict(self.playlist_options, enabled=self.playlist_var.get(),
+                                    shuffle=self.shuffle_var.get(), repeat=self.get_repeat()),
+                   'library': {'sort': self.get_sort_key(), 'level': self.get_level(),
+                               'collapse': self.collapse_var.get()}}
             with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
                 json.dump(cfg, f)
         except Exception:
             pass
+        self.dir_watcher.stop()
+        if self.preloader:
+            self.preloader.close()
+        self.sheet_index.save()
+        if TRACE.events:
+            try:
+                TRACE.write(TRACE_FILE)
+            except OSError:
+                pass
         self.root.destroy()
 
-    def schedule_music_dir_watch(self):
-        current_files = set(self.get_all_music_files())
-        if current_files != self.last_music_files:
-            self.all_music_files = list(current_files)
-            self.filtered_music_files = self.all_music_files.copy()
+    def start_music_dir_watch(self):
+        # 目录监视在后台线程中进行，界面线程只处理增量事件
+        self.dir_watcher = DirWatcher(SHEET_MUSIC_DIR, self.on_music_dir_events)
+        self.dir_watcher.start()
+
+    def on_music_dir_events(self, events):
+        # 监视线程中调用：先增量更新元数据索引，再交给界面线程
+        for kind, name in events:
+            if kind == REMOVED:
+                self.sheet_index.remove(name)
+                entry = None
+            else:
+                entry = self.sheet_index.scan_file(name)
+            with self._search_lock:
+                if self.search_index is not None:
+                    self.apply_search_event(self.search_index, kind, name, entry)
+                for log in self._search_logs:
+                    log.append((kind, name, entry))
+        self.sheet_index.save()
+        self.update_duplicates()
+        self.post_to_ui(self.apply_music_dir_events, events)
+
+    def apply_music_dir_events(self, events):
+        files = list(self.all_music_files)
+        known = set(files)
+        changed = False
+        for kind, name in events:
+            if kind == REMOVED and name in known:
+                files.remove(name)
+                known.discard(name)
+                changed = True
+            elif kind != REMOVED and name not in known:
+                files.append(name)
+                known.add(name)
+                changed = True
+        if changed:
+            self.all_music_files = files
             self.on_search()  # 保持搜索关键字过滤
-            self.last_music_files = current_files
-        self.root.after(1000, self.schedule_music_dir_watch)
+        elif self.music_info_vars['filename'].get() in {name for _, name in events}:
+            self.update_song_info(self.music_info_vars['filename'].get())
 
     def bind_hotkeys(self):
-        import keyboard
+        keyboard = lazy_import('keyboard')
         # 先解绑，防止重复注册
         try:
             keyboard.unhook_all_hotkeys()
@@ -627,22 +1008,72 @@ class MusicGUI:
 
     def on_music_listbox_right_click(self, event):
         """
-        右键菜单：仅保留收藏/取消收藏
+        右键菜单：收藏/取消收藏、按住时长设置、导入MIDI（列表为空时只有导入）
         """
         idx = self.music_listbox.nearest(event.y)
-        if idx < 0 or idx >= len(self.filtered_music_files or []):
-            return
-        self.music_listbox.selection_clear(0, tk.END)
-        self.music_listbox.selection_set(idx)
-        filename = self.filtered_music_files[idx]
         menu = tk.Menu(self.music_listbox, tearoff=0)
-        # 只保留收藏/取消收藏
-        if filename in self.favorites:
-            menu.add_command(label="取消收藏", command=lambda: self.toggle_favorite(filename))
-        else:
-            menu.add_command(label="收藏", command=lambda: self.toggle_favorite(filename))
+        if 0 <= idx < self.music_listbox.size():
+            self.music_listbox.selection_set(idx)
+            filename = self.music_listbox.get(idx)
+            if filename in self.favorites:
+                menu.add_command(label="取消收藏", command=lambda: self.toggle_favorite(filename))
+            else:
+                menu.add_command(label="收藏", command=lambda: self.toggle_favorite(filename))
+            menu.add_separator()
+            menu.add_command(label="本曲按住时长...", command=lambda: self.ask_hold_time(filename))
+            menu.add_command(label="默认按住时长...", command=lambda: self.ask_hold_time(None))
+            menu.add_separator()
+        menu.add_command(label="导入MIDI...", command=self.ask_import_midi)
         menu.tk_popup(event.x_root, event.y_root)
 
+    def ask_import_midi(self):
+        """
+        选择MIDI文件导入到乐谱目录；在后台线程中转换，新乐谱由目录监视加入列表
+        """
+        paths = filedialog.askopenfilenames(title="导入MIDI", parent=self.root,
+                                            filetypes=[("MIDI文件", "*.mid *.midi"), ("所有文件", "*.*")])
+        if paths:
+            self.status_var.set(f"正在导入{len(paths)}个MIDI文件...")
+            threading.Thread(target=self.import_midi_files, args=(list(paths),), daemon=True).start()
+
+    def import_midi_files(self, paths):
+        midi_import = lazy_import('midi_import')
+        done, errors = 0, []
+        for path in paths:
+            try:
+                midi_import.import_midi(path, SHEET_MUSIC_DIR)
+                done += 1
+            except Exception as e:
+                errors.append(f"{os.path.basename(path)}: {e}")
+        self.post_to_ui(self.on_midi_imported, done, errors)
+
+    def on_midi_imported(self, done, errors):
+        self.status_var.set(f"已导入{done}个MIDI文件" + (f"，失败{len(errors)}个" if errors else ""))
+        if errors:
+            messagebox.showwarning("导入MIDI", "\n".join(errors[:10]))
+
+    def ask_hold_time(self, filename):
+        """
+        设置按住时长(毫秒)：filename为None时修改全局默认值，否则修改该曲目，留空恢复默认
+        """
+        if filename is None:
+            value = simpledialog.askinteger("默认按住时长", "每个和弦按下后保持的毫秒数：",
+                                            initialvalue=self.hold_ms, minvalue=0, maxvalue=2000, parent=self.root)
+            if value is not None:
+                self.hold_ms = value
+            return
+        value = simpledialog.askstring("本曲按住时长", f"{filename}\n按住毫秒数（留空使用默认{self.hold_ms}ms）：",
+                                       initialvalue=str(self.song_hold_ms.get(filename, '')), parent=self.root)
+        if value is None:
+            return
+        value = value.strip()
+        if not value:
+            self.song_hold_ms.pop(filename, None)
+        elif value.isdigit() and int(value) <= 2000:
+            self.song_hold_ms[filename] = int(value)
+        else:
+            messagebox.showerror("错误", "请输入0~2000之间的整数")
+
     def toggle_favorite(self, filename):
         """
         收藏/取消收藏，并保存到本地
@@ -677,10 +1108,13 @@ class MusicGUI:
             pass
 
 if __name__ == "__main__":
+    lazy_import('multiprocessing').freeze_support()  # 打包后索引刷新的进程池需要
     root = tk.Tk()
     style = ttk.Style()
     style.theme_use('clam')
     style.configure('.', font=('微软雅黑', 10))
+    STARTUP.mark('tk init')
     app = MusicGUI(root)
-    app.bind_hotkeys()
+    # 全局热键在首屏显示后再注册（需要导入keyboard）
+    root.after_idle(app.bind_hotkeys)
     root.mainloop() 
\ No newline at end of file
@@ -0,0 +1,107 @@
+import random
+import threading
+from startup import lazy_import
+
+# 播放列表与预加载：演奏当前曲目时，在后台线程中提前解析、编译并变换下一首，
+# 引擎在上一首结束后按设定间隔直接接着演奏，不再在界面线程里同步加载。
+
+REPEAT_MODES = ('off', 'all', 'one')  # 不循环 / 列表循环 / 单曲循环
+PLAYLIST_GAP = 1.0  # 两首之间的间隔(秒)
+
+
+class Playlist:
+    """
+    播放顺序：shuffle时用seed打乱（每轮重新打乱，且新一轮不会以上一首开头），repeat见REPEAT_MODES
+    """
+    def __init__(self, items, start=None, shuffle=False, repeat='off', seed=None):
+        if repeat not in REPEAT_MODES:
+            raise ValueError(f"未知的循环模式: {repeat}")
+        self.items = list(items)
+        self.shuffle = shuffle
+        self.repeat = repeat
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.order = self._make_order(start)
+        self.pos = 0
+        self._next_order = None  # 列表循环时下一轮的顺序，peek与advance共用同一份
+
+    def _make_order(self, first=None, avoid=None):
+        order = list(range(len(self.items)))
+        if self.shuffle:
+            self.rng.shuffle(order)
+            if avoid is not None and len(order) > 1 and order[0] == avoid:
+                order.append(order.pop(0))
+        if first is not None and first in self.items:
+            idx = self.items.index(first)
+            if self.shuffle:
+                order.remove(idx)
+                order.insert(0, idx)
+            else:
+                order = order[idx:] + order[:idx]
+        return order
+
+    def __len__(self):
+        return len(self.items)
+
+    def current(self):
+        with self._lock:
+            return self.items[self.order[self.pos]] if self.order else None
+
+    def _next_pos(self):
+        if self.repeat == 'one':
+            return self.pos, None
+        if self.pos + 1 < len(self.order):
+            return self.pos + 1, None
+        if self.repeat == 'all' and self.order:
+            if self._next_order is None:
+                self._next_order = self._make_order(avoid=self.order[self.pos])
+            return 0, self._next_order
+        return None, None
+
+    def peek(self):
+        """
+        下一首（不前进）；列表结束时返回None。在一轮末尾时确定并保存下一轮的顺序，advance沿用，预加载的即是实际播放的
+        """
+        with self._lock:
+            pos, new_order = self._next_pos()
+            if pos is None:
+                return None
+            order = new_order or self.order
+            return self.items[order[pos]]
+
+    def advance(self):
+        with self._lock:
+            pos, new_order = self._next_pos()
+            if pos is None:
+                return None
+            if new_order:
+                self.order = new_order
+                self._next_order = None
+            self.pos = pos
+            return self.items[self.order[pos]]
+
+
+class Preloader:
+    """
+    单个后台线程按需加载曲目，request()提交，get()取结果（未完成时等待）；只保留最近请求的几首
+    """
+    def __init__(self, loader, keep=2):
+        self.loader = loader
+        self.keep = keep
+        self.pool = lazy_import('concurrent.futures.thread').ThreadPoolExecutor(max_workers=1, thread_name_prefix='preload')
+        self.futures = {}
+        self._lock = threading.Lock()
+
+    def request(self, key):
+        with self._lock:
+            future = self.futures.pop(key, None) or self.pool.submit(self.loader, key)
+            self.futures[key] = future  # 重新放到末尾
+            while len(self.futures) > self.keep:
+                self.futures.pop(next(iter(self.futures)))
+            return future
+
+    def get(self, key):
+        return self.request(key).result()
+
+    def close(self):
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,153 @@
+import time
+
+# 演奏调度器：每个和弦按首音起算的绝对截止时间(perf_counter)触发，
+# 不再把按键耗时、状态刷新耗时累加到sleep链上，长曲目不会越弹越慢。
+
+SPIN_THRESHOLD = 0.0015  # 距截止时间不足该值(秒)时改为自旋等待，提高精度
+MIN_SLEEP = 0.0001  # 剩余不足该值时不再睡眠，直接进入自旋
+LATE_TOLERANCE = 0.08  # 落后超过该值(秒)视为掉队，按策略跳过或压缩
+LATE_POLICIES = ('compress', 'skip')
+
+
+class RealClock:
+    """
+    真实时钟：perf_counter计时，睡眠可被停止事件打断
+    """
+    def now(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds, stop_event=None):
+        # 返回True表示睡眠期间收到停止信号
+        if stop_event is not None:
+            return stop_event.wait(seconds)
+        time.sleep(seconds)
+        return False
+
+    def spin_until(self, target):
+        while time.perf_counter() < target:
+            pass
+
+
+class VirtualClock:
+    """
+    虚拟时钟：sleep直接推进时间，不真正等待，用于基准测试和离线模拟
+    """
+    def __init__(self, start=0.0):
+        self.t = start
+
+    def now(self):
+        return self.t
+
+    def sleep(self, seconds, stop_event=None):
+        if seconds > 0:
+            self.t += seconds
+        return stop_event is not None and stop_event.is_set()
+
+    def spin_until(self, target):
+        self.t = max(self.t, target)
+
+    def advance(self, seconds):
+        # 模拟按键注入等操作本身耗费的时间
+        self.t += seconds
+
+
+REAL_CLOCK = RealClock()
+
+
+class LatenessStats:
+    """
+    统计每个和弦的实际触发时刻相对截止时间的延迟（秒）
+    """
+    def __init__(self):
+        self.samples = []
+        self.skipped = 0
+
+    def add(self, lateness):
+        self.samples.append(lateness)
+
+    def summary(self):
+        if not self.samples:
+            return {'count': 0, 'skipped': self.skipped, 'mean': 0.0, 'p99': 0.0, 'max': 0.0}
+        ordered = sorted(self.samples)
+        n = len(ordered)
+        p99 = ordered[min(n - 1, int(n * 0.99))]
+        return {
+            'count': n,
+            'skipped': self.skipped,
+            'mean': sum(ordered) / n,
+            'p99': p99,
+            'max': ordered[-1],
+        }
+
+    def format(self):
+        s = self.summary()
+        text = f"延迟 平均{s['mean'] * 1000:.1f}ms / P99 {s['p99'] * 1000:.1f}ms / 最大{s['max'] * 1000:.1f}ms"
+        if s['skipped']:
+            text += f"，跳过{s['skipped']}个和弦"
+        return text
+
+
+class DeadlineScheduler:
+    """
+    绝对截止时间调度：先粗粒度睡眠，最后约1ms自旋等待；
+    落后超过容差时，policy='skip'丢弃该和弦，policy='compress'立即补弹（压缩间隔追上进度）
+    """
+    def __init__(self, tolerance=LATE_TOLERANCE, policy='compress', spin=SPIN_THRESHOLD,
+                 clock=REAL_CLOCK):
+        if policy not in LATE_POLICIES:
+            raise ValueError(f"未知的掉队策略: {policy}")
+        self.tolerance = tolerance
+        self.policy = policy
+        self.spin = spin
+        self.clock = clock
+        self.origin = None
+        self.stats = LatenessStats()
+
+    def begin(self, delay=0.0):
+        # 以当前时刻+delay作为首音时刻
+        self.origin = self.clock.now() + delay
+        self.stats = LatenessStats()
+
+    def rebase(self, delay=0.0):
+        # 跳转后以当前时刻+delay作为新的时间基准，保留已有的延迟统计
+        self.origin = self.clock.now() + delay
+
+    def shift(self, seconds):
+        # 暂停等情况下整体顺延后续截止时间
+        if self.origin is not None:
+            self.origin += seconds
+
+    def deadline(self, offset):
+        return self.origin + offset
+
+    def wait_until(self, offset, stop_event=None):
+        """
+        等待到相对首音offset秒的时刻，不计入延迟统计；返回False表示已停止
+        """
+        if self.origin is None:
+            self.begin()
+        target = self.origin + offset
+        clock = self.clock
+        while True:
+            remain = target - clock.now() - self.spin
+            if remain <= MIN_SLEEP:
+                break
+            # 分段睡眠，停止事件可随时打断
+            if clock.sleep(min(remain, 0.1), stop_event):
+                return False
+        clock.spin_until(target)
+        return True
+
+    def wait(self, offset, stop_event=None):
+        """
+        等待到相对首音offset秒的截止时间。
+        返回True表示应演奏该和弦；返回False表示已停止或按skip策略丢弃
+        """
+        if not self.wait_until(offset, stop_event):
+            return False
+        lateness = self.clock.now() - (self.origin + offset)
+        if lateness > self.tolerance and self.policy == 'skip':
+            self.stats.skipped += 1
+            return False
+        self.stats.add(lateness)
+        return True
@@ -0,0 +1,279 @@
+import re
+import heapq
+import threading
+import unicodedata
+from array import array
+from itertools import chain
+from startup import lazy_import
+
+# 乐谱搜索索引：对文件名、歌名、作者、制谱人做归一化（全半角、大小写、去分隔符），
+# 中文可选转拼音（安装pypinyin时启用，含首字母），日文假名转罗马音；
+# 用一元/二元/三元字串倒排表筛选候选，再按字段权重和匹配位置排序。
+# 不超过3个字的单个词直接由倒排表的集合运算分出各档，不必逐个候选比较。
+
+_pypinyin = None  # pypinyin导入较慢，首次需要转拼音时才导入；False表示未安装
+
+PRIMARY_FIELDS = ('filename', 'name')  # 主要字段命中排在作者/制谱人命中之前
+SECONDARY_FIELDS = ('author', 'transcribedBy')
+SEP = '\0'
+_STRIP = re.compile(r'[\W_]+', re.UNICODE)
+
+_HIRAGANA = ("あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+             "がぎぐげござじずぜぞだぢづでどばびぶべぼぱぴぷぺぽぁぃぅぇぉゔ")
+_ROMAJI = ("a i u e o ka ki ku ke ko sa shi su se so ta chi tsu te to na ni nu ne no ha hi fu he ho "
+           "ma mi mu me mo ya yu yo ra ri ru re ro wa wo n "
+           "ga gi gu ge go za ji zu ze zo da ji zu de do ba bi bu be bo pa pi pu pe po a i u e o vu").split()
+_KANA = dict(zip(_HIRAGANA, _ROMAJI))
+_SMALL_Y = {'ゃ': 'ya', 'ゅ': 'yu', 'ょ': 'yo'}
+
+
+def normalize(text):
+    """
+    NFKC归一化+小写，去掉空格、下划线和标点，便于 'Yuri_On_Ice' 与 'yuri on ice' 互相匹配
+    """
+    return _STRIP.sub('', unicodedata.normalize('NFKC', text or '').casefold())
+
+
+def kana_to_romaji(text):
+    out = []
+    double_next = False
+    for ch in text:
+        code = ord(ch)
+        if 0x30A1 <= code <= 0x30F6:  # 片假名转平假名
+            ch = chr(code - 0x60)
+        if ch == 'っ':
+            double_next = True
+            continue
+        if ch == 'ー':  # 长音不单独转写
+            continue
+        if ch in _SMALL_Y and out and out[-1].endswith('i') and len(out[-1]) > 1:
+            prev = out.pop()[:-1]
+            # shi+ゃ -> sha, chi+ゃ -> cha, ji+ゃ -> ja
+            out.append(prev + (_SMALL_Y[ch][1:] if prev.endswith(('sh', 'ch', 'j')) else _SMALL_Y[ch]))
+            continue
+        roma = _KANA.get(ch) or _SMALL_Y.get(ch)
+        if roma is None:
+            out.append(ch)
+            continue
+        if double_next:
+            roma = roma[0] + roma
+            double_next = False
+        out.append(roma)
+    return ''.join(out)
+
+
+def _get_pypinyin():
+    global _pypinyin
+    if _pypinyin is None:
+        try:
+            _pypinyin = lazy_import('pypinyin')
+        except ImportError:  # 可选依赖
+            _pypinyin = False
+    return _pypinyin
+
+
+def romanized_forms(text):
+    """
+    返回text的罗马化形式（假名->罗马音，汉字->拼音及首字母），无CJK字符时返回空列表
+    """
+    if not any(ord(ch) >= 0x3040 for ch in text):
+        return []
+    forms = []
+    roma = kana_to_romaji(text)
+    pypinyin = _get_pypinyin()
+    if pypinyin:
+        syllables = pypinyin.lazy_pinyin(roma, errors='default')
+        forms.append(''.join(syllables))
+        forms.append(''.join(pypinyin.lazy_pinyin(roma, style=pypinyin.Style.FIRST_LETTER, errors='default')))
+    elif roma != text:
+        forms.append(roma)
+    return [normalize(f) for f in forms if f]
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class SearchIndex:
+    """
+    内存搜索索引；add/remove可增量调用，search返回按相关度排序的文件名
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self.docs = []  # doc_id -> (文件名, 主要字段文本, 次要字段文本)，删除后置为None
+        self.ids = {}  # 文件名 -> doc_id
+        # 一元/二元/三元字串 -> 按该字串在文档中的命中档位分开的4个array('I', doc_ids)（没有时为None），
+        # 档位与search的相关度相同，不超过3个字的词直接按档取出
+        self.postings = ({}, {}, {})
+        self.dead = set()
+        self.in_order = True  # doc_id的先后即相关度相同时的先后（build/重建时按此顺序插入）
+        self._order = None  # doc_id -> 相关度相同时的先后名次，增删后重算
+        self._ranked = None  # 名次 -> doc_id
+
+    def build(self, items):
+        """
+        items: 可迭代的 (文件名, 元数据dict或None)
+        """
+        with self._lock:
+            self._clear()
+            docs = [(filename,) + self._keys(filename, meta) for filename, meta in items]
+            docs.sort(key=lambda doc: (len(SEP.join(doc[1])), doc[0]))
+            for filename, primary, secondary in docs:
+                self._insert(filename, primary, secondary)
+            self._ordering()
+
+    def add(self, filename, meta=None):
+        with self._lock:
+            self._remove(filename)
+            self._add(filename, meta)
+            self._maybe_compact()
+
+    def remove(self, filename):
+        with self._lock:
+            self._remove(filename)
+            self._maybe_compact()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _add(self, filename, meta):
+        self._insert(filename, *self._keys(filename, meta))
+
+    @staticmethod
+    def _keys(filename, meta):
+        meta = meta or {}
+        primary, secondary = [], []
+        for field in PRIMARY_FIELDS + SECONDARY_FIELDS:
+            raw = filename[:-5] if field == 'filename' and filename.endswith('.json') else meta.get(field, '')
+            if not raw:
+                continue
+            keys = primary if field in PRIMARY_FIELDS else secondary
+            key = normalize(raw)
+            if key:
+                keys.append(key)
+            keys.extend(romanized_forms(raw))
+        return primary, secondary
+
+    def _insert(self, filename, primary, secondary):
+        doc_id = len(self.docs)
+        # 各字段用\0分隔并以\0开头，前缀匹配即查找'\0'+词
+        doc = (filename, SEP + SEP.join(primary), SEP + SEP.join(secondary))
+        if doc_id:
+            last = self.docs[-1]
+            if last is None or (len(last[1]), last[0]) > (len(doc[1]), filename):
+                self.in_order = False
+        self.docs.append(doc)
+        self.ids[filename] = doc_id
+        self._order = None
+        for n, table in enumerate(self.postings, 1):
+            primary_grams, grams = set(), set()
+            for key in primary:
+                primary_grams |= _grams(key, n)
+            for key in secondary:
+                grams |= _grams(key, n)
+            grams |= primary_grams
+            primary_heads = {key[:n] for key in primary}
+            secondary_heads = {key[:n] for key in secondary}
+            for g in grams:
+                tier = (0 if g in primary_heads else 1) if g in primary_grams else (2 if g in secondary_heads else 3)
+                postings = table.get(g)
+                if postings is None:
+                    table[g] = postings = [None] * 4
+                if postings[tier] is None:
+                    postings[tier] = array('I', (doc_id,))
+                else:
+                    postings[tier].append(doc_id)
+
+    def _remove(self, filename):
+        doc_id = self.ids.pop(filename, None)
+        if doc_id is not None:
+            self.docs[doc_id] = None
+            self.dead.add(doc_id)
+            self._order = None
+
+    def _maybe_compact(self):
+        # 删除过多时重建，清理倒排表中的失效id
+        if len(self.dead) > 1000 and len(self.dead) > len(self.ids):
+            self._ordering()
+            alive = [self.docs[doc_id] for doc_id in self._ranked]
+            self._clear()
+            for filename, primary, secondary in alive:
+                self._insert(filename, primary.split(SEP)[1:], secondary.split(SEP)[1:])
+
+    def _candidates(self, term):
+        n = min(len(term), 3)
+        table = self.postings[n - 1]
+        best, size = None, 0
+        for g in _grams(term, n):
+            postings = table.get(g)
+            if postings is None:
+                return ()
+            count = sum(len(p) for p in postings if p is not None)
+            if best is None or count < size:
+                best, size = postings, count
+        return list(chain.from_iterable(p for p in best if p is not None)) if best else ()
+
+    def _ordering(self):
+        # 相关度相同时文本越短越靠前，再按文件名；排好后每个文档的名次可直接作为整数排序键
+        if self._order is None:
+            docs = self.docs
+            ranked = sorted((i for i, doc in enumerate(docs) if doc is not None),
+                            key=lambda i: (len(docs[i][1]), docs[i][0]))
+            order = array('I', bytes(4 * len(docs)))
+            for pos, doc_id in enumerate(ranked):
+                order[doc_id] = pos
+            self._order, self._ranked = order, ranked
+        return self._order
+
+    def search(self, keyword, limit=None):
+        """
+        返回匹配的文件名列表，按相关度从高到低排序；空格分隔的多个词需全部命中，limit限制返回个数
+        """
+        terms = [t for t in (normalize(w) for w in (keyword or '').split()) if t]
+        if not terms:
+            return []
+        with self._lock:
+            docs = self.docs
+            order = self._ordering()
+            if len(terms) == 1 and len(terms[0]) <= 3:
+                # 倒排表按档位分开且doc_id递增，按顺序插入时每档已排好
+                result = []
+                dead = self.dead
+                for tier in self.postings[len(terms[0]) - 1].get(terms[0]) or ():
+                    if tier is None:
+                        continue
+                    if dead:
+                        tier = [doc_id for doc_id in tier if doc_id not in dead]
+                    if not self.in_order:
+                        tier = sorted(tier, key=order.__getitem__)
+                    result.extend(tier[:limit - len(result)] if limit else tier)
+                    if limit and len(result) >= limit:
+                        break
+                return [docs[doc_id][0] for doc_id in result]
+            # 用最稀有的词筛选候选
+            candidates = min((self._candidates(t) for t in terms), key=len)
+            stride = len(docs)
+            heads = [(t, SEP + t) for t in terms]
+            scored = []
+            for doc_id in candidates:
+                doc = docs[doc_id]
+                if doc is None:
+                    continue
+                _, primary, secondary = doc
+                total = 0
+                # 0: 文件名/歌名前缀命中，1: 文件名/歌名包含，2: 作者/制谱人前缀命中，3: 作者/制谱人包含
+                for term, head in heads:
+                    if term in primary:
+                        total += 0 if head in primary else 1
+                    elif term in secondary:
+                        total += 2 if head in secondary else 3
+                    else:
+                        break
+                else:
+                    scored.append(total * stride + order[doc_id])
+            scored = heapq.nsmallest(limit, scored) if limit else sorted(scored)
+            ranked = self._ranked
+            return [docs[ranked[key % stride]][0] for key in scored]
@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import threading
+from array import array
+from sheet_index import meta_from_head
+from sheet_loader import load_sheet, detected_encoding
+from sheet_stream import stream_compile, GrowingTimeline, READY_MS
+from timeline import Timeline, MASK_TYPECODE, compile_sheet
+from tracing import TRACE
+
+# 预编译乐谱缓存：固定文件头(元数据) + 起始时间数组 + 和弦掩码数组，
+# 通过mmap直接映射为Timeline，命中缓存时开始演奏无需解析json。
+#
+# 文件头: magic, 版本, 掩码字节数, 字节序, 源文件大小, 源文件mtime_ns, 源文件sha1, bpm, 每页格数, 和弦数, 元数据长度
+
+CACHE_MAGIC = b'SKYC'
+CACHE_VERSION = 2
+CACHE_SUFFIX = '.skc'
+HEADER = struct.Struct('<4sHBBQq20sdHII')
+_MTIME = struct.Struct('<q')
+_MTIME_OFFSET = struct.calcsize('<4sHBBQ')  # 文件头中源文件mtime_ns的位置
+_BYTEORDER = 0 if sys.byteorder == 'little' else 1
+
+
+def _align(n, size=8):
+    return (n + size - 1) // size * size
+
+
+def cache_path(cache_dir, filename):
+    return os.path.join(cache_dir, filename + CACHE_SUFFIX)
+
+
+def source_digest(raw):
+    return hashlib.sha1(raw).digest()
+
+
+def write_cache(path, timeline, src_size, src_mtime_ns, digest, meta=None):
+    """
+    把Timeline写成缓存文件（先写临时文件再替换，避免读到半个文件）
+    """
+    meta_blob = json.dumps(meta or {}, ensure_ascii=False).encode('utf-8')
+    count = len(timeline)
+    header = HEADER.pack(CACHE_MAGIC, CACHE_VERSION, array(MASK_TYPECODE).itemsize, _BYTEORDER,
+                         src_size, src_mtime_ns, digest, float(timeline.bpm), timeline.bits_per_page,
+                         count, len(meta_blob))
+    times_off = _align(HEADER.size + len(meta_blob))
+    masks_off = _align(times_off + count * 4)
+    buf = bytearray(masks_off)
+    buf[:HEADER.size] = header
+    buf[HEADER.size:HEADER.size + len(meta_blob)] = meta_blob
+    buf[times_off:times_off + count * 4] = array('I', timeline.times).tobytes()
+    buf += array(MASK_TYPECODE, timeline.masks).tobytes()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(buf)
+    os.replace(tmp, path)
+
+
+def read_header(mm):
+    if len(mm) < HEADER.size:
+        return None
+    fields = HEADER.unpack_from(mm, 0)
+    if fields[0] != CACHE_MAGIC or fields[1] != CACHE_VERSION:
+        return None
+    if fields[2] != array(MASK_TYPECODE).itemsize or fields[3] != _BYTEORDER:
+        return None
+    keys = ('magic', 'version', 'mask_size', 'byteorder', 'src_size', 'src_mtime_ns', 'digest', 'bpm', 'bits_per_page',
+            'count', 'meta_len')
+    return dict(zip(keys, fields))
+
+
+def map_cache(path):
+    """
+    mmap缓存文件并返回(文件头, Timeline, 元数据)；times/masks是直接指向映射内存的memoryview
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = read_header(mm)
+    if header is None:
+        mm.close()
+        return None
+    count = header['count']
+    meta_end = HEADER.size + header['meta_len']
+    times_off = _align(meta_end)
+    masks_off = _align(times_off + count * 4)
+    if len(mm) < masks_off + count * header['mask_size']:
+        mm.close()
+        return None
+    meta = json.loads(bytes(mm[HEADER.size:meta_end]).decode('utf-8'))
+    view = memoryview(mm)
+    times = view[times_off:times_off + count * 4].cast('I')
+    masks = view[masks_off:masks_off + count * header['mask_size']].cast(MASK_TYPECODE)
+    return header, Timeline(times, masks, header['bpm'], header['bits_per_page']), meta
+
+
+def build(src_path, cache_dir, force=False):
+    """
+    编译单个乐谱并写入缓存；缓存仍有效且未指定force时跳过。返回是否重新编译
+    """
+    cpath = cache_path(cache_dir, os.path.basename(src_path))
+    if not force and is_valid(src_path, cpath):
+        return False
+    st = os.stat(src_path)
+    with TRACE.span('stream compile', 'load'):
+        timeline, meta, digest = _stream_compile_file(src_path)
+    with TRACE.span('write cache', 'load'):
+        write_cache(cpath, timeline, st.st_size, st.st_mtime_ns, digest, meta)
+    return True
+
+
+def _stream_compile_file(src_path, timeline=None, on_progress=None, on_reorder=None):
+    # 流式编译，返回(Timeline, 索引元数据, sha1)；8位文本的编码与load_sheet一样优先使用上次检测到的编码
+    with open(src_path, 'rb') as f:
+        timeline, info = stream_compile(f, timeline, on_progress, on_reorder, detected_encoding(src_path))
+    return timeline, meta_from_head(info['head'], info['notes'], info['duration']), info['digest']
+
+
+def refresh_mtime(path, src_mtime_ns):
+    """
+    源文件只是mtime变了、内容未变时，就地改写缓存文件头中的mtime，之后加载不必再计算哈希
+    """
+    with open(path, 'r+b') as f:
+        f.seek(_MTIME_OFFSET)
+        f.write(_MTIME.pack(src_mtime_ns))
+
+
+def _check(src_path, header, cpath):
+    # 先比较大小和mtime；mtime变了但大小相同时再比较内容哈希，内容相同则更新缓存中记录的mtime
+    st = os.stat(src_path)
+    if st.st_size != header['src_size']:
+        return False
+    if st.st_mtime_ns == header['src_mtime_ns']:
+        return True
+    with open(src_path, 'rb') as f:
+        if source_digest(f.read()) != header['digest']:
+            return False
+    try:
+        refresh_mtime(cpath, st.st_mtime_ns)
+    except OSError:
+        pass  # 缓存目录只读时下次仍比较哈希
+    return True
+
+
+def is_valid(src_path, cpath):
+    try:
+        with open(cpath, 'rb') as f:
+            header = read_header(f.read(HEADER.size))
+        return header is not None and _check(src_path, header, cpath)
+    except OSError:
+        return False
+
+
+def load_timeline(src_path, cache_dir):
+    """
+    读取乐谱的Timeline：缓存有效时直接mmap，否则解析源文件并重建缓存
+    """
+    cpath = cache_path(cache_dir, os.path.basename(src_path))
+    with TRACE.span('map cache', 'load'):
+        try:
+            mapped = map_cache(cpath)
+        except (OSError, ValueError):
+            mapped = None
+        if mapped is not None and not _check(src_path, mapped[0], cpath):
+            mapped = None  # 先释放旧映射，Windows下被映射的文件无法替换
+    if mapped is not None:
+        return mapped[1]
+    try:
+        build(src_path, cache_dir, force=True)
+        mapped = map_cache(cpath)
+    except OSError:
+        mapped = None
+    if mapped is None:
+        # 缓存目录不可写等情况退回直接编译
+        data, _ = load_sheet(src_path)
+        return compile_sheet(data)
+    return mapped[1]
+
+
+def load_timeline_progressive(src_path, cache_dir, ready_ms=READY_MS):
+    """
+    与load_timeline相同，但缓存失效时在后台线程中流式解析，
+    解析出前ready_ms毫秒的和弦后就返回GrowingTimeline，可以立即开始演奏；解析完成后写入缓存。
+    编码在解析前确定，解码失败不会发生在已交出部分和弦之后；乐谱中有乱序音符时等解析完成再返回。
+    之后的解析错误（如文件后半部分json损坏）在演奏到已解析部分末尾时由wait_more抛出，经演奏引擎报告
+    """
+    cpath = cache_path(cache_dir, os.path.basename(src_path))
+    with TRACE.span('map cache', 'load'):
+        try:
+            mapped = map_cache(cpath)
+        except (OSError, ValueError):
+            mapped = None
+        if mapped is not None and not _check(src_path, mapped[0], cpath):
+            mapped = None
+    if mapped is not None:
+        return mapped[1]
+    timeline = GrowingTimeline()
+
+    def worker():
+        try:
+            st = os.stat(src_path)
+            with TRACE.span('stream compile', 'load'):
+                _, meta, digest = _stream_compile_file(src_path, timeline, timeline.notify, timeline.mark_reordered)
+            try:
+                with TRACE.span('write cache', 'load'):
+                    write_cache(cpath, timeline, st.st_size, st.st_mtime_ns, digest, meta)
+            except OSError:
+                pass
+            timeline.finish()
+        except Exception as e:
+            timeline.finish(e)
+
+    threading.Thread(target=worker, daemon=True).start()
+    with TRACE.span('wait first chords', 'load', ready_ms=ready_ms):
+        timeline.wait_ready(ready_ms)
+    if timeline.done and timeline.error is not None:
+        raise timeline.error
+    return timeline
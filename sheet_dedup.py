@@ -0,0 +1,155 @@
+import sys
+import math
+import zlib
+import hashlib
+from array import array
+from collections import defaultdict
+from timeline import MASK_TYPECODE
+
+# 乐谱去重：
+# - 内容哈希：对编译后的时间轴（相对首音的时间 + 和弦掩码）求哈希，文件编码、空白、字段顺序、文件名不同都不影响；
+# - 近似重复：把相邻和弦的 节奏比例(相对中位间隔，与速度无关) + 最高音的音程(与整体移调无关) + 和弦大小
+#   按SHINGLE个一组切片，用单次排列MinHash（每个切片只算一次哈希，按低位分桶取最小值）生成指纹，
+#   再按LSH分段分桶，只比较落在同一桶里的乐谱，避免两两比较。
+# 哈希和指纹随元数据索引保存，界面据此把重复的乐谱合并显示为一项。
+
+SHINGLE = 4  # 每个切片包含的相邻和弦数
+FINGERPRINT_BINS = 64
+BAND_ROWS = 4  # LSH每段的桶数，共FINGERPRINT_BINS // BAND_ROWS段
+NEAR_THRESHOLD = 0.5  # 指纹相同的比例不低于该值视为近似重复
+MIN_SHINGLES = 16  # 切片太少的乐谱不生成指纹
+MAX_BUCKET = 64  # 超过该大小的LSH桶（通常是极短的通用片段）不参与比较
+_EMPTY = 0xFFFF
+
+
+def content_hash(timeline):
+    """
+    时间轴的内容哈希(16位十六进制)；时间取相对首音的毫秒
+    """
+    times = array('I', (int(t - timeline.times[0]) for t in timeline.times))
+    masks = array(MASK_TYPECODE, timeline.masks)
+    if sys.byteorder == 'big':
+        times.byteswap()
+        masks.byteswap()
+    digest = hashlib.sha1(times.tobytes())
+    digest.update(masks.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _tokens(timeline):
+    times, masks = timeline.times, timeline.masks
+    gaps = sorted(b - a for a, b in zip(times, times[1:]))
+    if not gaps:
+        return []
+    unit = max(gaps[len(gaps) // 2], 1)
+    tokens = []
+    prev_top = masks[0].bit_length()
+    for i in range(1, len(times)):
+        rhythm = max(-6, min(6, round(2 * math.log2(max(times[i] - times[i - 1], 1) / unit))))
+        top = masks[i].bit_length()
+        tokens.append((rhythm + 8, top - prev_top + 16, min(bin(masks[i]).count('1'), 7)))
+        prev_top = top
+    return tokens
+
+
+def fingerprint(timeline):
+    """
+    近似重复指纹：FINGERPRINT_BINS个16位最小哈希值的十六进制串；和弦太少时返回None
+    """
+    tokens = _tokens(timeline)
+    if len(tokens) < SHINGLE + MIN_SHINGLES:
+        return None
+    flat = bytes(v for token in tokens for v in token)
+    width = 3 * SHINGLE
+    sig = [_EMPTY] * FINGERPRINT_BINS
+    for start in range(0, len(flat) - width + 1, 3):
+        h = zlib.crc32(flat[start:start + width])
+        b, v = h % FINGERPRINT_BINS, (h // FINGERPRINT_BINS) & 0xFFFF
+        if v < sig[b]:
+            sig[b] = v
+    # 空桶取下一个非空桶的值（循环），保证任意两份指纹可逐桶比较
+    filled = [i for i, v in enumerate(sig) if v != _EMPTY]
+    for i in range(FINGERPRINT_BINS):
+        if sig[i] == _EMPTY:
+            sig[i] = sig[next((j for j in filled if j > i), filled[0])]
+    return ''.join(f"{v:04x}" for v in sig)
+
+
+def similarity(a, b):
+    """
+    两份指纹的相似度（相同桶的比例，近似为切片集合的Jaccard系数）
+    """
+    same = sum(a[i:i + 4] == b[i:i + 4] for i in range(0, len(a), 4))
+    return same / FINGERPRINT_BINS
+
+
+def find_duplicates(entries, threshold=NEAR_THRESHOLD):
+    """
+    entries为{文件名: 索引条目}（含digest/fingerprint）。返回重复组列表，每组为
+    {'files': [文件名...], 'exact': 是否全部内容相同, 'similarity': 组内近似配对的最低相似度}
+    """
+    parent = {}
+
+    def find(x):
+        while parent.setdefault(x, x) != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(a, b):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    by_digest = defaultdict(list)
+    buckets = defaultdict(list)
+    band_width = BAND_ROWS * 4
+    for name, entry in entries.items():
+        if not entry:
+            continue
+        if entry.get('digest'):
+            by_digest[entry['digest']].append(name)
+        fp = entry.get('fingerprint')
+        if fp:
+            for band in range(0, len(fp), band_width):
+                buckets[(band, fp[band:band + band_width])].append(name)
+    for names in by_digest.values():
+        for other in names[1:]:
+            union(names[0], other)
+    scores = {}
+    for names in buckets.values():
+        if len(names) < 2 or len(names) > MAX_BUCKET:
+            continue
+        for i, a in enumerate(names):
+            for b in names[i + 1:]:
+                key = (a, b) if a < b else (b, a)
+                if key in scores:
+                    continue
+                score = similarity(entries[a]['fingerprint'], entries[b]['fingerprint'])
+                scores[key] = score
+                if score >= threshold:
+                    union(a, b)
+    groups = defaultdict(list)
+    for name in parent:
+        groups[find(name)].append(name)
+    lowest = {}
+    for (a, _), score in scores.items():
+        if score >= threshold:
+            root = find(a)
+            lowest[root] = min(lowest.get(root, 1.0), score)
+    result = []
+    for root, names in groups.items():
+        if len(names) < 2:
+            continue
+        names.sort()
+        exact = len({entries[n].get('digest') for n in names}) == 1
+        result.append({'files': names, 'exact': exact, 'similarity': 1.0 if exact else lowest.get(root, 1.0)})
+    result.sort(key=lambda g: g['files'][0])
+    return result
+
+
+def duplicate_map(groups):
+    """
+    由重复组生成 {文件名: 所在组的文件名列表}，列表第一个为合并显示时的代表
+    """
+    return {name: group['files'] for group in groups for name in group['files']}
@@ -0,0 +1,203 @@
+import os
+import json
+import threading
+from itertools import repeat
+from sheet_loader import load_sheet
+from sheet_stats import analyze
+from sheet_dedup import content_hash, fingerprint
+from startup import lazy_import
+from timeline import compile_sheet
+
+# 乐谱元数据索引：按 文件名+大小+修改时间 缓存歌名/作者/制谱人/bpm/音符数/时长/编码、乐谱统计(stats)
+# 和去重用的内容哈希(digest)/近似指纹(fingerprint)，
+# 切换选中曲谱时直接读索引，只有新增或改动过的文件才重新解析；需要重新解析的文件较多时用进程池并行。
+
+INDEX_VERSION = 3
+PARALLEL_MIN = 64  # 需要重新解析的文件不少于这个数时才启动进程池
+
+
+def find_meta(data):
+    # 兼容多种结构：dict 或 list，优先第一个元素
+    if isinstance(data, dict):
+        return data
+    if isinstance(data, list) and len(data) > 0:
+        if isinstance(data[0], dict):
+            return data[0]
+        for item in data:
+            if isinstance(item, dict) and ('songName' in item or 'name' in item):
+                return item
+    return {}
+
+
+def extract_meta(data):
+    """
+    从乐谱数据中提取索引字段
+    """
+    meta = find_meta(data)
+    notes = meta.get('songNotes')
+    times = []
+    if isinstance(notes, list):
+        times = [n['time'] for n in notes if isinstance(n, dict) and isinstance(n.get('time'), (int, float))]
+    return meta_from_head(meta, len(notes) if isinstance(notes, list) else 0,
+                          max(times) - min(times) if times else 0)
+
+
+def meta_from_head(head, notes, duration_ms):
+    """
+    由乐谱头部字段、音符数和时长(毫秒)生成索引字段，供流式解析直接使用
+    """
+    bpm = head.get('bpm')
+    return {
+        # 兼容不同字段名
+        'name': head.get('songName') or head.get('name') or '',
+        'author': head.get('author') or '',
+        'transcribedBy': head.get('transcribedBy') or head.get('transcriber') or '',
+        'bpm': bpm if isinstance(bpm, (int, float)) else None,
+        'notes': notes,
+        'duration': duration_ms / 1000.0,
+    }
+
+
+def scan_entry(sheet_dir, filename):
+    """
+    解析单个乐谱生成索引条目，文件不存在时返回None；可在子进程中执行
+    """
+    path = os.path.join(sheet_dir, filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    try:
+        data, encoding = load_sheet(path)
+    except Exception:
+        data, encoding = None, None
+    entry = extract_meta(data)
+    entry.update({'size': st.st_size, 'mtime': st.st_mtime_ns, 'encoding': encoding, 'valid': data is not None,
+                  'stats': None, 'digest': None, 'fingerprint': None})
+    if data is not None:
+        try:
+            timeline = compile_sheet(data)
+        except ValueError:
+            return entry
+        if len(timeline):
+            entry.update(stats=analyze(timeline), digest=content_hash(timeline), fingerprint=fingerprint(timeline))
+    return entry
+
+
+class SheetIndex:
+    """
+    持久化的乐谱元数据索引，保存为json文件
+    """
+    def __init__(self, index_file, sheet_dir):
+        self.index_file = index_file
+        self.sheet_dir = sheet_dir
+        self.entries = {}
+        self.dirty = False
+        self._lock = threading.RLock()
+
+    def load(self):
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                self.entries = data.get('entries', {})
+        except Exception:
+            self.entries = {}
+
+    def save(self):
+        with self._lock:
+            if not self.dirty:
+                return
+            payload = {'version': INDEX_VERSION, 'entries': self.entries}
+            self.dirty = False
+        tmp = self.index_file + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp, self.index_file)
+        except Exception:
+            pass
+
+    def _stat(self, filename):
+        try:
+            st = os.stat(os.path.join(self.sheet_dir, filename))
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def is_fresh(self, filename, stat=None):
+        entry = self.entries.get(filename)
+        stat = stat or self._stat(filename)
+        return bool(entry and stat and entry['size'] == stat[0] and entry['mtime'] == stat[1])
+
+    def scan_file(self, filename):
+        """
+        重新解析单个文件并写入索引，文件不存在时从索引移除
+        """
+        return self._store(filename, scan_entry(self.sheet_dir, filename))
+
+    def _store(self, filename, entry):
+        if entry is None:
+            self.remove(filename)
+            return None
+        with self._lock:
+            self.entries[filename] = entry
+            self.dirty = True
+        return entry
+
+    def remove(self, filename):
+        with self._lock:
+            if self.entries.pop(filename, None) is not None:
+                self.dirty = True
+
+    def snapshot(self):
+        """
+        当前全部条目的浅拷贝，可在其它线程更新索引时安全遍历
+        """
+        with self._lock:
+            return dict(self.entries)
+
+    def peek(self, filename):
+        """
+        只检查文件状态，索引条目有效时返回，否则返回None（不解析文件）
+        """
+        stat = self._stat(filename)
+        if stat is not None and self.is_fresh(filename, stat):
+            return self.entries[filename]
+        return None
+
+    def get(self, filename):
+        """
+        读取索引条目，过期或缺失时只重新扫描这一个文件
+        """
+        stat = self._stat(filename)
+        if stat is None:
+            self.remove(filename)
+            return None
+        if self.is_fresh(filename, stat):
+            return self.entries[filename]
+        return self.scan_file(filename)
+
+    def refresh(self, filenames, jobs=None):
+        """
+        与目录中的文件列表同步：删除已不存在的条目，只重新扫描新增或改动的文件。
+        需要扫描的文件较多时用jobs个进程并行（jobs=1不用进程池）。返回重新扫描的文件数
+        """
+        wanted = set(filenames)
+        with self._lock:
+            for name in [n for n in self.entries if n not in wanted]:
+                del self.entries[name]
+                self.dirty = True
+        stale = [name for name in filenames if not self.is_fresh(name)]
+        if jobs != 1 and len(stale) >= PARALLEL_MIN:
+            try:
+                with lazy_import('concurrent.futures.process').ProcessPoolExecutor(max_workers=jobs) as pool:
+                    for name, entry in zip(stale, pool.map(scan_entry, repeat(self.sheet_dir), stale,
+                                                          chunksize=16)):
+                        self._store(name, entry)
+            except Exception:
+                pass  # 无法启动进程池时，剩下的文件在本进程中扫描
+        for name in stale:
+            if not self.is_fresh(name):
+                self.scan_file(name)
+        return len(stale)
@@ -0,0 +1,147 @@
+import os
+import json
+from sheet_loader import decode_sheet
+from timeline import note_to_key
+
+# 乐谱检查：找出无法演奏或演奏有问题的乐谱（编码、结构、未知按键、时间乱序/负数、重复音符、异常bpm），
+# 可选修复为按时间排序、去重、UTF-8编码的文件。供 cli.py lint 在进程池中批量调用。
+
+ERROR, WARNING = 'error', 'warning'
+BPM_RANGE = (20, 1000)  # 超出范围的bpm视为异常
+MAX_EXAMPLES = 5  # 每类问题最多列出的示例数
+
+
+def _issue(severity, code, message, count=None, examples=None):
+    issue = {'severity': severity, 'code': code, 'message': message}
+    if count is not None:
+        issue['count'] = count
+    if examples:
+        issue['examples'] = examples[:MAX_EXAMPLES]
+    return issue
+
+
+def read_json(path):
+    """
+    读取并解析乐谱，返回(数据, 编码)；解码或解析失败时抛出异常
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    text, enc = decode_sheet(raw)
+    return json.loads(text), enc
+
+
+def check_notes(notes):
+    """
+    检查songNotes，返回问题列表
+    """
+    issues = []
+    unknown, bad_time, seen, duplicates = [], [], set(), []
+    unsorted = 0
+    last = None
+    for i, note in enumerate(notes):
+        if not isinstance(note, dict):
+            bad_time.append(i)
+            continue
+        key, t = note.get('key'), note.get('time')
+        if key not in note_to_key:
+            unknown.append(key)
+        if not isinstance(t, (int, float)) or isinstance(t, bool) or t < 0:
+            bad_time.append(i)
+            continue
+        if last is not None and t < last:
+            unsorted += 1
+        last = t
+        ident = (t, key)
+        if ident in seen:
+            duplicates.append(f"{t}:{key}")
+        seen.add(ident)
+    if unknown:
+        names = sorted(set(map(str, unknown)))
+        issues.append(_issue(WARNING, 'unknown-key', "存在note_to_key中没有的按键，演奏时会被忽略",
+                             len(unknown), names))
+    if bad_time:
+        issues.append(_issue(ERROR, 'bad-time', "音符缺少时间、时间不是数字或为负数", len(bad_time), bad_time))
+    if unsorted:
+        issues.append(_issue(WARNING, 'unsorted', "音符未按时间排序", unsorted))
+    if duplicates:
+        issues.append(_issue(WARNING, 'duplicate', "同一时间存在重复的同键音符", len(duplicates), duplicates))
+    return issues
+
+
+def lint_file(path):
+    """
+    检查单个乐谱，返回问题列表（空列表表示没有问题）
+    """
+    try:
+        data, enc = read_json(path)
+    except UnicodeDecodeError as e:
+        return [_issue(ERROR, 'decode', f"无法识别文件编码: {e}")]
+    except ValueError as e:
+        return [_issue(ERROR, 'json', f"json格式错误: {e}")]
+    issues = []
+    if enc != 'utf-8':
+        issues.append(_issue(WARNING, 'encoding', f"文件编码为{enc}，建议使用无BOM的UTF-8"))
+    if not (isinstance(data, list) and data and isinstance(data[0], dict)):
+        issues.append(_issue(ERROR, 'structure', "顶层应为数组，且第一个元素为对象"))
+        return issues
+    head = data[0]
+    notes = head.get('songNotes')
+    if head.get('isEncrypted') or (isinstance(notes, list) and notes and not isinstance(notes[0], dict)):
+        issues.append(_issue(ERROR, 'encrypted', "加密乐谱，无法演奏"))
+        return issues
+    if not isinstance(notes, list):
+        issues.append(_issue(ERROR, 'structure', "未找到songNotes数组"))
+        return issues
+    if not notes:
+        issues.append(_issue(ERROR, 'empty', "songNotes为空"))
+    bpm = head.get('bpm')
+    if bpm is None:
+        issues.append(_issue(WARNING, 'bpm', "缺少bpm"))
+    elif not isinstance(bpm, (int, float)) or not BPM_RANGE[0] <= bpm <= BPM_RANGE[1]:
+        issues.append(_issue(WARNING, 'bpm', f"bpm异常: {bpm!r}"))
+    issues.extend(check_notes(notes))
+    return issues
+
+
+def normalize(data):
+    """
+    规范化乐谱数据：songNotes按时间排序（稳定排序，同时间保持原顺序）并去掉重复的同键音符。
+    只处理可以安全修复的问题，返回是否有改动
+    """
+    notes = data[0]['songNotes']
+    valid = [n for n in notes if isinstance(n, dict) and isinstance(n.get('time'), (int, float))]
+    if len(valid) != len(notes):
+        return False  # 存在无法自动判断的音符，不修改
+    ordered, seen = [], set()
+    for note in sorted(notes, key=lambda n: n['time']):
+        ident = (note['time'], note.get('key'))
+        if ident in seen:
+            continue
+        seen.add(ident)
+        ordered.append(note)
+    changed = ordered != notes
+    data[0]['songNotes'] = ordered
+    return changed
+
+
+def fix_file(path):
+    """
+    修复乐谱并以UTF-8（无BOM）写回；返回是否写入了文件。
+    结构不符或加密的乐谱只转换编码，不改动内容；无法解码或解析的文件不处理
+    """
+    try:
+        data, enc = read_json(path)
+    except ValueError:
+        return False
+    changed = False
+    if isinstance(data, list) and data and isinstance(data[0], dict) and isinstance(data[0].get('songNotes'), list):
+        notes = data[0]['songNotes']
+        if not data[0].get('isEncrypted') and not (notes and not isinstance(notes[0], dict)):
+            changed = normalize(data)
+    if not changed and enc == 'utf-8':
+        return False
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8', newline='') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return True
@@ -0,0 +1,105 @@
+import os
+import json
+import codecs
+import threading
+from tracing import TRACE
+
+# 统一的乐谱读取：一次读入字节，按BOM或NUL字节分布判断编码后只解码一次，
+# 不再对整份文件逐个编码试错。
+
+SNIFF_BYTES = 4096
+_encoding_memo = {}  # 路径 -> (修改时间, 检测到的编码)
+_memo_lock = threading.Lock()
+
+
+def sniff_encoding(raw):
+    """
+    根据BOM或NUL字节分布判断编码；无法确定的8位文本返回None，由调用方按utf-8/gbk处理
+    """
+    if raw.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if raw.startswith(codecs.BOM_UTF16_LE) or raw.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16'
+    head = raw[:SNIFF_BYTES]
+    if len(head) >= 2:
+        # json文本以ASCII为主，UTF-16时每个ASCII字符的高位字节为0
+        even_nul = head[0::2].count(0)
+        odd_nul = head[1::2].count(0)
+        half = len(head) // 2
+        if odd_nul > half // 4 and odd_nul > even_nul * 4:
+            return 'utf-16-le'
+        if even_nul > half // 4 and even_nul > odd_nul * 4:
+            return 'utf-16-be'
+    return None
+
+
+def _candidates(hint):
+    # 8位文本：优先使用上次检测到的编码，其次utf-8，最后gbk
+    candidates = ['utf-8', 'gbk']
+    if hint in candidates:
+        candidates.remove(hint)
+        candidates.insert(0, hint)
+    return candidates
+
+
+def settle_encoding(raw, hint=None):
+    """
+    与decode_sheet相同的规则确定编码但不保留解码结果，供流式解析在开始前确定编码；都无法解码时抛出UnicodeDecodeError
+    """
+    enc = sniff_encoding(raw)
+    if enc:
+        return enc
+    candidates = _candidates(hint)
+    try:
+        raw.decode(candidates[0])
+        return candidates[0]
+    except UnicodeDecodeError:
+        raw.decode(candidates[1])
+        return candidates[1]
+
+
+def decode_sheet(raw, hint=None):
+    """
+    解码乐谱字节，返回(文本, 编码)
+    """
+    enc = sniff_encoding(raw)
+    if enc:
+        return raw.decode(enc), enc
+    candidates = _candidates(hint)
+    try:
+        return raw.decode(candidates[0]), candidates[0]
+    except UnicodeDecodeError:
+        return raw.decode(candidates[1]), candidates[1]
+
+
+def read_sheet_text(path):
+    """
+    读取乐谱文本并记住该文件检测到的编码，返回(文本, 编码)
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    mtime = os.path.getmtime(path)
+    with _memo_lock:
+        memo = _encoding_memo.get(path)
+    hint = memo[1] if memo and memo[0] == mtime else None
+    text, enc = decode_sheet(raw, hint)
+    with _memo_lock:
+        _encoding_memo[path] = (mtime, enc)
+    return text, enc
+
+
+def load_sheet(path):
+    """
+    读取并解析乐谱json，返回(数据, 编码)；解码或解析失败时抛出异常
+    """
+    with TRACE.span('decode sheet', 'load'):
+        text, enc = read_sheet_text(path)
+    with TRACE.span('parse json', 'load'):
+        return json.loads(text), enc
+
+
+def detected_encoding(path):
+    # 返回该文件上次检测到的编码，未读取过时返回None
+    with _memo_lock:
+        memo = _encoding_memo.get(path)
+    return memo[1] if memo else None
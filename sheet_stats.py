@@ -0,0 +1,97 @@
+from bisect import bisect_left
+from startup import lazy_import
+
+# 乐谱统计：由编译好的Timeline计算和弦数、按键数、平均/峰值每秒按键数、最大和弦、最小和弦间隔和难度分，
+# 结果随元数据索引（sheet_index.json）保存，界面可直接按这些字段排序和筛选。
+# 安装NumPy时对起始时间数组做向量化计算（首次计算时才导入），没有时用纯Python计算，结果相同。
+
+WINDOW_MS = 1000  # 峰值密度的滑动窗口(毫秒)
+GAP_FLOOR_MS = 30  # 更近的和弦视为同时按下（装饰音、拆开的和弦），不计入速度
+STAT_FIELDS = ('chords', 'keys', 'nps_mean', 'nps_peak', 'max_chord', 'min_gap_ms', 'difficulty')
+# 难度分档：(名称, 下限)，按下限从高到低匹配
+DIFFICULTY_LEVELS = (('极难', 8), ('困难', 6), ('中等', 4), ('简单', 2), ('入门', 0))
+_numpy = None  # False表示未安装
+
+
+def _get_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            _numpy = lazy_import('numpy')
+        except ImportError:  # 可选依赖
+            _numpy = False
+    return _numpy
+
+
+def difficulty_level(score):
+    for name, low in DIFFICULTY_LEVELS:
+        if score >= low:
+            return name
+    return DIFFICULTY_LEVELS[-1][0]
+
+
+def difficulty_score(nps_mean, nps_peak, max_chord, min_gap_ms):
+    """
+    难度分(0~10)：以平均和峰值每秒按键数为主，较大的和弦和很短的和弦间隔适当加分
+    """
+    speed = 0.0 if min_gap_ms is None else min(2.0, 100.0 / max(min_gap_ms, GAP_FLOOR_MS) - 0.5)
+    score = 0.45 * nps_mean + 0.2 * nps_peak + 0.4 * max(0, max_chord - 2) + max(0.0, speed)
+    return round(min(10.0, score), 1)
+
+
+def _finish(chords, keys, duration_ms, nps_peak, max_chord, min_gap_ms):
+    nps_mean = keys / max(duration_ms / 1000.0, 1.0)
+    return {
+        'chords': chords,
+        'keys': keys,
+        'nps_mean': round(nps_mean, 2),
+        'nps_peak': nps_peak,
+        'max_chord': max_chord,
+        'min_gap_ms': min_gap_ms,
+        'difficulty': difficulty_score(nps_mean, nps_peak, max_chord, min_gap_ms),
+    }
+
+
+def _popcount(np, masks):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(masks).astype(np.int64)
+    return np.unpackbits(masks.view(np.uint8).reshape(len(masks), -1), axis=1).sum(axis=1, dtype=np.int64)
+
+
+def _analyze_numpy(np, times, masks):
+    t = np.asarray(times, dtype=np.float64)
+    counts = _popcount(np, np.asarray(masks))
+    cum = np.concatenate(([0], np.cumsum(counts)))
+    # 以每个和弦为窗口起点，窗口内的按键数 = 累计和之差
+    ends = np.searchsorted(t, t + WINDOW_MS, side='left')
+    peak = int((cum[ends] - cum[:-1]).max())
+    gaps = np.diff(t)
+    gaps = gaps[gaps > 0]
+    min_gap = float(gaps.min()) if len(gaps) else None
+    return _finish(len(t), int(cum[-1]), float(t[-1] - t[0]), peak, int(counts.max()), min_gap)
+
+
+def _analyze_python(times, masks):
+    counts = [bin(m).count('1') for m in masks]
+    cum = [0]
+    for c in counts:
+        cum.append(cum[-1] + c)
+    peak = 0
+    for i, t in enumerate(times):
+        end = bisect_left(times, t + WINDOW_MS, i)
+        peak = max(peak, cum[end] - cum[i])
+    gaps = [b - a for a, b in zip(times, times[1:]) if b > a]
+    min_gap = float(min(gaps)) if gaps else None
+    return _finish(len(times), cum[-1], float(times[-1] - times[0]), peak, max(counts), min_gap)
+
+
+def analyze(timeline):
+    """
+    计算Timeline的统计字段（见STAT_FIELDS），空乐谱返回None
+    """
+    if not len(timeline):
+        return None
+    np = _get_numpy()
+    if np:
+        return _analyze_numpy(np, timeline.times, timeline.masks)
+    return _analyze_python(timeline.times, timeline.masks)
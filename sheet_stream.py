@@ -0,0 +1,252 @@
+import io
+import json
+import codecs
+import hashlib
+import threading
+from array import array
+from sheet_loader import sniff_encoding, settle_encoding
+from timeline import Timeline, NOTE_INDEX, MASK_TYPECODE, DEFAULT_BITS_PER_PAGE, SheetFormatError
+
+# 流式编译songNotes：按块读取文件、增量解码，逐个解析音符对象并直接合并进Timeline的两个数组，
+# 不构造整份json的对象树，也不再保存 time -> 音符列表 的中间字典。
+# 只编译顶层数组第一个对象（与compile_sheet一致），其后的元素只校验是否为合法json，与load_sheet接受的文件相同。
+# GrowingTimeline可在后台线程边解析边演奏：前几秒的和弦就绪后即可开始。
+
+CHUNK_SIZE = 64 * 1024
+READY_MS = 3000  # 边解析边演奏时，至少解析出这么长(毫秒)的和弦再开始
+_WS = ' \t\r\n'
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """
+    按块读取并增量解码，维护一个只保留未消费部分的文本缓冲区；同时计算源文件sha1
+    """
+    def __init__(self, f, encoding):
+        self.f = f
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.digest = hashlib.sha1()
+        self.size = 0
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def feed(self, raw):
+        self.digest.update(raw)
+        self.size += len(raw)
+        if self.pos > CHUNK_SIZE:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += self.decoder.decode(raw, final=not raw)
+
+    def more(self):
+        if self.eof:
+            return False
+        raw = self.f.read(CHUNK_SIZE)
+        if not raw:
+            self.eof = True
+        self.feed(raw)
+        return True
+
+    def peek(self):
+        # 跳过空白，返回下一个字符（文件结束返回''）
+        while True:
+            buf, pos = self.buf, self.pos
+            while pos < len(buf) and buf[pos] in _WS:
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self.more():
+                return ''
+
+    def expect(self, chars):
+        ch = self.peek()
+        if ch not in chars or not ch:
+            raise SheetFormatError(f"乐谱json结构不正确：期望{chars!r}，实际为{ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        """
+        解析下一个json值；值恰好位于缓冲区末尾时先读更多数据，避免把被截断的数字当成完整值
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.more()
+
+    def drain(self):
+        # 读完剩余内容，只为得到完整的sha1和文件大小
+        while self.more():
+            self.buf, self.pos = '', 0
+
+
+def _open_reader(f, hint=None):
+    # 编码在解析任何音符之前确定：有BOM或UTF-16特征时直接使用；8位文本先读入整个文件，
+    # 按与load_sheet相同的顺序找到能完整解码的编码，不会解析到一半才发现解码失败
+    head = f.read(CHUNK_SIZE)
+    enc = sniff_encoding(head)
+    if enc is None:
+        rest = f.read()
+        enc = settle_encoding(head + rest, hint)
+        f = io.BytesIO(rest)
+    reader = _Reader(f, enc)
+    reader.feed(head)
+    if not head:
+        reader.eof = True
+    return reader, enc
+
+
+def stream_compile(f, timeline=None, on_progress=None, on_reorder=None, encoding_hint=None):
+    """
+    从二进制文件对象流式编译乐谱。
+    返回(Timeline, 信息)，信息包含head(除songNotes外的字段)、notes(音符数)、duration(毫秒)、size、digest、encoding。
+    音符按时间有序时直接追加到数组（同一时间合并为和弦），遇到乱序时退回到最后统一排序合并，
+    此时先调用一次on_reorder(timeline)，之后不再追加，结束时整体换成排好序的新数组；
+    on_progress(timeline)在每解析一段后调用（仅有序时），供GrowingTimeline通知等待者。
+    encoding_hint为8位文本优先尝试的编码；无法解码时在解析任何音符之前抛出UnicodeDecodeError
+    """
+    reader, enc = _open_reader(f, encoding_hint)
+    timeline = timeline if timeline is not None else Timeline(array('I'), array(MASK_TYPECODE))
+    times, masks = timeline.times, timeline.masks
+    head = {}
+    count = 0
+    first = last = None
+    pending = None  # 出现乱序后改为收集 时间 -> 掩码
+    reader.expect('[')
+    reader.expect('{')
+    if reader.peek() == '}':
+        raise SheetFormatError("乐谱文件格式不正确，未找到songNotes。")
+    found = False
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == 'songNotes' and reader.peek() == '[':
+            found = True
+            reader.pos += 1
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    note = reader.value()
+                    count += 1
+                    # 与compile_notes一致：非对象（如加密乐谱）和未知按键直接忽略
+                    t = note.get('time') if isinstance(note, dict) else None
+                    if isinstance(t, (int, float)):
+                        idx = NOTE_INDEX.get(note.get('key'))
+                        first = t if first is None else min(first, t)
+                        last = t if last is None else max(last, t)
+                        if idx is not None:
+                            t = max(0, int(round(t)))
+                            bit = 1 << idx
+                            if pending is not None:
+                                pending[t] = pending.get(t, 0) | bit
+                            elif times and t == times[-1]:
+                                masks[-1] |= bit
+                            elif not times or t > times[-1]:
+                                times.append(t)
+                                masks.append(bit)
+                            else:
+                                # 乱序：把已追加的和弦转入字典，最后统一排序
+                                pending = dict(zip(times, masks))
+                                pending[t] = pending.get(t, 0) | bit
+                                if on_reorder:
+                                    on_reorder(timeline)
+                    if reader.expect(',]') == ']':
+                        break
+                    if on_progress and pending is None and count % 256 == 0:
+                        on_progress(timeline)
+        else:
+            head[key] = reader.value()
+        if reader.expect(',}') == '}':
+            break
+    if not found:
+        raise SheetFormatError("乐谱文件格式不正确，未找到songNotes。")
+    # 与json.loads一致：其后的数组元素也必须是合法json，顶层数组之后只能有空白
+    while reader.expect(',]') == ',':
+        reader.value()
+    if reader.peek():
+        raise SheetFormatError("乐谱json结构不正确：顶层数组之后还有多余内容")
+    if pending is not None:
+        # 换成新数组而不是原地修改，正在演奏的一方仍持有旧数组，不会读到一半的数据；
+        # 先换masks再换times，演奏方以times是否换过判断（见PlaybackEngine._play_song）
+        ordered = sorted(pending)
+        timeline.masks = array(MASK_TYPECODE, (pending[t] for t in ordered))
+        timeline.times = array('I', ordered)
+    bpm = head.get('bpm', 120)
+    timeline.bpm = bpm if isinstance(bpm, (int, float)) and bpm > 0 else 120
+    bits = head.get('bitsPerPage', DEFAULT_BITS_PER_PAGE)
+    timeline.bits_per_page = bits if isinstance(bits, int) and 0 < bits < 65536 else DEFAULT_BITS_PER_PAGE
+    reader.drain()
+    info = {
+        'head': head,
+        'notes': count,
+        'duration': (last - first) if count and first is not None else 0,
+        'size': reader.size,
+        'digest': reader.digest.digest(),
+        'encoding': enc,
+    }
+    return timeline, info
+
+
+class GrowingTimeline(Timeline):
+    """
+    在后台线程中边解析边追加的Timeline；演奏到已解析部分的末尾时wait_more()等待新和弦
+    """
+    __slots__ = ('_cond', 'done', 'error', 'reordered')
+
+    def __init__(self):
+        super().__init__(array('I'), array(MASK_TYPECODE))
+        self._cond = threading.Condition()
+        self.done = False
+        self.error = None
+        self.reordered = False  # 解析中遇到乱序音符，结束时会换成重新排序的数组
+
+    def notify(self, _=None):
+        with self._cond:
+            self._cond.notify_all()
+
+    def mark_reordered(self, _=None):
+        with self._cond:
+            self.reordered = True
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def wait_ready(self, ms, timeout=None):
+        """
+        等待已解析的和弦覆盖首音后ms毫秒（或解析结束）；遇到乱序音符时等到解析结束，
+        避免开始演奏后再换数组
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.done or (not self.reordered and len(self.times) > 1 and
+                                                      self.times[-1] - self.times[0] >= ms), timeout)
+
+    def wait_more(self, count):
+        """
+        等待完整的和弦数超过count或解析结束，返回完整的和弦数；解析出错时抛出该错误，由演奏引擎报告。
+        解析中最后一个和弦可能还在合并同一时刻的音符（masks[-1] |= bit），不计入
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.done or len(self.times) > count + 1)
+            if self.done:
+                if self.error is not None and len(self.times) <= count:
+                    raise self.error
+                return len(self.times)
+            return len(self.times) - 1
+
+    def wait_loaded(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self.done)
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import importlib
+
+# 启动耗时统计：按阶段记录从本模块导入起的耗时，以及延迟导入的模块在首次使用时的导入耗时，
+# 格式仿照 python -X importtime（自身耗时 | 累计耗时 | 名称）。
+# 传入 --startup-report 参数或设置环境变量 SKYAUTOMUSIC_STARTUP_REPORT=1 时输出报告。
+
+REPORT_FLAG = '--startup-report'
+REPORT_ENV = 'SKYAUTOMUSIC_STARTUP_REPORT'
+T0 = time.perf_counter()  # 入口脚本应最先导入本模块
+
+
+class StartupTimer:
+    """
+    启动阶段计时；mark(name)记录上一阶段结束到现在的耗时
+    """
+    def __init__(self, start=T0):
+        self.start = start
+        self.last = start
+        self.phases = []  # (名称, 自身毫秒, 累计毫秒)
+        self.imports = []  # (模块名, 导入毫秒, 距启动毫秒)
+        self.enabled = REPORT_FLAG in sys.argv or bool(os.environ.get(REPORT_ENV))
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, (now - self.last) * 1000, (now - self.start) * 1000))
+        self.last = now
+
+    def record_import(self, name, cost_ms):
+        self.imports.append((name, cost_ms, (time.perf_counter() - self.start) * 1000))
+
+    def report(self):
+        lines = ["startup phase:   self [ms] | cumulative [ms] | phase"]
+        lines += [f"startup phase: {own:9.1f} | {total:15.1f} | {name}" for name, own, total in self.phases]
+        lines += [f"lazy import:   {cost:9.1f} | {at:15.1f} | {name}" for name, cost, at in self.imports]
+        return '\n'.join(lines)
+
+    def emit(self, path=None):
+        """
+        启用时输出报告：有控制台时写到stderr，否则（如打包后的窗口程序）写入path
+        """
+        if not self.enabled:
+            return
+        text = self.report()
+        if sys.stderr is not None:
+            print(text, file=sys.stderr)
+        elif path:
+            try:
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(text + '\n')
+            except OSError:
+                pass
+
+
+STARTUP = StartupTimer()
+
+
+def lazy_import(name):
+    """
+    首次调用时才导入模块并记录耗时，之后直接返回已导入的模块
+    """
+    module = sys.modules.get(name)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        STARTUP.record_import(name, (time.perf_counter() - start) * 1000)
+    return module
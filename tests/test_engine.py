@@ -0,0 +1,154 @@
+"""
+演奏引擎的跳转、暂停、A-B循环：用虚拟时钟不真正等待；另有stop()后立即play()不得出现两个演奏线程的回归测试
+"""
+import os
+import sys
+import threading
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backends import NullBackend  # noqa: E402
+from engine import PlaybackEngine  # noqa: E402
+from scheduler import VirtualClock, REAL_CLOCK  # noqa: E402
+from timeline import Timeline, MASK_TYPECODE  # noqa: E402
+
+CHORDS = 20
+STEP_MS = 100
+
+
+class PressRecorder(NullBackend):
+    """
+    记录 (时刻, 演奏线程, 和弦掩码)
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self.pressed = []
+
+    def press_mask(self, mask):
+        self.pressed.append((self.clock.now(), threading.current_thread(), mask))
+
+
+class PauseAwareClock(VirtualClock):
+    """
+    引擎暂停后演奏线程读取时钟（记下暂停时刻）时置位paused_read，测试此后再推进时间
+    """
+    def __init__(self):
+        super().__init__()
+        self.engine = None
+        self.paused_read = threading.Event()
+
+    def now(self):
+        if self.engine is not None and self.engine.is_paused:
+            self.paused_read.set()
+        return self.t
+
+
+def make_engine(clock=None, hold=0.05, step_ms=STEP_MS, backend=None):
+    clock = clock or VirtualClock()
+    backend = backend or PressRecorder(clock)
+    engine = PlaybackEngine(backend, hold=hold, start_delay=0, clock=clock)
+    masks = array(MASK_TYPECODE, (1 << (i % 15) | (1 << 14 if i >= 15 else 0) for i in range(CHORDS)))
+    engine.load(Timeline(array('I', range(0, CHORDS * step_ms, step_ms)), masks))
+    return engine, backend
+
+
+def masks_of(backend):
+    return [mask for _, _, mask in backend.pressed]
+
+
+def pause_at(engine, done_count):
+    # 演奏线程中回调：演奏完第done_count个和弦后暂停
+    def on_progress(done, total, ms):
+        if done == done_count:
+            engine.pause()
+    return on_progress
+
+
+def test_seek_before_play_starts_from_that_chord():
+    engine, backend = make_engine()
+    assert engine.seek(7 * STEP_MS + 30) == 8  # 定位到该时刻之后的第一个和弦
+    engine.play(block=True)
+    masks = engine.timeline.masks
+    assert masks_of(backend) == list(masks[8:])
+    assert backend.pressed[0][0] == 0.0  # 从定位处重新起算节奏
+    assert engine.progress.completed and engine.progress.state[0] == CHORDS
+
+
+def test_seek_while_paused_resumes_at_new_position():
+    clock = PauseAwareClock()
+    engine, backend = make_engine(clock)
+    clock.engine = engine
+    engine.play(on_progress=pause_at(engine, 5))
+    assert clock.paused_read.wait(5)
+    engine.seek(15 * STEP_MS)
+    engine.resume()
+    engine.wait(5)
+    masks = engine.timeline.masks
+    assert masks_of(backend) == list(masks[:5]) + list(masks[15:])
+    assert engine.progress.completed
+
+
+def test_pause_resume_is_not_counted_as_lateness():
+    clock = PauseAwareClock()
+    engine, backend = make_engine(clock)
+    clock.engine = engine
+    engine.play(on_progress=pause_at(engine, 5))
+    assert clock.paused_read.wait(5)
+    clock.advance(10.0)  # 暂停10秒
+    engine.resume()
+    engine.wait(5)
+    stats = engine.progress.stats.summary()
+    assert stats['count'] == CHORDS and stats['skipped'] == 0
+    assert stats['max'] < 1e-6
+    times = [t for t, _, _ in backend.pressed]
+    # 恢复后的和弦整体顺延暂停时长，间隔保持不变
+    assert abs(times[5] - times[4] - (10.0 + STEP_MS / 1000)) < 1e-6
+    assert all(abs(b - a - STEP_MS / 1000) < 1e-6 for a, b in zip(times[5:], times[6:]))
+
+
+def test_ab_loop_wraps_seamlessly():
+    engine, backend = make_engine()
+    wraps = 4
+    stop_after = 5 + 5 * wraps
+
+    def on_progress(done, total, ms):
+        if len(backend.pressed) == stop_after:
+            engine.stop()
+    assert engine.set_loop(5 * STEP_MS, 10 * STEP_MS)
+    engine.play(on_progress=on_progress, block=True)
+    masks = engine.timeline.masks
+    assert masks_of(backend) == list(masks[:5]) + list(masks[5:10]) * wraps
+    # 每一轮的A点在上一轮B点处接上，不多不少正好一个循环长度
+    starts = [t for i, (t, _, _) in enumerate(backend.pressed) if i >= 5 and (i - 5) % 5 == 0]
+    assert len(starts) == wraps
+    assert all(abs(b - a - 5 * STEP_MS / 1000) < 1e-6 for a, b in zip(starts, starts[1:]))
+    assert not engine.progress.completed and not engine.is_playing
+
+
+class RealClockRecorder(PressRecorder):
+    def __init__(self, clock, after):
+        super().__init__(clock)
+        self.after = after
+        self.started = threading.Event()
+
+    def press_mask(self, mask):
+        super().press_mask(mask)
+        if len(self.pressed) >= self.after:
+            self.started.set()
+
+
+def test_stop_then_play_never_runs_two_play_threads():
+    engine, backend = make_engine(REAL_CLOCK, hold=0.005, step_ms=20, backend=RealClockRecorder(REAL_CLOCK, after=3))
+    engine.play()
+    assert backend.started.wait(5)
+    first = engine._thread
+    engine.stop()
+    assert not first.is_alive()
+    engine.play()
+    engine.wait(5)
+    threads = [thread for _, thread, _ in backend.pressed]
+    old = threads.index(threads[-1])  # 新线程的第一次按下
+    # 旧线程的按下全部在新线程开始之前，新线程从头完整演奏一遍
+    assert set(threads[:old]) == {first} and set(threads[old:]) == {threads[-1]}
+    assert len(threads) - old == CHORDS
+    assert engine.progress.completed and not engine.is_playing
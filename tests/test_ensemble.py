@@ -0,0 +1,79 @@
+"""
+合奏：同一时刻起音的声部间偏差不超过各声部依次注入的耗时；任一声部的后端出错时整个合奏干净地结束
+"""
+import os
+import sys
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backends import RecordingBackend  # noqa: E402
+from ensemble import EnsembleEngine, Part  # noqa: E402
+from scheduler import VirtualClock  # noqa: E402
+from timeline import Timeline, MASK_TYPECODE  # noqa: E402
+
+CHORDS = 30
+KEY_COST = 0.0005  # 每次按下的模拟注入耗时(秒)
+
+
+class CostlyRecorder(RecordingBackend):
+    """
+    记录按键事件，每批按下推进虚拟时钟KEY_COST；fail_at为第几次按下时抛出异常
+    """
+    def __init__(self, clock, fail_at=None):
+        super().__init__(clock.now)
+        self.virtual = clock
+        self.fail_at = fail_at
+        self.presses = []
+
+    def press_mask(self, mask):
+        if len(self.presses) + 1 == self.fail_at:
+            raise OSError("按键注入失败")
+        self.presses.append(self.clock())
+        super().press_mask(mask)
+        self.virtual.advance(KEY_COST)
+
+
+def make_timeline():
+    return Timeline(array('I', range(0, CHORDS * 100, 100)), array(MASK_TYPECODE, (1 << (i % 15) for i in range(CHORDS))))
+
+
+def make_ensemble(n, fail_part=None, fail_at=None):
+    clock = VirtualClock()
+    backends = [CostlyRecorder(clock, fail_at if i == fail_part else None) for i in range(n)]
+    parts = [Part(f"声部{i}", make_timeline(), backend) for i, backend in enumerate(backends)]
+    return EnsembleEngine(parts, start_delay=0, clock=clock), backends
+
+
+def test_cross_part_skew_is_bounded_by_injection_cost():
+    n = 3
+    engine, backends = make_ensemble(n)
+    engine.play(block=True)
+    assert engine.progress.completed and engine.progress.error is None
+    skew = engine.report()['skew']
+    assert skew['count'] == CHORDS
+    # 各声部在同一截止时间依次发出，偏差只来自前面声部的注入耗时，不随演奏累积
+    assert skew['max'] <= (n - 1) * KEY_COST + 1e-9
+    for i in range(CHORDS):
+        onsets = [b.presses[i] for b in backends]
+        assert abs(onsets[0] - i * 0.1) < 1e-9  # 第一个声部准时
+        assert max(onsets) - min(onsets) <= (n - 1) * KEY_COST + 1e-9
+
+
+def test_failing_part_ends_the_whole_ensemble_cleanly():
+    engine, backends = make_ensemble(3, fail_part=1, fail_at=5)
+    engine.play()
+    engine.wait(5)
+    progress = engine.progress
+    assert progress.finished and not progress.completed
+    assert isinstance(progress.error, OSError)
+    assert not engine.is_playing
+    # 出错的和弦之后没有任何声部再按键
+    assert [len(b.presses) for b in backends] == [5, 4, 4]
+    for backend in backends:
+        held = set()
+        for _, kind, key in backend.events:
+            if kind == 'down':
+                held.add(key)
+            else:
+                held.discard(key)
+        assert not held  # 每个声部按住的键都已抬起
@@ -0,0 +1,53 @@
+"""
+按键注入层：用FakeInjector/FakeBackend和虚拟时钟驱动演奏引擎，检查每批按下/抬起的内容和顺序
+"""
+import os
+import sys
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backends import FakeBackend  # noqa: E402
+from engine import PlaybackEngine, RETRIGGER_GAP  # noqa: E402
+from scheduler import VirtualClock  # noqa: E402
+from timeline import Timeline, MASK_TYPECODE, KEYS  # noqa: E402
+
+
+def play(times, masks, hold):
+    clock = VirtualClock()
+    backend = FakeBackend()
+    backend.injector.clock = clock.now
+    engine = PlaybackEngine(backend, hold=hold, start_delay=0, clock=clock)
+    engine.load(Timeline(array('I', times), array(MASK_TYPECODE, masks)))
+    engine.play(block=True)
+    assert engine.progress.completed
+    return [(round(t, 6), batch) for t, batch in backend.injector.batches]
+
+
+def down(*keys):
+    return tuple((key, False) for key in keys)
+
+
+def up(*keys):
+    return tuple((key, True) for key in keys)
+
+
+def test_held_chord_is_one_batch_each_way():
+    a, b, c = KEYS[:3]
+    batches = play([0, 100], [0b011, 0b100], hold=0.05)
+    assert batches == [(0.0, down(a, b)), (0.05, up(a, b)), (0.1, down(c)), (0.15, up(c))]
+
+
+def test_retriggered_key_is_released_just_before_pressing_again():
+    a, b = KEYS[:2]
+    # 按住0.15秒，比和弦间隔长：仍按住的键在下一次起音前RETRIGGER_GAP抬起，
+    # 旧和弦到期的抬起只放开它自己按下、没有被重新按下的键
+    batches = play([0, 100, 200], [0b11, 0b01, 0b01], hold=0.15)
+    assert batches == [
+        (0.0, down(a, b)),
+        (round(0.1 - RETRIGGER_GAP, 6), up(a)),
+        (0.1, down(a)),
+        (0.15, up(b)),
+        (round(0.2 - RETRIGGER_GAP, 6), up(a)),
+        (0.2, down(a)),
+        (0.35, up(a)),
+    ]
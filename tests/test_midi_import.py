@@ -0,0 +1,50 @@
+"""
+MIDI导入：--format skc 写出的乐谱json和预编译缓存要能被演奏路径直接加载，且与从json重建的缓存一致
+"""
+import os
+import sys
+import struct
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sheet_cache  # noqa: E402
+from midi_import import import_midi  # noqa: E402
+from sheet_loader import load_sheet  # noqa: E402
+from timeline import compile_sheet  # noqa: E402
+
+
+def make_midi(path):
+    # 格式0，每四分音符480tick，120bpm：C4+E4同时，半拍后G4，再一拍C5
+    events = bytes([0x00, 0xFF, 0x51, 0x03, 0x07, 0xA1, 0x20,
+                    0x00, 0x90, 60, 100, 0x00, 0x90, 64, 100,
+                    0x81, 0x70, 0x80, 60, 0, 0x00, 0x80, 64, 0, 0x00, 0x90, 67, 100,
+                    0x83, 0x60, 0x80, 67, 0, 0x00, 0x90, 72, 100,
+                    0x83, 0x60, 0x80, 72, 0, 0x00, 0xFF, 0x2F, 0x00])
+    with open(path, 'wb') as f:
+        f.write(b'MThd' + struct.pack('>IHHH', 6, 0, 1, 480))
+        f.write(b'MTrk' + struct.pack('>I', len(events)) + events)
+
+
+def test_skc_import_round_trips_through_load_timeline(tmp_path):
+    make_midi(tmp_path / 'song.mid')
+    out_dir, cache_dir = tmp_path / 'sheets', tmp_path / 'cache'
+    out_dir.mkdir()
+    out_path, info = import_midi(str(tmp_path / 'song.mid'), str(out_dir), fmt='skc', cache_dir=str(cache_dir))
+    assert out_path == str(out_dir / 'song.json')
+    assert info['chords'] == 3
+
+    # 缓存以写出的json为源，有效且无需重新编译
+    cpath = sheet_cache.cache_path(str(cache_dir), 'song.json')
+    assert sheet_cache.is_valid(out_path, cpath)
+    assert not sheet_cache.build(out_path, str(cache_dir))
+
+    expected = compile_sheet(load_sheet(out_path)[0])
+    timeline = sheet_cache.load_timeline(out_path, str(cache_dir))
+    assert isinstance(timeline.times, memoryview)  # 直接mmap了导入时写的缓存
+    assert list(timeline.times) == list(expected.times) == [0, 250, 750]
+    assert list(timeline.masks) == list(expected.masks)
+    assert (timeline.bpm, timeline.bits_per_page) == (expected.bpm, expected.bits_per_page)
+
+    # 与从json重新编译的缓存元数据一致
+    sheet_cache.build(out_path, str(tmp_path / 'rebuilt'))
+    rebuilt = sheet_cache.map_cache(sheet_cache.cache_path(str(tmp_path / 'rebuilt'), 'song.json'))
+    assert sheet_cache.map_cache(cpath)[2] == rebuilt[2]
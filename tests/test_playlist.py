@@ -0,0 +1,30 @@
+"""
+播放列表：peek()预告的下一首必须就是advance()实际前进到的那首，随机+列表循环的每轮交界处也一样
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from playlist import Playlist  # noqa: E402
+
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_peek_matches_advance_across_rounds(shuffle):
+    playlist = Playlist(list('abcdef'), shuffle=shuffle, repeat='all', seed=7)
+    played = [playlist.current()]
+    for _ in range(60):
+        following = playlist.peek()
+        assert playlist.advance() == following
+        played.append(following)
+    # 每轮都是完整的一遍
+    for start in range(0, 60, 6):
+        assert sorted(played[start:start + 6]) == list('abcdef')
+
+
+def test_repeated_peek_does_not_reshuffle():
+    playlist = Playlist(list('abcdef'), shuffle=True, repeat='all', seed=3)
+    for _ in range(5):
+        playlist.advance()
+    assert len({playlist.peek() for _ in range(20)}) == 1
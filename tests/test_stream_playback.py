@@ -0,0 +1,164 @@
+"""
+边解析边演奏：乐谱在流式解析途中出现乱序音符时，引擎不能因为换成重新排序的数组而跳过或重复和弦；
+编码在解析前确定；流式解析与load_sheet/compile_sheet接受相同的文件。
+"""
+import io
+import codecs
+import os
+import sys
+import json
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backends import NullBackend  # noqa: E402
+from engine import PlaybackEngine  # noqa: E402
+from scheduler import VirtualClock  # noqa: E402
+from sheet_stream import stream_compile, GrowingTimeline, CHUNK_SIZE  # noqa: E402
+from timeline import compile_sheet  # noqa: E402
+
+
+class MaskRecorder(NullBackend):
+    def __init__(self):
+        self.pressed = []
+
+    def press_mask(self, mask):
+        self.pressed.append(mask)
+
+
+class GatedFile(io.BytesIO):
+    """
+    读完第一块后阻塞，直到gate被打开；模拟解析追不上演奏
+    """
+    def __init__(self, data):
+        super().__init__(data)
+        self.gate = threading.Event()
+        self.blocked = threading.Event()
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        if self.reads > 1:
+            self.blocked.set()
+            self.gate.wait(10)
+        return super().read(size)
+
+
+def sheet_bytes(notes, tail=''):
+    return (json.dumps([{'name': 'test', 'bpm': 120, 'songNotes': notes}]) + tail).encode('utf-8')
+
+
+def ordered_notes(start, stop, step=10):
+    return [{'time': t, 'key': f"1Key{(t // step) % 15}"} for t in range(start, stop, step)]
+
+
+def play_streaming(raw):
+    # 带BOM时编码可直接确定，按块读取（无BOM的8位文本会先整份读入以确定编码）
+    f = GatedFile(codecs.BOM_UTF8 + raw)
+    timeline = GrowingTimeline()
+
+    def worker():
+        try:
+            stream_compile(f, timeline, timeline.notify)
+            timeline.finish()
+        except Exception as e:
+            timeline.finish(e)
+
+    threading.Thread(target=worker, daemon=True).start()
+    timeline.wait_ready(100, timeout=10)
+    backend = MaskRecorder()
+    engine = PlaybackEngine(backend, start_delay=0, clock=VirtualClock())
+    engine.load(timeline)
+    engine.play()
+    # 等演奏追上已解析部分（解析线程正阻塞在第二块），再放行剩余内容
+    assert f.blocked.wait(10)
+    f.gate.set()
+    engine.wait(10)
+    assert engine.progress.finished and engine.progress.error is None
+    return timeline, backend.pressed
+
+
+def test_out_of_order_note_while_streaming():
+    first = ordered_notes(0, 40000)  # 远大于一块，演奏开始时只解析了前一部分
+    assert len(json.dumps(first)) > CHUNK_SIZE
+    late = [{'time': 5, 'key': '1Key14'}]  # 早于已演奏部分，只能错过
+    future = [{'time': 60005, 'key': '1Key14'}, {'time': 60000, 'key': '2Key3'}]  # 乱序但尚未演奏
+    rest = ordered_notes(40000, 70000)
+    timeline, pressed = play_streaming(sheet_bytes(first + late + rest + future))
+    expected = compile_sheet(json.loads(sheet_bytes(first + late + rest + future)))
+    assert list(timeline.times) == list(expected.times)
+    # 除了插入到已演奏部分之前的那个和弦，其余和弦都按顺序各演奏一次
+    skipped = list(expected.times).index(5)
+    assert pressed == [m for i, m in enumerate(expected.masks) if i != skipped]
+
+
+def test_ordered_sheet_while_streaming():
+    notes = ordered_notes(0, 70000)
+    timeline, pressed = play_streaming(sheet_bytes(notes))
+    assert pressed == list(compile_sheet(json.loads(sheet_bytes(notes))).masks)
+
+
+def test_reorder_before_ready_holds_back_playback():
+    notes = ordered_notes(0, 100) + [{'time': 50, 'key': '1Key14'}] + ordered_notes(100, 40000)
+    f = io.BytesIO(sheet_bytes(notes))
+    timeline = GrowingTimeline()
+    threading.Thread(target=lambda: (stream_compile(f, timeline, timeline.notify, timeline.mark_reordered),
+                                     timeline.finish()), daemon=True).start()
+    timeline.wait_ready(3000, timeout=10)
+    assert timeline.done and timeline.reordered
+
+
+def test_gbk_sheet_is_decoded_before_streaming():
+    raw = json.dumps([{'name': '中文' * CHUNK_SIZE, 'songNotes': ordered_notes(0, 1000)}],
+                     ensure_ascii=False).encode('gbk')
+    timeline, info = stream_compile(io.BytesIO(raw))
+    assert info['encoding'] == 'gbk'
+    assert list(timeline.times) == list(range(0, 1000, 10))
+
+
+@pytest.mark.parametrize('tail', ['\n/* 注释 */', '\n[]', ''])
+def test_trailing_content_matches_load_sheet(tail):
+    raw = sheet_bytes(ordered_notes(0, 100), tail)
+    try:
+        json.loads(raw.decode('utf-8'))
+        accepted = True
+    except ValueError:
+        accepted = False
+    if accepted:
+        stream_compile(io.BytesIO(raw))
+    else:
+        with pytest.raises(ValueError):
+            stream_compile(io.BytesIO(raw))
+
+
+def test_trailing_elements_must_be_valid_json():
+    raw = sheet_bytes(ordered_notes(0, 100))[:-1] + b', {"a": 1}, [2]]'
+    stream_compile(io.BytesIO(raw))
+    with pytest.raises(ValueError):
+        stream_compile(io.BytesIO(raw[:-1] + b', oops]'))
+
+
+def chord_notes(start, stop, step=10, size=3):
+    # 每个和弦size个音符，音符数不是256的因数，通知和分块边界会落在和弦中间
+    return [{'time': t, 'key': f"1Key{(t // step + k) % 15}"} for t in range(start, stop, step) for k in range(size)]
+
+
+def test_multi_note_chords_are_pressed_whole_while_streaming():
+    notes = chord_notes(0, 40000)
+    timeline, pressed = play_streaming(sheet_bytes(notes))
+    assert pressed == list(compile_sheet(json.loads(sheet_bytes(notes))).masks)
+
+
+def test_wait_more_hides_the_chord_still_being_built():
+    timeline = GrowingTimeline()
+    timeline.times.extend([0, 100])
+    timeline.masks.extend([1, 2])  # 第二个和弦可能还会合并同一时刻的音符
+    assert timeline.wait_more(0) == 1
+    timeline.masks[-1] |= 4
+    timeline.times.append(200)
+    timeline.masks.append(8)
+    timeline.notify()
+    assert timeline.wait_more(1) == 2
+    timeline.finish()
+    assert timeline.wait_more(2) == 3
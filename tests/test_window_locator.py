@@ -0,0 +1,76 @@
+"""
+游戏窗口定位：缓存命中时不再枚举窗口；窗口关闭、句柄被其它进程复用或置顶失败时重新枚举
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from window_locator import FakeWindowSystem, WindowLocator  # noqa: E402
+
+NAMES = {10: 'explorer.exe', 20: 'Sky.exe', 30: '光遇.exe', 40: 'chrome.exe'}
+
+
+def make_desktop():
+    windows = {1: 10, 2: 40, 5: 40, 3: 30, 4: 20}
+    return FakeWindowSystem(windows, NAMES)
+
+
+def test_cached_lookup_skips_enumeration():
+    system = make_desktop()
+    locator = WindowLocator(system)
+    assert locator.locate() == 4  # Sky进程优先于光遇
+    assert system.calls['windows'] == 1
+    assert system.calls['process_name'] == 4  # 同一进程的两个窗口只查一次进程名
+    system.calls.clear()
+    for _ in range(3):
+        assert locator.locate() == 4
+    assert locator.scans == 1
+    assert system.calls['windows'] == 0 and system.calls['process_name'] == 0
+    assert system.calls['is_window'] == 3 and system.calls['window_pid'] == 3
+    assert system.activated == [4] * 4
+
+
+def test_closed_window_is_re_resolved():
+    system = make_desktop()
+    locator = WindowLocator(system)
+    assert locator.locate() == 4
+    del system.window_map[4]  # 游戏重启：旧窗口关闭，出现新窗口
+    system.window_map[9] = 21
+    system.names[21] = 'Sky.exe'
+    assert locator.cached() is None and locator.hwnd is None
+    assert locator.locate() == 9
+    assert locator.scans == 2
+    assert locator.locate() == 9 and locator.scans == 2  # 新窗口再次被缓存
+
+
+def test_reused_handle_from_another_process_is_rejected():
+    system = make_desktop()
+    locator = WindowLocator(system)
+    assert locator.locate() == 4
+    system.window_map[4] = 40  # 游戏退出后句柄被其它进程复用
+    assert locator.locate() == 3  # 重新枚举，退回到光遇
+    assert (locator.hwnd, locator.pid, locator.scans) == (3, 30, 2)
+
+
+def test_activate_failure_rescans_once():
+    class FlakyActivate(FakeWindowSystem):
+        def activate(self, hwnd):
+            if hwnd == 4:
+                del self.window_map[4]  # 窗口在确认之后、置顶之前关闭
+                raise OSError("窗口已关闭")
+            super().activate(hwnd)
+
+    system = FlakyActivate(make_desktop().window_map, NAMES)
+    locator = WindowLocator(system)
+    assert locator.locate() == 3
+    assert locator.scans == 2 and system.activated == [3]
+
+
+def test_no_game_window_clears_cache():
+    system = make_desktop()
+    locator = WindowLocator(system)
+    assert locator.locate() == 4
+    for hwnd in (3, 4):
+        del system.window_map[hwnd]
+    assert locator.locate() is None
+    assert locator.hwnd is None and locator.pid is None
@@ -0,0 +1,94 @@
+from array import array
+
+# 音符-按键映射（可在此修改），1Key*/2Key* 映射到同一组15个键位
+note_to_key = {
+    "1Key0": "Y", "1Key1": "U", "1Key2": "I", "1Key3": "O", "1Key4": "P",
+    "1Key5": "H", "1Key6": "J", "1Key7": "K", "1Key8": "L", "1Key9": ";",
+    "1Key10": "N", "1Key11": "M", "1Key12": ",", "1Key13": ".", "1Key14": "/",
+    "2Key0": "Y", "2Key1": "U", "2Key2": "I", "2Key3": "O", "2Key4": "P",
+    "2Key5": "H", "2Key6": "J", "2Key7": "K", "2Key8": "L", "2Key9": ";",
+    "2Key10": "N", "2Key11": "M", "2Key12": ",", "2Key13": ".", "2Key14": "/"
+}
+
+# 按键索引表：和弦用位掩码表示，第i位对应KEYS[i]
+KEYS = list(dict.fromkeys(note_to_key.values()))
+NOTE_INDEX = {note: KEYS.index(key) for note, key in note_to_key.items()}
+MASK_TYPECODE = 'H' if len(KEYS) <= 16 else 'I'  # 15个键位放得进16位
+DEFAULT_BITS_PER_PAGE = 16  # Sky Studio每页16格，即每拍4格
+
+
+class SheetFormatError(ValueError):
+    """
+    乐谱结构不正确（如找不到songNotes）
+    """
+
+
+def iter_keys(mask):
+    """
+    按位遍历和弦掩码，依次产出按键
+    """
+    while mask:
+        low = mask & -mask
+        yield KEYS[low.bit_length() - 1]
+        mask ^= low
+
+
+class Timeline:
+    """
+    编译后的演奏时间轴：times为各和弦起始时间(毫秒，升序)，masks为对应和弦的按键掩码。
+    音符到按键的转换只在编译时做一次，演奏时只遍历两个数组。
+    bpm和bits_per_page只是乐谱的网格信息（songNotes的time已是毫秒），不参与演奏速度计算
+    """
+    __slots__ = ('times', 'masks', 'bpm', 'bits_per_page')
+
+    def __init__(self, times=None, masks=None, bpm=120, bits_per_page=DEFAULT_BITS_PER_PAGE):
+        self.times = times if times is not None else array('I')
+        self.masks = masks if masks is not None else array(MASK_TYPECODE)
+        self.bpm = bpm
+        self.bits_per_page = bits_per_page
+
+    def __len__(self):
+        return len(self.times)
+
+    def duration_ms(self):
+        return self.times[-1] - self.times[0] if self.times else 0
+
+    def wait_more(self, count):
+        # 已编译完成的时间轴无需等待；边解析边演奏的GrowingTimeline会阻塞到有新和弦
+        return len(self.times)
+
+    def wait_loaded(self):
+        pass
+
+
+def compile_notes(song_notes, bpm=120, bits_per_page=DEFAULT_BITS_PER_PAGE):
+    """
+    把songNotes列表编译为Timeline；同一时间的音符合并为一个和弦，未知按键忽略
+    """
+    chords = {}
+    for note in song_notes:
+        if not isinstance(note, dict):
+            continue
+        idx = NOTE_INDEX.get(note.get('key'))
+        t = note.get('time')
+        if idx is None or not isinstance(t, (int, float)):
+            continue
+        t = max(0, int(round(t)))
+        chords[t] = chords.get(t, 0) | (1 << idx)
+    ordered = sorted(chords)
+    return Timeline(array('I', ordered), array(MASK_TYPECODE, [chords[t] for t in ordered]), bpm, bits_per_page)
+
+
+def compile_sheet(data):
+    """
+    编译已解析的乐谱json，读取第一个元素的songNotes、bpm（若无则默认120）和bitsPerPage
+    """
+    if not (isinstance(data, list) and data and isinstance(data[0], dict) and 'songNotes' in data[0]):
+        raise SheetFormatError("乐谱文件格式不正确，未找到songNotes。")
+    bpm = data[0].get('bpm', 120)
+    if not isinstance(bpm, (int, float)) or bpm <= 0:
+        bpm = 120
+    bits_per_page = data[0].get('bitsPerPage', DEFAULT_BITS_PER_PAGE)
+    if not isinstance(bits_per_page, int) or not 0 < bits_per_page < 65536:
+        bits_per_page = DEFAULT_BITS_PER_PAGE
+    return compile_notes(data[0]['songNotes'], bpm, bits_per_page)
@@ -0,0 +1,165 @@
+import os
+import sys
+import json
+import time
+import threading
+
+# 性能跟踪：命名区间(span)、计数器和瞬时事件，导出为Chrome/Perfetto可直接打开的trace.json
+# 以及按区间名汇总的文本报告（次数/总计/平均/P99/最大）。
+# 未启用时span()返回共享的空上下文，演奏循环等热路径在开始时判断一次enabled，关闭时几乎没有开销。
+# 传入 --trace 参数、设置环境变量 SKYAUTOMUSIC_TRACE=1 或在界面中勾选后启用。
+
+TRACE_FLAG = '--trace'
+TRACE_ENV = 'SKYAUTOMUSIC_TRACE'
+MAX_EVENTS = 1000000  # 超过后不再记录，防止长时间开启占满内存
+SPAN, COUNTER, INSTANT = 'X', 'C', 'i'  # Chrome trace 事件类型
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = self.tracer.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args = dict(self.args or {}, error=exc_type.__name__)
+        self.tracer.complete(self.name, self.start, self.tracer.clock(), self.cat, self.args)
+        return False
+
+
+class Tracer:
+    """
+    事件记录在内存列表中（list.append在GIL下线程安全），导出时再转换格式；
+    时间为clock()秒，导出时换算为相对origin的微秒
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.origin = clock()
+        self.enabled = TRACE_FLAG in sys.argv or bool(os.environ.get(TRACE_ENV))
+        self.events = []  # (类型, 名称, 类别, 时刻, 持续秒或计数值, 参数, 线程id)
+        self.threads = {}  # 线程id -> 线程名
+        self.dropped = 0
+
+    def enable(self, on=True):
+        self.enabled = on
+
+    def clear(self):
+        self.events = []
+        self.threads = {}
+        self.dropped = 0
+        self.origin = self.clock()
+
+    def span(self, name, cat='app', **args):
+        """
+        with TRACE.span('名称', '类别', 参数=值): ... 记录一个区间
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args or None)
+
+    def complete(self, name, start, end, cat='app', args=None):
+        """
+        记录已自行计时的区间（热路径中使用，调用方应先判断enabled）
+        """
+        self._add(SPAN, name, cat, start, end - start, args)
+
+    def counter(self, name, value, cat='app'):
+        if self.enabled:
+            self._add(COUNTER, name, cat, self.clock(), value, None)
+
+    def instant(self, name, cat='app', **args):
+        if self.enabled:
+            self._add(INSTANT, name, cat, self.clock(), 0, args or None)
+
+    def _add(self, kind, name, cat, ts, value, args):
+        if len(self.events) >= MAX_EVENTS:
+            self.dropped += 1
+            return
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        self.events.append((kind, name, cat, ts, value, args, tid))
+
+    def chrome_events(self):
+        """
+        转换为Chrome trace事件列表；线程id按首次出现顺序编号为1、2、3...
+        """
+        pid = os.getpid()
+        tids = {tid: i for i, tid in enumerate(self.threads, 1)}
+        result = [{'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': tids[tid], 'args': {'name': name}}
+                  for tid, name in self.threads.items()]
+        for kind, name, cat, ts, value, args, tid in list(self.events):
+            event = {'ph': kind, 'name': name, 'cat': cat, 'pid': pid, 'tid': tids.get(tid, 0),
+                     'ts': round((ts - self.origin) * 1e6, 3)}
+            if kind == SPAN:
+                event['dur'] = round(value * 1e6, 3)
+                if args:
+                    event['args'] = args
+            elif kind == COUNTER:
+                event['args'] = {name: value}
+            else:
+                event['s'] = 't'
+                if args:
+                    event['args'] = args
+            result.append(event)
+        return result
+
+    def summary(self):
+        """
+        按区间名汇总耗时(毫秒)，按总耗时从高到低；计数器列出次数、最小、平均、最大值
+        """
+        spans, counters = {}, {}
+        for kind, name, _, _, value, _, _ in list(self.events):
+            if kind == SPAN:
+                spans.setdefault(name, []).append(value * 1000)
+            elif kind == COUNTER:
+                counters.setdefault(name, []).append(value)
+        lines = [f"{'span':<28}{'count':>8}{'total':>11}{'mean':>10}{'p99':>10}{'max':>10}  (ms)"]
+        for name, costs in sorted(spans.items(), key=lambda item: -sum(item[1])):
+            costs.sort()
+            n = len(costs)
+            lines.append(f"{name:<28}{n:>8}{sum(costs):>11.2f}{sum(costs) / n:>10.3f}"
+                         f"{costs[min(n - 1, int(n * 0.99))]:>10.3f}{costs[-1]:>10.3f}")
+        if counters:
+            lines.append(f"{'counter':<28}{'count':>8}{'min':>11}{'mean':>10}{'max':>10}")
+            for name, values in sorted(counters.items()):
+                lines.append(f"{name:<28}{len(values):>8}{min(values):>11.3f}"
+                             f"{sum(values) / len(values):>10.3f}{max(values):>10.3f}")
+        if self.dropped:
+            lines.append(f"超过{MAX_EVENTS}个事件，丢弃了{self.dropped}个")
+        return '\n'.join(lines)
+
+    def write(self, path):
+        """
+        写入path（Chrome trace json）和同名.txt汇总，返回两个文件路径
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.chrome_events(), 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        summary_path = os.path.splitext(path)[0] + '.txt'
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(self.summary() + '\n')
+        return path, summary_path
+
+
+TRACE = Tracer()
@@ -0,0 +1,105 @@
+import random
+from array import array
+from timeline import Timeline, MASK_TYPECODE
+
+# 时间轴变换流水线：加载乐谱时对编译好的Timeline一次性执行，得到最终的绝对时间，
+# 演奏循环只读取变换后的times，不再在热循环里做任何节奏换算。
+# 执行顺序固定为：量化 -> 变速 -> 人性化抖动 -> 最小间隔限制。
+#
+# 注意：乐谱的songNotes.time本身就是毫秒，bpm/bitsPerPage只描述编辑器网格，
+# 旧版把120/bpm当作速度系数会让高bpm的乐谱（如KING.json的335）被错误加速。
+
+SPEED_RANGE = (0.1, 20.0)
+
+
+def _rebuild(timeline, pairs):
+    """
+    由(时间, 掩码)列表生成新Timeline：按时间排序，时间相同的和弦合并。时间为浮点毫秒
+    """
+    pairs.sort(key=lambda p: p[0])
+    times, masks = array('d'), array(MASK_TYPECODE)
+    for t, mask in pairs:
+        if times and t == times[-1]:
+            masks[-1] |= mask
+        else:
+            times.append(t)
+            masks.append(mask)
+    return Timeline(times, masks, timeline.bpm, timeline.bits_per_page)
+
+
+def grid_ms(timeline, division=None):
+    """
+    量化网格(毫秒)：一拍为60000/bpm毫秒，每拍的格数默认由bitsPerPage推算（每页4拍）
+    """
+    if division is None:
+        division = max(1, timeline.bits_per_page // 4)
+    return 60000.0 / timeline.bpm / division
+
+
+def quantize(timeline, division=None, strength=1.0):
+    """
+    把和弦起始时间吸附到网格上；strength在0~1之间，1为完全吸附
+    """
+    step = grid_ms(timeline, division)
+    t0 = timeline.times[0]
+    pairs = []
+    for t, mask in zip(timeline.times, timeline.masks):
+        snapped = t0 + round((t - t0) / step) * step
+        pairs.append((t + (snapped - t) * strength, mask))
+    return _rebuild(timeline, pairs)
+
+
+def change_speed(timeline, ratio):
+    """
+    整体变速：ratio>1变快，不改变音高（按键不变）
+    """
+    lo, hi = SPEED_RANGE
+    if not lo <= ratio <= hi:
+        raise ValueError(f"速度倍率应在{lo}~{hi}之间: {ratio}")
+    t0 = timeline.times[0]
+    times = array('d', (t0 + (t - t0) / ratio for t in timeline.times))
+    return Timeline(times, array(MASK_TYPECODE, timeline.masks), timeline.bpm, timeline.bits_per_page)
+
+
+def humanize(timeline, jitter_ms, seed=None):
+    """
+    给每个和弦加入±jitter_ms的随机偏移（三角分布，偏向0），相同seed结果可复现；首音不动
+    """
+    rng = random.Random(seed)
+    times = timeline.times
+    pairs = [(times[0], timeline.masks[0])]
+    for t, mask in zip(times[1:], timeline.masks[1:]):
+        pairs.append((max(times[0], t + rng.triangular(-jitter_ms, jitter_ms, 0)), mask))
+    return _rebuild(timeline, pairs)
+
+
+def clamp_min_gap(timeline, min_gap_ms):
+    """
+    保证相邻和弦间隔不小于min_gap_ms，过密的和弦依次顺延
+    """
+    times = array('d', timeline.times)
+    for i in range(1, len(times)):
+        if times[i] - times[i - 1] < min_gap_ms:
+            times[i] = times[i - 1] + min_gap_ms
+    return Timeline(times, array(MASK_TYPECODE, timeline.masks), timeline.bpm, timeline.bits_per_page)
+
+
+def apply_transforms(timeline, speed=1.0, quantize_division=None, min_gap_ms=0, jitter_ms=0, seed=None):
+    """
+    按固定顺序执行变换；quantize_division为None时不量化，0表示按bitsPerPage自动推算每拍格数。
+    所有参数都是默认值时原样返回（不复制缓存中的数组）
+    """
+    if quantize_division is None and speed == 1.0 and jitter_ms <= 0 and min_gap_ms <= 0:
+        return timeline
+    timeline.wait_loaded()  # 变换需要完整的时间轴
+    if not len(timeline):
+        return timeline
+    if quantize_division is not None:
+        timeline = quantize(timeline, quantize_division or None)
+    if speed != 1.0:
+        timeline = change_speed(timeline, speed)
+    if jitter_ms > 0:
+        timeline = humanize(timeline, jitter_ms, seed)
+    if min_gap_ms > 0:
+        timeline = clamp_min_gap(timeline, min_gap_ms)
+    return timeline
@@ -0,0 +1,194 @@
+import tkinter as tk
+from tkinter import ttk
+
+# 虚拟化列表：数据保存在内存模型中，Listbox里只放当前可见的几十行，
+# 滚动、过滤时只更新变化的可见行，数万首乐谱也不会卡顿。
+
+
+class VirtualListbox(ttk.Frame):
+    """
+    接口尽量与tk.Listbox一致（curselection/selection_set/nearest/get/size），索引均为模型索引。
+    选中变化时在本控件上触发<<ListboxSelect>>；on_visible(可见项列表)在可见行变化后回调，可用于懒加载
+    """
+    def __init__(self, master, on_visible=None, **listbox_kw):
+        super().__init__(master)
+        listbox_kw.setdefault('exportselection', False)
+        self.listbox = tk.Listbox(self, **listbox_kw)
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.yview)
+        self.scrollbar.pack(side='right', fill='y')
+        self.listbox.pack(side='left', fill='both', expand=True)
+        self.on_visible = on_visible
+        self.items = []
+        self.offset = 0
+        self.selected = None
+        self.rows = int(listbox_kw.get('height', 10))
+        self._rendered = []
+        self._row_height = None
+        self._visible_pending = None
+        self.listbox.bind('<<ListboxSelect>>', self._on_select)
+        self.listbox.bind('<Configure>', self._on_configure)
+        self.listbox.bind('<MouseWheel>', self._on_wheel)
+        self.listbox.bind('<Button-4>', lambda e: self._scroll_units(-3))
+        self.listbox.bind('<Button-5>', lambda e: self._scroll_units(3))
+        for key, step in (('<Up>', -1), ('<Down>', 1), ('<Prior>', 'page-'), ('<Next>', 'page+'),
+                          ('<Home>', 'home'), ('<End>', 'end')):
+            self.listbox.bind(key, lambda e, s=step: self._on_key(s))
+
+    # ====== 与tk.Listbox兼容的接口 ======
+    def bind(self, sequence=None, func=None, add=None):
+        # 虚拟事件绑定在本控件上，鼠标键盘事件转给内部Listbox
+        if sequence and sequence.startswith('<<'):
+            return super().bind(sequence, func, add)
+        return self.listbox.bind(sequence, func, add)
+
+    def size(self):
+        return len(self.items)
+
+    def get(self, index):
+        return self.items[index]
+
+    def curselection(self):
+        return (self.selected,) if self.selected is not None else ()
+
+    def selection_clear(self, first=0, last=None):
+        self.selected = None
+        self._render()
+
+    def selection_set(self, index):
+        if 0 <= index < len(self.items):
+            self.selected = index
+            self.see(index)
+            self._render()
+
+    def nearest(self, y):
+        if not self.items:
+            return -1
+        return min(self.offset + self.listbox.nearest(y), len(self.items) - 1)
+
+    def see(self, index):
+        if index < self.offset:
+            self.offset = index
+        elif index >= self.offset + self.rows:
+            self.offset = index - self.rows + 1
+        self._clamp()
+
+    def yview(self, *args):
+        if not args:
+            return self._fractions()
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * len(self.items))
+        elif args[0] == 'scroll':
+            step = int(args[1]) * (self.rows if args[2] == 'pages' else 1)
+            self.offset += step
+        self._clamp()
+        self._render()
+
+    # ====== 模型 ======
+    def set_items(self, items):
+        """
+        替换列表内容；内容未变化时不做任何事，选中项仍在新列表中时保持选中
+        """
+        items = list(items)
+        if items == self.items:
+            return
+        selected_item = self.items[self.selected] if self.selected is not None else None
+        self.items = items
+        self.selected = None
+        if selected_item is not None:
+            try:
+                self.selected = items.index(selected_item)
+            except ValueError:
+                pass
+        self._clamp()
+        self._render()
+
+    def visible_items(self):
+        return self.items[self.offset:self.offset + self.rows]
+
+    # ====== 渲染 ======
+    def _clamp(self):
+        self.offset = max(0, min(self.offset, len(self.items) - self.rows))
+
+    def _fractions(self):
+        total = len(self.items)
+        if total <= self.rows:
+            return 0.0, 1.0
+        return self.offset / total, min(1.0, (self.offset + self.rows) / total)
+
+    def _render(self):
+        # 只更新与上次渲染不同的可见行
+        visible = self.visible_items()
+        rendered = self._rendered
+        for i, text in enumerate(visible):
+            if i < len(rendered):
+                if rendered[i] == text:
+                    continue
+                self.listbox.delete(i)
+            self.listbox.insert(i, text)
+        if len(rendered) > len(visible):
+            self.listbox.delete(len(visible), tk.END)
+        self._rendered = visible
+        self.listbox.selection_clear(0, tk.END)
+        if self.selected is not None and self.offset <= self.selected < self.offset + len(visible):
+            self.listbox.selection_set(self.selected - self.offset)
+        self.scrollbar.set(*self._fractions())
+        if self._row_height is None and visible:
+            self.after_idle(self._on_configure)
+        if self.on_visible and self._visible_pending is None:
+            self._visible_pending = self.after_idle(self._notify_visible)
+
+    def _notify_visible(self):
+        self._visible_pending = None
+        self.on_visible(self.visible_items())
+
+    def _on_configure(self, event=None):
+        # 根据实际高度计算可见行数，行高取已渲染行的间距
+        if not self._row_height:
+            first, second = self.listbox.bbox(0), self.listbox.bbox(1)
+            if first and second:
+                self._row_height = second[1] - first[1]
+            elif first:
+                self._row_height = first[3] + 1
+            else:
+                return
+        rows = max(1, self.listbox.winfo_height() // max(1, self._row_height))
+        if rows != self.rows:
+            self.rows = rows
+            self._clamp()
+            self._render()
+
+    def _on_select(self, event=None):
+        sel = self.listbox.curselection()
+        if not sel:
+            return
+        index = self.offset + sel[0]
+        if index != self.selected:
+            self.selected = index
+            self.event_generate('<<ListboxSelect>>')
+
+    def _scroll_units(self, n):
+        self.yview('scroll', n, 'units')
+        return 'break'
+
+    def _on_wheel(self, event):
+        return self._scroll_units(-3 if event.delta > 0 else 3)
+
+    def _on_key(self, step):
+        if not self.items:
+            return 'break'
+        current = self.selected if self.selected is not None else -1
+        if step == 'home':
+            index = 0
+        elif step == 'end':
+            index = len(self.items) - 1
+        elif step == 'page-':
+            index = current - self.rows
+        elif step == 'page+':
+            index = current + self.rows
+        else:
+            index = current + step
+        index = max(0, min(index, len(self.items) - 1))
+        if index != self.selected:
+            self.selection_set(index)
+            self.event_generate('<<ListboxSelect>>')
+        return 'break'
@@ -0,0 +1,212 @@
+import sys
+import time
+from collections import Counter
+from startup import lazy_import
+
+# 游戏窗口定位：缓存上次找到的窗口句柄和进程id，再次演奏时只用两次廉价的窗口API确认
+# 句柄仍然存在且仍属于同一进程（句柄可能被系统复用），失效时才枚举全部顶层窗口；
+# 枚举时同一进程的多个窗口只查询一次进程名。
+# 平台相关的调用集中在WindowSystem中，FakeWindowSystem模拟桌面，用于在Linux上测试和做基准。
+
+
+def game_priority(name):
+    """
+    进程名匹配游戏时返回优先级（越小越优先：Sky开头的进程优先于光遇），否则返回None
+    """
+    if name.lower().startswith('sky'):
+        return 0
+    if '光遇' in name:
+        return 1
+    return None
+
+
+class WindowSystem:
+    """
+    窗口系统接口：windows()列出可见且可用的顶层窗口，is_window/window_pid/process_name查询，activate置顶
+    """
+    name = 'base'
+
+    def windows(self):
+        raise NotImplementedError
+
+    def is_window(self, hwnd):
+        raise NotImplementedError
+
+    def window_pid(self, hwnd):
+        raise NotImplementedError
+
+    def process_name(self, pid):
+        raise NotImplementedError
+
+    def activate(self, hwnd):
+        raise NotImplementedError
+
+
+class Win32WindowSystem(WindowSystem):
+    """
+    pywin32 + psutil 实现
+    """
+    name = 'win32'
+
+    def __init__(self):
+        self.win32gui = lazy_import('win32gui')
+        self.win32process = lazy_import('win32process')
+        self.win32con = lazy_import('win32con')
+        self.psutil = lazy_import('psutil')
+
+    def windows(self):
+        gui = self.win32gui
+        result = []
+
+        def callback(hwnd, _):
+            if gui.IsWindowVisible(hwnd) and gui.IsWindowEnabled(hwnd):
+                result.append(hwnd)
+            return True
+        gui.EnumWindows(callback, None)
+        return result
+
+    def is_window(self, hwnd):
+        return bool(self.win32gui.IsWindow(hwnd) and self.win32gui.IsWindowVisible(hwnd))
+
+    def window_pid(self, hwnd):
+        return self.win32process.GetWindowThreadProcessId(hwnd)[1]
+
+    def process_name(self, pid):
+        try:
+            return self.psutil.Process(pid).name()
+        except self.psutil.Error:
+            return None
+
+    def activate(self, hwnd):
+        gui, con = self.win32gui, self.win32con
+        gui.ShowWindow(hwnd, con.SW_RESTORE)
+        gui.SetForegroundWindow(hwnd)
+        gui.SetWindowPos(hwnd, con.HWND_TOPMOST, 0, 0, 0, 0, con.SWP_NOMOVE | con.SWP_NOSIZE)
+
+
+class FakeWindowSystem(WindowSystem):
+    """
+    模拟桌面：windows为 {句柄: 进程id}，names为 {进程id: 进程名}。
+    calls统计各方法的调用次数；costs为 {方法名: 每次调用耗时(秒)}（windows按窗口数计），用忙等模拟真实API的开销
+    """
+    name = 'fake'
+
+    def __init__(self, windows=None, names=None, costs=None):
+        self.window_map = dict(windows or {})
+        self.names = dict(names or {})
+        self.costs = costs or {}
+        self.calls = Counter()
+        self.activated = []
+
+    def _spend(self, method, n=1):
+        self.calls[method] += 1
+        cost = self.costs.get(method, 0) * n
+        if cost > 0:
+            end = time.perf_counter() + cost
+            while time.perf_counter() < end:
+                pass
+
+    def windows(self):
+        self._spend('windows', len(self.window_map))
+        return list(self.window_map)
+
+    def is_window(self, hwnd):
+        self._spend('is_window')
+        return hwnd in self.window_map
+
+    def window_pid(self, hwnd):
+        self._spend('window_pid')
+        return self.window_map[hwnd]
+
+    def process_name(self, pid):
+        self._spend('process_name')
+        return self.names.get(pid)
+
+    def activate(self, hwnd):
+        self._spend('activate')
+        self.activated.append(hwnd)
+
+
+class WindowLocator:
+    """
+    查找并置顶游戏窗口，缓存找到的句柄和进程id；locate()返回句柄，没有游戏窗口时返回None
+    """
+    def __init__(self, system):
+        self.system = system
+        self.hwnd = None
+        self.pid = None
+        self.scans = 0  # 全量枚举次数
+
+    def invalidate(self):
+        self.hwnd = self.pid = None
+
+    def cached(self):
+        """
+        缓存的句柄仍存在、可见且属于同一进程时返回它，否则清除缓存并返回None
+        """
+        if self.hwnd is None:
+            return None
+        try:
+            if self.system.is_window(self.hwnd) and self.system.window_pid(self.hwnd) == self.pid:
+                return self.hwnd
+        except Exception:
+            pass
+        self.invalidate()
+        return None
+
+    def scan(self):
+        """
+        枚举全部顶层窗口，按优先级选出游戏窗口并写入缓存
+        """
+        self.scans += 1
+        priorities = {}  # 进程id -> 优先级，同一进程只查一次进程名
+        best = None  # (优先级, 句柄, 进程id)
+        for hwnd in self.system.windows():
+            try:
+                pid = self.system.window_pid(hwnd)
+                if pid not in priorities:
+                    name = self.system.process_name(pid)
+                    priorities[pid] = game_priority(name) if name else None
+            except Exception:
+                continue
+            priority = priorities[pid]
+            if priority is not None and (best is None or priority < best[0]):
+                best = (priority, hwnd, pid)
+                if priority == 0:
+                    break
+        if best is None:
+            self.invalidate()
+            return None
+        _, self.hwnd, self.pid = best
+        return self.hwnd
+
+    def find(self):
+        return self.cached() or self.scan()
+
+    def locate(self):
+        """
+        查找并置顶游戏窗口；缓存的句柄置顶失败时重新枚举一次
+        """
+        hwnd = self.find()
+        if hwnd is None:
+            return None
+        try:
+            self.system.activate(hwnd)
+        except Exception:
+            self.invalidate()
+            hwnd = self.scan()
+            if hwnd is not None:
+                self.system.activate(hwnd)
+        return hwnd
+
+
+def create_window_locator():
+    """
+    按平台创建窗口定位器；目前只支持Windows
+    """
+    if sys.platform != 'win32':
+        raise RuntimeError("当前平台不支持查找游戏窗口")
+    try:
+        return WindowLocator(Win32WindowSystem())
+    except ImportError as e:
+        raise RuntimeError(f"缺少查找游戏窗口所需的模块: {e}")